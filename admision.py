@@ -0,0 +1,234 @@
+import asyncio, threading, time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class ErrorOcupado(RuntimeError):
+    """No hay capacidad para atender el trabajo ahora; conviene reintentar en
+    retry_after_seg segundos. Se responde como {'type': 'busy', 'retry_after_ms'}."""
+    def __init__(self, retry_after_seg: float, mensaje: str = "busy"):
+        super().__init__(mensaje)
+        self.retry_after_seg = retry_after_seg
+
+def respuesta_ocupado(retry_after_seg: float) -> Dict[str, Any]:
+    """Mensaje 'busy' con el tiempo sugerido antes de reintentar."""
+    return {"type": "busy", "error": "busy", "retry_after_ms": max(1, int(retry_after_seg * 1000))}
+
+class ColaJusta:
+    """Cola acotada con turnos entre clientes: cada cliente tiene su propia fila y se
+    saca una solicitud de cada uno por vuelta (round robin), así un cliente que envía
+    muchas no retrasa a los que envían pocas. No es segura entre hilos por sí sola."""
+    def __init__(self, capacidad: int):
+        """- capacidad: solicitudes en espera como máximo, sumando todas las filas"""
+        self.capacidad = capacidad
+        self.filas: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self.largo = 0
+
+    def agregar(self, cliente: Hashable, item: Any) -> bool:
+        """Encola el item en la fila del cliente; False si la cola está llena."""
+        if self.largo >= self.capacidad:
+            return False
+        fila = self.filas.get(cliente)
+        if fila is None:
+            fila = self.filas[cliente] = deque()
+        fila.append(item)
+        self.largo += 1
+        return True
+
+    def sacar(self) -> Any:
+        """Saca el siguiente item del cliente de turno (la cola no debe estar vacía)."""
+        cliente, fila = next(iter(self.filas.items()))
+        item = fila.popleft()
+        self.largo -= 1
+        if fila:
+            self.filas.move_to_end(cliente)   # el turno pasa al siguiente cliente
+        else:
+            del self.filas[cliente]
+        return item
+
+    def __len__(self) -> int:
+        return self.largo
+
+class Admision:
+    """Control de admisión con hilos: hasta max_concurrentes trabajos a la vez y hasta
+    capacidad en espera en una ColaJusta. Lo que no cabe se rechaza en el acto para que
+    quien llama responda 'busy' en lugar de acumular hilos y timeouts."""
+    def __init__(self, max_concurrentes: int, capacidad: int, nombre: str = "Admision"):
+        """Arranca max_concurrentes hilos daemon que atienden la cola."""
+        self.max_concurrentes = max(1, max_concurrentes)
+        self.cola = ColaJusta(capacidad)
+        self.lock = threading.Lock()
+        self.disponibles = threading.Semaphore(0)   # uno por item en la cola
+        self.en_curso = 0
+        self.rechazadas = 0
+        self.servicio_seg: Optional[float] = None    # duración suavizada de un trabajo
+        for i in range(self.max_concurrentes):
+            threading.Thread(target=self._trabajar, daemon=True, name=f"{nombre}-{i}").start()
+
+    def enviar(self, cliente: Hashable, funcion: Callable[[], Any]) -> Optional[Future]:
+        """Encola funcion() en la fila del cliente y retorna un Future de su resultado,
+        o None si la cola está llena."""
+        futuro = Future()
+        with self.lock:
+            if not self.cola.agregar(cliente, (funcion, futuro)):
+                self.rechazadas += 1
+                return None
+        self.disponibles.release()
+        return futuro
+
+    def _trabajar(self):
+        """Hilo trabajador: atiende la cola en el orden de turnos de ColaJusta."""
+        while True:
+            self.disponibles.acquire()
+            with self.lock:
+                funcion, futuro = self.cola.sacar()
+                self.en_curso += 1
+            inicio = time.monotonic()
+            try:
+                futuro.set_result(funcion())
+            except BaseException as exc:
+                futuro.set_exception(exc)
+            finally:
+                with self.lock:
+                    self.en_curso -= 1
+                    self._medir(time.monotonic() - inicio)
+
+    def _medir(self, duracion: float):
+        """Actualiza la duración suavizada de un trabajo (llamar con lock)."""
+        self.servicio_seg = duracion if self.servicio_seg is None else 0.8 * self.servicio_seg + 0.2 * duracion
+
+    def llena(self) -> bool:
+        """True si no entra ningún trabajo más en la cola."""
+        return len(self.cola) >= self.cola.capacidad
+
+    def profundidad(self) -> int:
+        """Trabajos esperando turno."""
+        return len(self.cola)
+
+    def reintentar_en_seg(self) -> float:
+        """Espera sugerida para un rechazado: lo que tardaría en vaciarse la cola actual."""
+        return estimar_espera(self.servicio_seg, len(self.cola), self.max_concurrentes)
+
+    def estado(self) -> Dict[str, Any]:
+        """Profundidad de la cola, trabajos en curso, límites y rechazos."""
+        with self.lock:
+            return {"en_cola": len(self.cola), "en_curso": self.en_curso, "capacidad": self.cola.capacidad,
+                    "max_concurrentes": self.max_concurrentes, "rechazadas": self.rechazadas}
+
+class AdmisionAsync(Admision):
+    """Versión asyncio de Admision: los trabajadores son tareas del loop y cada trabajo
+    es una corrutina. Se usa desde un único event loop."""
+    def __init__(self, max_concurrentes: int, capacidad: int, nombre: str = "Admision"):
+        """Igual que Admision, pero los trabajadores arrancan con iniciar()."""
+        self.max_concurrentes = max(1, max_concurrentes)
+        self.cola = ColaJusta(capacidad)
+        self.lock = threading.Lock()   # solo para que estado() sirva desde otros hilos
+        self.disponibles: Optional[asyncio.Semaphore] = None
+        self.en_curso = 0
+        self.rechazadas = 0
+        self.servicio_seg: Optional[float] = None
+        self.trabajadores = []
+
+    def iniciar(self):
+        """Lanza los trabajadores en el loop en curso."""
+        self.disponibles = asyncio.Semaphore(0)
+        self.trabajadores = [asyncio.create_task(self._trabajar_async()) for _ in range(self.max_concurrentes)]
+
+    def enviar(self, cliente: Hashable, fabrica: Callable[[], Awaitable[Any]]) -> Optional[asyncio.Future]:
+        """Encola la corrutina que crea fabrica() y retorna un future de su resultado, o
+        None si la cola está llena."""
+        futuro = asyncio.get_running_loop().create_future()
+        with self.lock:
+            if not self.cola.agregar(cliente, (fabrica, futuro)):
+                self.rechazadas += 1
+                return None
+        self.disponibles.release()
+        return futuro
+
+    async def _trabajar_async(self):
+        """Tarea trabajadora: atiende la cola en el orden de turnos de ColaJusta."""
+        while True:
+            await self.disponibles.acquire()
+            with self.lock:
+                fabrica, futuro = self.cola.sacar()
+                self.en_curso += 1
+            inicio = time.monotonic()
+            try:
+                resultado = await fabrica()
+            except asyncio.CancelledError:
+                # Se canceló la corrutina del trabajo (no el trabajador): se cancela su
+                # future y se sigue atendiendo la cola; si el cancelado es el trabajador, sale
+                if not futuro.done():
+                    futuro.cancel()
+                if asyncio.current_task().cancelling():
+                    raise
+            except BaseException as exc:
+                if not futuro.done():
+                    futuro.set_exception(exc)
+                if not isinstance(exc, Exception):
+                    raise
+            else:
+                if not futuro.done():   # quien esperaba pudo haber desistido (future cancelado)
+                    futuro.set_result(resultado)
+            finally:
+                with self.lock:
+                    self.en_curso -= 1
+                    self._medir(time.monotonic() - inicio)
+
+class Cupos:
+    """Admisión sin hilos propios, para quien ya atiende cada conexión en su hilo: hasta
+    max_concurrentes ejecutan a la vez en el hilo que llama y hasta capacidad esperan
+    turno en el semáforo; lo demás se rechaza con ErrorOcupado. Ahorra el pase a otro hilo
+    de Admision a cambio de no repartir por turnos entre clientes."""
+    def __init__(self, max_concurrentes: int, capacidad: int):
+        """- max_concurrentes: trabajos ejecutándose a la vez
+        - capacidad: trabajos esperando turno como máximo"""
+        self.max_concurrentes = max(1, max_concurrentes)
+        self.capacidad = capacidad
+        self.semaforo = threading.Semaphore(self.max_concurrentes)
+        self.lock = threading.Lock()
+        self.en_cola = 0
+        self.en_curso = 0
+        self.rechazadas = 0
+        self.servicio_seg: Optional[float] = None
+
+    def ejecutar(self, funcion: Callable[[], Any]) -> Any:
+        """Ejecuta funcion() cuando haya cupo y retorna su resultado; ErrorOcupado si ya
+        hay capacidad trabajos esperando."""
+        with self.lock:
+            if self.en_cola >= self.capacidad:
+                self.rechazadas += 1
+                raise ErrorOcupado(self.reintentar_en_seg())
+            self.en_cola += 1
+        self.semaforo.acquire()
+        with self.lock:
+            self.en_cola -= 1
+            self.en_curso += 1
+        inicio = time.monotonic()
+        try:
+            return funcion()
+        finally:
+            self.semaforo.release()
+            with self.lock:
+                self.en_curso -= 1
+                duracion = time.monotonic() - inicio
+                self.servicio_seg = duracion if self.servicio_seg is None else 0.8 * self.servicio_seg + 0.2 * duracion
+
+    def profundidad(self) -> int:
+        """Trabajos esperando turno."""
+        return self.en_cola
+
+    def reintentar_en_seg(self) -> float:
+        """Ver Admision.reintentar_en_seg."""
+        return estimar_espera(self.servicio_seg, self.en_cola, self.max_concurrentes)
+
+    def estado(self) -> Dict[str, Any]:
+        """Ver Admision.estado."""
+        with self.lock:
+            return {"en_cola": self.en_cola, "en_curso": self.en_curso, "capacidad": self.capacidad,
+                    "max_concurrentes": self.max_concurrentes, "rechazadas": self.rechazadas}
+
+def estimar_espera(servicio_seg: Optional[float], en_cola: int, concurrentes: int) -> float:
+    """Segundos hasta que se atienda un trabajo nuevo si se formara detrás de en_cola
+    (al menos 50ms, para que los reintentos no lleguen en ráfaga)."""
+    return max(0.05, (servicio_seg or 0.05) * (en_cola + 1) / max(1, concurrentes))
@@ -0,0 +1,268 @@
+import argparse, json, os, platform, random, socket, subprocess, sys, threading, time
+from array import array
+from concurrent.futures import wait
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import psutil
+except ImportError:  # psutil es opcional: sin él se lee /proc (solo Linux)
+    psutil = None
+
+from cliente import percentil
+from clienteCalculo import ClienteCalculo
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+HOST = "127.0.0.1"
+
+def medir_proceso(pid: int) -> Optional[Dict[str, float]]:
+    """CPU acumulada (segundos de usuario + sistema) y memoria residente (actual y pico,
+    en MiB) de un proceso, con psutil o leyendo /proc. None si no se puede medir."""
+    if psutil is not None:
+        try:
+            proceso = psutil.Process(pid)
+            tiempos, memoria = proceso.cpu_times(), proceso.memory_info()
+            pico = getattr(memoria, "peak_wset", None) or getattr(memoria, "rss")
+            return {"cpu_seg": tiempos.user + tiempos.system, "rss_mb": memoria.rss / 2**20, "rss_max_mb": pico / 2**20}
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/stat") as archivo:
+            # El nombre del proceso va entre paréntesis y puede tener espacios
+            campos = archivo.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as archivo:
+            estado = dict(linea.split(":", 1) for linea in archivo if ":" in linea)
+    except OSError:
+        return None
+    tics = os.sysconf("SC_CLK_TCK")
+    kib = lambda campo: int(estado.get(campo, "0 kB").split()[0])
+    # utime y stime son los campos 14 y 15 de stat (11 y 12 después del nombre)
+    return {"cpu_seg": (int(campos[11]) + int(campos[12])) / tics,
+            "rss_mb": kib("VmRSS") / 1024, "rss_max_mb": kib("VmHWM") / 1024}
+
+class Cluster:
+    """Coordinador y N operadores lanzados como procesos locales, en puertos consecutivos
+    a partir de puerto_base (el coordinador usa puerto_base)."""
+    def __init__(self, operadores: int, puerto_base: int, delay: float = 0.0, modo_asyncio: bool = False,
+                 args_coordinador: List[str] = (), args_operador: List[str] = ()):
+        """- operadores: cantidad de procesos operador
+        - delay: --delay de cada operador
+        - modo_asyncio: lanza coordinador y operadores con --asyncio
+        - args_coordinador / args_operador: flags extra para cada proceso"""
+        self.puerto = puerto_base
+        self.puertos_operadores = [puerto_base + i for i in range(1, operadores + 1)]
+        self.delay = delay
+        self.modo_asyncio = modo_asyncio
+        self.args_coordinador = list(args_coordinador)
+        self.args_operador = list(args_operador)
+        self.procesos: Dict[str, subprocess.Popen] = {}
+
+    def _lanzar(self, nombre: str, script: str, args: List[str]) -> subprocess.Popen:
+        """Lanza un script del repo; su salida se descarta para no medir la consola."""
+        comando = [sys.executable, os.path.join(DIRECTORIO, script)] + args
+        if self.modo_asyncio:
+            comando.append("--asyncio")
+        proceso = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.procesos[nombre] = proceso
+        return proceso
+
+    def iniciar(self, timeout: float = 15.0):
+        """Lanza todos los procesos y espera a que el coordinador vea vivos a los operadores."""
+        for i, puerto in enumerate(self.puertos_operadores, 1):
+            self._lanzar(f"operador-{i}", "operador.py",
+                         ["--port", str(puerto), "--name", f"operador-{i}", "--delay", str(self.delay)]
+                         + self.args_operador)
+        for puerto in self.puertos_operadores:
+            esperar_puerto(puerto, timeout)
+        self._lanzar("coordinador", "servidorCalculo.py",
+                     ["--port", str(self.puerto), "--operadores"]
+                     + [f"{HOST}:{puerto}" for puerto in self.puertos_operadores] + self.args_coordinador)
+        esperar_puerto(self.puerto, timeout)
+        self._esperar_operadores(timeout)
+
+    def _esperar_operadores(self, timeout: float):
+        """Sondea con una suma pequeña hasta que todos los operadores figuren vivos."""
+        limite = time.monotonic() + timeout
+        with ClienteCalculo(HOST, self.puerto, timeout=timeout) as cliente:
+            while True:
+                respuesta = cliente.solicitar({"type": "sum_arrays", "a": [1], "b": [1]})
+                vivos = sum(1 for op in respuesta.get("operadores", []) if op.get("vivo"))
+                if vivos == len(self.puertos_operadores):
+                    return
+                if time.monotonic() > limite:
+                    raise RuntimeError(f"Solo {vivos} de {len(self.puertos_operadores)} operadores quedaron vivos")
+                time.sleep(0.2)
+
+    def matar(self, nombre: str):
+        """Termina un proceso de golpe (SIGKILL), como una caída."""
+        self.procesos[nombre].kill()
+
+    def medir(self) -> Dict[str, Optional[Dict[str, float]]]:
+        """medir_proceso de cada proceso del cluster que siga corriendo."""
+        return {nombre: medir_proceso(p.pid) for nombre, p in self.procesos.items() if p.poll() is None}
+
+    def detener(self):
+        """Termina todos los procesos y espera a que salgan."""
+        for proceso in self.procesos.values():
+            if proceso.poll() is None:
+                proceso.terminate()
+        for proceso in self.procesos.values():
+            try:
+                proceso.wait(5)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+        self.procesos.clear()
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        self.detener()
+
+def esperar_puerto(puerto: int, timeout: float):
+    """Espera a que algo acepte conexiones en el puerto local."""
+    limite = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((HOST, puerto), timeout=1.0).close()
+            return
+        except OSError:
+            if time.monotonic() > limite:
+                raise RuntimeError(f"Nada escucha en {HOST}:{puerto} tras {timeout}s")
+            time.sleep(0.1)
+
+def uso_procesos(antes: Dict, despues: Dict, duracion: float) -> Dict[str, Dict[str, float]]:
+    """CPU consumida en el intervalo (segundos y % de un núcleo) y memoria de cada proceso."""
+    uso = {}
+    for nombre, fin in despues.items():
+        inicio = antes.get(nombre)
+        if fin is None or inicio is None:
+            continue
+        cpu = fin["cpu_seg"] - inicio["cpu_seg"]
+        uso[nombre] = {"cpu_seg": round(cpu, 3), "cpu_pct": round(100 * cpu / duracion, 1),
+                       "rss_mb": round(fin["rss_mb"], 1), "rss_max_mb": round(fin["rss_max_mb"], 1)}
+    return uso
+
+def ejecutar_carga(cliente: ClienteCalculo, tipo: str, n: int, concurrencia: int, duracion: float,
+                   evento: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """Carga de lazo cerrado: mantiene 'concurrencia' solicitudes de n elementos en vuelo
+    durante 'duracion' segundos. Cada solicitud cambia su primer elemento para que ningún
+    cache la resuelva. Si se indica, evento() se ejecuta a mitad de la corrida."""
+    base_a = array("q", (random.randint(-10**6, 10**6) for _ in range(n)))
+    base_b = array("q", (random.randint(-10**6, 10**6) for _ in range(n)))
+    latencias: List[float] = []
+    errores = ocupadas = 0
+    lock = threading.Lock()
+    cupos = threading.Semaphore(concurrencia)
+
+    def registrar(futuro, enviado: float):
+        """Anota la latencia (o el error) de una solicitud al recibir su respuesta."""
+        nonlocal errores, ocupadas
+        duracion_solicitud = time.monotonic() - enviado
+        cupos.release()
+        tipo_respuesta = futuro.result().get("type") if futuro.exception() is None else None
+        with lock:
+            if tipo_respuesta == "ok":
+                latencias.append(duracion_solicitud)
+            else:
+                errores += 1
+                ocupadas += tipo_respuesta == "busy"
+
+    inicio = time.monotonic()
+    mitad, fin = inicio + duracion / 2, inicio + duracion
+    futuros, i = [], 0
+    while time.monotonic() < fin:
+        if evento is not None and time.monotonic() >= mitad:
+            evento()
+            evento = None
+        cupos.acquire()
+        a = array("q", base_a)
+        a[0] = i
+        i += 1
+        enviado = time.monotonic()
+        solicitud = {"type": tipo, "a": a, "b": base_b}
+        if tipo == "reduce_array":
+            del solicitud["b"]
+        futuro = cliente.enviar(solicitud)
+        futuro.add_done_callback(lambda f, t=enviado: registrar(f, t))
+        futuros.append(futuro)
+    wait(futuros)
+    total = time.monotonic() - inicio
+    ms = lambda p: round(percentil(latencias, p) * 1000, 3)
+    return {"solicitudes": len(futuros), "errores": errores, "ocupadas": ocupadas, "duracion_seg": round(total, 3),
+            "rps": round(len(futuros) / total, 2), "elementos_por_seg": round(len(latencias) * n / total),
+            "p50_ms": ms(50), "p95_ms": ms(95), "p99_ms": ms(99), "max_ms": ms(100)}
+
+def correr_escenario(cluster: Cluster, nombre: str, tipo: str, n: int, concurrencia: int, duracion: float,
+                     binario: bool, evento: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """Calienta las conexiones, corre la carga y retorna sus métricas junto al uso de los procesos."""
+    with ClienteCalculo(HOST, cluster.puerto, conexiones=max(1, concurrencia // 8), binario=binario) as cliente:
+        ejecutar_carga(cliente, tipo, min(n, 1000), concurrencia, 0.2)
+        antes = cluster.medir()
+        resultado = ejecutar_carga(cliente, tipo, n, concurrencia, duracion, evento)
+        despues = cluster.medir()
+    resultado = dict({"escenario": nombre, "operacion": tipo, "operadores": len(cluster.puertos_operadores),
+                      "n": n, "concurrencia": concurrencia}, **resultado)
+    resultado["procesos"] = uso_procesos(antes, despues, resultado["duracion_seg"])
+    print(f"[benchmark] {nombre} ops={resultado['operadores']} n={n} c={concurrencia}: "
+          f"rps={resultado['rps']} p50={resultado['p50_ms']}ms p99={resultado['p99_ms']}ms "
+          f"errores={resultado['errores']}", file=sys.stderr)
+    return resultado
+
+def principal():
+    """Punto de entrada: corre la matriz de escenarios y escribe los resultados en JSON."""
+    ap = argparse.ArgumentParser(description="Benchmark de extremo a extremo sobre un cluster local")
+    ap.add_argument("--operadores", type=int, nargs="+", default=[1, 3],
+                    help="cantidades de operadores a probar (un cluster por cantidad)")
+    ap.add_argument("--tamanos", type=int, nargs="+", default=[1000, 100_000, 1_000_000],
+                    help="largos de arreglo a probar")
+    ap.add_argument("--concurrencias", type=int, nargs="+", default=[1, 8, 32],
+                    help="solicitudes en vuelo a probar")
+    ap.add_argument("--duracion", type=float, default=5.0, help="segundos de cada escenario")
+    ap.add_argument("--operacion", default="sum_arrays",
+                    choices=["sum_arrays", "sub_arrays", "mul_arrays", "dot_arrays", "reduce_array"])
+    ap.add_argument("--delay", type=float, default=0.0, help="--delay de los operadores")
+    ap.add_argument("--falla", action="store_true",
+                    help="agrega por cluster (2+ operadores) una corrida en que operador-1 cae a la mitad")
+    ap.add_argument("--asyncio", action="store_true", help="lanza coordinador y operadores con --asyncio")
+    ap.add_argument("--json", action="store_true", help="envía los arreglos como listas JSON en lugar de binario")
+    ap.add_argument("--con-cache", action="store_true",
+                    help="deja activos los caches de resultados (por defecto se apagan para medir el cálculo)")
+    ap.add_argument("--puerto-base", type=int, default=7100)
+    ap.add_argument("--args-coordinador", default="", help="flags extra del coordinador, entre comillas")
+    ap.add_argument("--args-operador", default="", help="flags extra de los operadores, entre comillas")
+    ap.add_argument("--salida", help="archivo JSON de resultados (por defecto stdout)")
+    args = ap.parse_args()
+
+    sin_cache = [] if args.con_cache else ["--cache-mb", "0"]
+    resultados = []
+    for operadores in args.operadores:
+        cluster = Cluster(operadores, args.puerto_base, args.delay, args.asyncio,
+                          sin_cache + args.args_coordinador.split(), sin_cache + args.args_operador.split())
+        with cluster:
+            for n in args.tamanos:
+                for concurrencia in args.concurrencias:
+                    resultados.append(correr_escenario(cluster, "carga", args.operacion, n, concurrencia,
+                                                       args.duracion, not args.json))
+            if args.falla and operadores > 1:
+                resultado = correr_escenario(cluster, "falla", args.operacion, args.tamanos[0],
+                                             max(args.concurrencias), args.duracion, not args.json,
+                                             evento=lambda: cluster.matar("operador-1"))
+                resultado["caido"] = "operador-1"
+                resultados.append(resultado)
+
+    informe = {
+        "entorno": {"python": platform.python_version(), "plataforma": platform.platform(),
+                    "cpus": os.cpu_count(), "psutil": psutil is not None},
+        "parametros": vars(args),
+        "resultados": resultados,
+    }
+    texto = json.dumps(informe, indent=2)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(texto + "\n")
+    else:
+        print(texto)
+
+if __name__ == "__main__":
+    principal()
@@ -0,0 +1,180 @@
+import asyncio, hashlib, json, threading, time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils import es_buffer
+
+# Marca de "no está en el cache" (None es un resultado válido)
+_AUSENTE = object()
+
+def clave_contenido(*partes) -> bytes:
+    """Hash blake2b de 128 bits de las partes (textos, listas de enteros o buffers int64).
+    Los buffers se hashean sin copiar; las listas se pasan a int64 (o a JSON si traen
+    enteros fuera de rango). Cada parte lleva su tipo y largo para que no se confundan
+    concatenaciones distintas."""
+    h = hashlib.blake2b(digest_size=16)
+    for parte in partes:
+        if parte is None:
+            h.update(b"N")
+            continue
+        if isinstance(parte, str):
+            datos, marca = parte.encode(), b"S"
+        elif es_buffer(parte):
+            datos, marca = memoryview(parte).cast("B"), b"B"
+        else:
+            try:
+                datos, marca = memoryview(array("q", parte)).cast("B"), b"B"
+            except (OverflowError, TypeError):
+                datos, marca = json.dumps(list(parte)).encode(), b"J"
+        h.update(marca + len(datos).to_bytes(8, "little"))
+        h.update(datos)
+    return h.digest()
+
+def tam_estimado(valor: Any) -> int:
+    """Bytes aproximados que ocupa un resultado en memoria."""
+    if es_buffer(valor):
+        return memoryview(valor).nbytes + 64
+    if isinstance(valor, list):
+        return 64 + 36 * len(valor)   # puntero + int pequeño por elemento
+    return 64
+
+class CacheResultados:
+    """Cache LRU de resultados con vencimiento (TTL) y límite de memoria, seguro entre
+    hilos. Agrupa las solicitudes concurrentes con la misma clave: mientras una calcula,
+    las demás esperan su resultado (obtener_o_calcular / obtener_o_calcular_async)."""
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seg: float = 60.0, max_entradas: int = 10_000):
+        """- max_bytes: memoria total estimada para los resultados guardados
+        - ttl_seg: segundos que vale un resultado
+        - max_entradas: tope de entradas aunque sobre memoria"""
+        self.max_bytes = max_bytes
+        self.ttl_seg = ttl_seg
+        self.max_entradas = max_entradas
+        self.entradas: "OrderedDict[bytes, tuple]" = OrderedDict()   # (valor, bytes, vence)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.en_curso: Dict[bytes, Future] = {}
+        self.en_curso_async: Dict[bytes, asyncio.Future] = {}
+        # Contadores
+        self.aciertos = 0
+        self.fallos = 0
+        self.agrupadas = 0
+        self.desalojos = 0
+        self.expiradas = 0
+
+    def _buscar(self, clave: bytes) -> Any:
+        """Valor vigente de la clave o _AUSENTE (llamar con lock tomado)."""
+        entrada = self.entradas.get(clave)
+        if entrada is None:
+            return _AUSENTE
+        valor, tam, vence = entrada
+        if vence <= time.monotonic():
+            del self.entradas[clave]
+            self.bytes -= tam
+            self.expiradas += 1
+            return _AUSENTE
+        self.entradas.move_to_end(clave)
+        self.aciertos += 1
+        return valor
+
+    def obtener(self, clave: bytes, defecto: Any = None) -> Any:
+        """Valor guardado para la clave o defecto si no está o venció."""
+        with self.lock:
+            valor = self._buscar(clave)
+        return defecto if valor is _AUSENTE else valor
+
+    def guardar(self, clave: bytes, valor: Any) -> None:
+        """Guarda el valor desalojando los menos usados si falta espacio. Un valor que por
+        sí solo ocupa más de un cuarto del límite no se guarda."""
+        tam = tam_estimado(valor)
+        if tam > self.max_bytes // 4:
+            return
+        with self.lock:
+            anterior = self.entradas.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[1]
+            while self.entradas and (self.bytes + tam > self.max_bytes or len(self.entradas) >= self.max_entradas):
+                _, (_, tam_desalojado, _) = self.entradas.popitem(last=False)
+                self.bytes -= tam_desalojado
+                self.desalojos += 1
+            self.entradas[clave] = (valor, tam, time.monotonic() + self.ttl_seg)
+            self.bytes += tam
+
+    def obtener_o_calcular(self, clave: bytes, calcular: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Retorna el valor guardado o lo calcula con calcular(). Si otro hilo ya está
+        calculando la misma clave, espera su resultado (o su error) hasta timeout."""
+        with self.lock:
+            valor = self._buscar(clave)
+            if valor is not _AUSENTE:
+                return valor
+            futuro = self.en_curso.get(clave)
+            lider = futuro is None
+            if lider:
+                futuro = self.en_curso[clave] = Future()
+                self.fallos += 1
+            else:
+                self.agrupadas += 1
+        if not lider:
+            return futuro.result(timeout)
+        try:
+            valor = calcular()
+        except BaseException as exc:
+            with self.lock:
+                self.en_curso.pop(clave, None)
+            futuro.set_exception(exc)
+            raise
+        self.guardar(clave, valor)
+        with self.lock:
+            self.en_curso.pop(clave, None)
+        futuro.set_result(valor)
+        return valor
+
+    async def obtener_o_calcular_async(self, clave: bytes, calcular: Callable[[], Awaitable[Any]],
+                                       timeout: Optional[float] = None) -> Any:
+        """Versión asyncio de obtener_o_calcular (las esperas no bloquean el loop). Si se
+        cancela el cálculo del líder, quienes lo esperaban no quedan cancelados: lo
+        vuelven a intentar (uno de ellos como nuevo líder) dentro del mismo timeout."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                valor = self._buscar(clave)
+                if valor is not _AUSENTE:
+                    return valor
+                futuro = self.en_curso_async.get(clave)
+                lider = futuro is None
+                if lider:
+                    futuro = self.en_curso_async[clave] = asyncio.get_running_loop().create_future()
+                    self.fallos += 1
+                else:
+                    self.agrupadas += 1
+            if lider:
+                break
+            try:
+                return await asyncio.wait_for(asyncio.shield(futuro),
+                                              None if limite is None else max(0.0, limite - time.monotonic()))
+            except asyncio.CancelledError:
+                # Solo se reintenta si lo cancelado fue el cálculo del líder, no esta espera
+                if not futuro.cancelled() or asyncio.current_task().cancelling():
+                    raise
+        try:
+            valor = await calcular()
+        except BaseException as exc:
+            self.en_curso_async.pop(clave, None)
+            if isinstance(exc, asyncio.CancelledError):
+                futuro.cancel()
+            else:
+                futuro.set_exception(exc)
+                futuro.exception()   # marca el error como leído aunque nadie más esperara
+            raise
+        self.guardar(clave, valor)
+        self.en_curso_async.pop(clave, None)
+        futuro.set_result(valor)
+        return valor
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores y ocupación del cache."""
+        with self.lock:
+            return {"entradas": len(self.entradas), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "aciertos": self.aciertos, "fallos": self.fallos, "agrupadas": self.agrupadas,
+                    "desalojos": self.desalojos, "expiradas": self.expiradas}
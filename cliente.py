@@ -1,5 +1,9 @@
-import argparse, sys
-from utils import abrir_cliente, enviar_json, recibir_json
+import argparse, json, os, sys, threading, time
+from array import array
+from concurrent.futures import wait
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+from utils import abrir_cliente, enviar_mensaje, es_buffer, LectorJson
+from clienteCalculo import ClienteCalculo, como_buffer, ErrorCalculo
 
 TAMANO_REQUERIDO = 5
 
@@ -26,13 +30,199 @@ def leer_arreglo_usuario(nombre_arreglo: str, tam_esperado: int = TAMANO_REQUERI
         sys.exit(1)
     return numeros
 
+def sumar_en_stream(sock, pares_bloques: Iterable[Tuple[array, array]], ventana: int = 4) -> Iterator:
+    """Suma por bloques con el protocolo sum_stream y entrega el resultado de cada bloque
+    en orden. Nunca deja más de 'ventana' bloques sin respuesta, así que la memoria no
+    depende del largo total. Lanza RuntimeError si el coordinador responde un error."""
+    lector = LectorJson(sock)
+    enviar_mensaje(sock, {"type": "sum_stream", "ventana": ventana})
+    ventana = _esperar(lector, "stream_ok")["ventana"]
+    pendientes = 0
+    for seq, (bloque_a, bloque_b) in enumerate(pares_bloques):
+        if pendientes >= ventana:
+            yield _esperar(lector, "bloque_result")["result"]
+            pendientes -= 1
+        enviar_mensaje(sock, {"type": "bloque", "seq": seq, "a": bloque_a, "b": bloque_b})
+        pendientes += 1
+    enviar_mensaje(sock, {"type": "fin"})
+    for _ in range(pendientes):
+        yield _esperar(lector, "bloque_result")["result"]
+    _esperar(lector, "stream_fin")
+
+def _esperar(lector: LectorJson, tipo: str):
+    """Recibe el siguiente mensaje del stream y verifica que sea del tipo esperado."""
+    mensaje = lector.recibir(timeout=60.0)
+    if mensaje.get("type") != tipo:
+        raise RuntimeError(mensaje.get("error") or str(mensaje))
+    return mensaje
+
+def leer_bloques(ruta_a: str, ruta_b: str, tam_bloque: int) -> Iterator[Tuple[array, array]]:
+    """Lee en paralelo dos archivos de enteros int64 nativos, de a tam_bloque elementos."""
+    if os.path.getsize(ruta_a) != os.path.getsize(ruta_b) or os.path.getsize(ruta_a) % 8:
+        raise ValueError("Los archivos deben tener el mismo tamaño y contener enteros de 8 bytes")
+    with open(ruta_a, "rb") as archivo_a, open(ruta_b, "rb") as archivo_b:
+        while True:
+            bloque_a, bloque_b = array("q"), array("q")
+            for bloque, archivo in ((bloque_a, archivo_a), (bloque_b, archivo_b)):
+                try:
+                    bloque.fromfile(archivo, tam_bloque)
+                except EOFError:
+                    pass   # último bloque incompleto: fromfile ya agregó lo que había
+            if not bloque_a:
+                return
+            yield bloque_a, bloque_b
+
+def principal_stream(args):
+    """Suma dos archivos int64 por streaming y escribe el resultado en --salida (si se indica)."""
+    ruta_a, ruta_b = args.stream
+    inicio = time.time()
+    elementos = bloques = 0
+    salida = open(args.salida, "wb") if args.salida else None
+    try:
+        with abrir_cliente(args.host, args.port, timeout=10.0) as sock:
+            for resultado in sumar_en_stream(sock, leer_bloques(ruta_a, ruta_b, args.bloque), args.ventana):
+                if not isinstance(resultado, array):
+                    resultado = array("q", resultado)
+                if salida:
+                    resultado.tofile(salida)
+                elementos += len(resultado)
+                bloques += 1
+    except RuntimeError as e:
+        print(f"[cliente] Error: {e}")
+        return
+    finally:
+        if salida:
+            salida.close()
+    print(f"[cliente] Stream OK | bloques={bloques} n={elementos} tiempo={time.time() - inicio:.4f}s")
+
+def cargar_carga(ruta: str, binario: bool) -> List[Dict]:
+    """Lee un archivo JSONL de carga. Las líneas con 'type' se envían tal cual; cualquier
+    otra línea (p. ej. las de requests.jsonl) se vuelve una sum_arrays determinista con
+    a = los bytes de la línea y b = los mismos al revés, así que un mismo archivo genera
+    siempre la misma carga."""
+    solicitudes = []
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                obj = json.loads(linea)
+            except ValueError:
+                obj = None
+            if isinstance(obj, dict) and "type" in obj:
+                solicitud = obj
+            else:
+                datos = list(linea.encode("utf-8"))
+                solicitud = {"type": "sum_arrays", "a": datos, "b": datos[::-1]}
+            if binario:
+                for campo in ("a", "b"):
+                    if isinstance(solicitud.get(campo), list):
+                        solicitud[campo] = como_buffer(solicitud[campo])
+            solicitudes.append(solicitud)
+    return solicitudes
+
+def percentil(valores: Sequence[float], p: float) -> float:
+    """Percentil p (0-100) por rango más cercano; 0.0 si no hay valores."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))]
+
+def principal_replay(args):
+    """Reproduce un archivo JSONL de carga contra el coordinador, a una tasa objetivo
+    (--rate, 0 = lo más rápido posible) y con a lo sumo --concurrencia solicitudes en
+    vuelo, y reporta throughput y latencias."""
+    solicitudes = cargar_carga(args.replay, args.binario) * args.repeticiones
+    if not solicitudes:
+        print("[cliente] El archivo de carga no tiene solicitudes")
+        return
+    latencias: List[float] = []
+    errores = ocupadas = 0
+    lock = threading.Lock()
+    cupos = threading.Semaphore(args.concurrencia)
+
+    def registrar(futuro, enviado: float):
+        """Anota la latencia (o el error) de una solicitud al recibir su respuesta."""
+        nonlocal errores, ocupadas
+        duracion = time.monotonic() - enviado
+        cupos.release()
+        tipo_respuesta = futuro.result().get("type") if futuro.exception() is None else None
+        with lock:
+            if tipo_respuesta in ("ok", "batch_ok"):
+                latencias.append(duracion)
+            else:
+                errores += 1
+                ocupadas += tipo_respuesta == "busy"
+
+    with ClienteCalculo(args.host, args.port, conexiones=args.conexiones, binario=args.binario) as cliente:
+        inicio = time.monotonic()
+        futuros = []
+        for i, solicitud in enumerate(solicitudes):
+            if args.rate > 0:
+                espera = inicio + i / args.rate - time.monotonic()
+                if espera > 0:
+                    time.sleep(espera)
+            cupos.acquire()
+            enviado = time.monotonic()
+            futuro = cliente.enviar(solicitud)
+            futuro.add_done_callback(lambda f, t=enviado: registrar(f, t))
+            futuros.append(futuro)
+        wait(futuros)
+        total = time.monotonic() - inicio
+
+    ms = lambda p: percentil(latencias, p) * 1000
+    print(f"[cliente] Replay: solicitudes={len(solicitudes)} errores={errores} (busy={ocupadas}) tiempo={total:.3f}s "
+          f"rps={len(solicitudes) / total:.1f}")
+    print(f"[cliente] Latencia ms: p50={ms(50):.2f} p95={ms(95):.2f} p99={ms(99):.2f} max={ms(100):.2f}")
+
+def principal_resultado(args):
+    """Pide con 'get_result' el resultado de una tarea anotada en el diario del coordinador,
+    esperando mientras siga en curso (p. ej. si el coordinador se reinició y la retomó)."""
+    with ClienteCalculo(args.host, args.port, timeout=60.0) as cliente:
+        try:
+            resultado = cliente.resultado_tarea(args.resultado)
+        except ErrorCalculo as exc:
+            print(f"[cliente] Error: {exc}")
+            return
+    print(f"[cliente] Resultado de {args.resultado}={list(resultado) if es_buffer(resultado) else resultado}")
+
 def principal():
     """Punto de entrada del cliente: solicita dos arreglos tamaño 5 y envía la suma al coordinador."""
     ap = argparse.ArgumentParser(description="Cliente de suma distribuida")
     ap.add_argument("--host", default="127.0.0.1")
     ap.add_argument("--port", type=int, default=5000)
+    ap.add_argument("--binario", action="store_true",
+                    help="envía los arreglos como buffers int64 en lugar de listas JSON")
+    ap.add_argument("--deadline-ms", type=int, default=0,
+                    help="plazo total de la solicitud en milisegundos (0 = el del coordinador)")
+    ap.add_argument("--stream", nargs=2, metavar=("A", "B"),
+                    help="suma dos archivos de enteros int64 por bloques (sum_stream)")
+    ap.add_argument("--salida", help="archivo donde escribir el resultado del stream (int64)")
+    ap.add_argument("--bloque", type=int, default=65536, help="elementos por bloque del stream")
+    ap.add_argument("--ventana", type=int, default=4, help="bloques del stream en vuelo a la vez")
+    ap.add_argument("--replay", metavar="ARCHIVO",
+                    help="reproduce un archivo JSONL de solicitudes (p. ej. requests.jsonl) y mide latencias")
+    ap.add_argument("--rate", type=float, default=0.0, help="solicitudes por segundo del replay (0 = sin límite)")
+    ap.add_argument("--concurrencia", type=int, default=32, help="solicitudes del replay en vuelo a la vez")
+    ap.add_argument("--conexiones", type=int, default=1, help="conexiones persistentes del replay")
+    ap.add_argument("--repeticiones", type=int, default=1, help="veces que se reproduce el archivo")
+    ap.add_argument("--task-id", help="anota la suma en el diario del coordinador con este id (ver --resultado)")
+    ap.add_argument("--resultado", metavar="TASK_ID",
+                    help="pide al coordinador el resultado de una tarea anotada con --task-id y termina")
     args = ap.parse_args()
 
+    if args.resultado:
+        principal_resultado(args)
+        return
+
+    if args.stream:
+        principal_stream(args)
+        return
+    if args.replay:
+        principal_replay(args)
+        return
+
     arreglo_izquierdo = leer_arreglo_usuario("primer arreglo (A)")
     arreglo_derecho   = leer_arreglo_usuario("segundo arreglo (B)")
 
@@ -40,15 +230,23 @@ def principal():
     print(f"[cliente] B={arreglo_derecho}")
 
     with abrir_cliente(args.host, args.port, timeout=10.0) as sock:
-        enviar_json(sock, {"type": "sum_arrays", "a": arreglo_izquierdo, "b": arreglo_derecho})
-        respuesta = recibir_json(sock, timeout=20.0)
+        if args.binario:
+            carga = {"type": "sum_arrays", "a": array("q", arreglo_izquierdo), "b": array("q", arreglo_derecho)}
+        else:
+            carga = {"type": "sum_arrays", "a": arreglo_izquierdo, "b": arreglo_derecho}
+        if args.deadline_ms:
+            carga["deadline_ms"] = args.deadline_ms
+        if args.task_id:
+            carga["task_id"] = args.task_id
+        enviar_mensaje(sock, carga)
+        respuesta = LectorJson(sock).recibir(timeout=20.0)
 
     if respuesta.get("type") != "ok":
         mensaje_error = respuesta.get("error") or str (respuesta)
         print(f"[cliente] Error: {mensaje_error}")
         return
 
-    resultado_suma = respuesta["result"]
+    resultado_suma = list(respuesta["result"])
     tiempo_seg = float(respuesta.get("elapsed", 0.0))
     operadores_info = respuesta.get("operadores", [])
 
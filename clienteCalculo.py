@@ -0,0 +1,425 @@
+import asyncio, itertools, socket, threading, time
+from array import array
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils import (abrir_cliente, enviar_mensaje, es_buffer, LectorJson, MAX_MENSAJE_BYTES,
+                   enviar_mensaje_async, recibir_mensaje_async)
+
+# Tipos de solicitud cuyo resultado es un arreglo (el resto retorna un escalar)
+TIPOS_ELEMENTO = ("sum_arrays", "sub_arrays", "mul_arrays")
+
+class ErrorCalculo(RuntimeError):
+    """El coordinador respondió 'error' o se perdió la conexión antes de la respuesta."""
+
+class ErrorOcupado(ErrorCalculo):
+    """El coordinador respondió 'busy': no tenía capacidad; sugiere reintentar pasados
+    retry_after_ms."""
+    def __init__(self, retry_after_ms: int):
+        super().__init__(f"Coordinador ocupado; reintentar en {retry_after_ms}ms")
+        self.retry_after_ms = retry_after_ms
+
+class ErrorPendiente(ErrorCalculo):
+    """La tarea con ese task_id sigue en curso (p. ej. la retomó un coordinador reiniciado);
+    su resultado se pide con 'get_result' pasados retry_after_ms."""
+    def __init__(self, task_id: str, retry_after_ms: int):
+        super().__init__(f"Tarea {task_id} en curso; consultar en {retry_after_ms}ms")
+        self.task_id = task_id
+        self.retry_after_ms = retry_after_ms
+
+def como_buffer(valores: Sequence[int]) -> array:
+    """Arreglo int64 para enviar en formato binario (sin copia si ya es buffer)."""
+    return valores if es_buffer(valores) else array("q", valores)
+
+def armar_solicitud(tipo: str, a: Sequence[int], b: Optional[Sequence[int]] = None, funcion: str = "sum",
+                    deadline_ms: Optional[int] = None, binario: bool = True,
+                    task_id: Optional[str] = None) -> Dict[str, Any]:
+    """Arma una solicitud de cálculo (ver TIPOS_SOLICITUD del coordinador). Con task_id un
+    coordinador con diario la anota y puede retomarla si se reinicia."""
+    formato = como_buffer if binario else list
+    solicitud = {"type": tipo, "a": formato(a)}
+    if b is not None:
+        solicitud["b"] = formato(b)
+    if tipo == "reduce_array":
+        solicitud["funcion"] = funcion
+    if deadline_ms:
+        solicitud["deadline_ms"] = deadline_ms
+    if task_id is not None:
+        solicitud["task_id"] = task_id
+    return solicitud
+
+def armar_lote(tipo: str, pares: Iterable[Tuple[Sequence[int], Optional[Sequence[int]]]], funcion: str = "sum",
+               deadline_ms: Optional[int] = None, binario: bool = True) -> Dict[str, Any]:
+    """Arma un 'batch' con todos los pares (a, b) concatenados y el largo de cada uno."""
+    # En JSON se concatenan listas, que admiten enteros fuera de int64
+    a, b, largos = (array("q"), array("q"), []) if binario else ([], [], [])
+    sin_b = True
+    for izquierdo, derecho in pares:
+        a.extend(izquierdo)
+        if derecho is not None:
+            b.extend(derecho)
+            sin_b = False
+        largos.append(len(izquierdo))
+    solicitud = armar_solicitud(tipo, a, None if sin_b else b, funcion, deadline_ms, binario)
+    solicitud["type"] = "batch"
+    solicitud["operacion"] = tipo
+    solicitud["largos"] = largos
+    return solicitud
+
+def resultado_de(respuesta: Dict[str, Any]) -> Any:
+    """Resultado de una respuesta 'ok'/'batch_ok'; lanza ErrorOcupado si es un 'busy',
+    ErrorPendiente si es un 'pending' y ErrorCalculo si es un error."""
+    if respuesta.get("type") == "busy":
+        raise ErrorOcupado(respuesta.get("retry_after_ms", 100))
+    if respuesta.get("type") == "pending":
+        raise ErrorPendiente(respuesta["task_id"], respuesta.get("retry_after_ms", 500))
+    if respuesta.get("type") not in ("ok", "batch_ok"):
+        raise ErrorCalculo(respuesta.get("error") or str(respuesta))
+    return respuesta["result"]
+
+def separar_lote(respuesta: Dict[str, Any], tipo: str) -> List[Any]:
+    """Resultados por par de un 'batch_ok' (corta con 'largos' los elemento a elemento)."""
+    resultado = resultado_de(respuesta)
+    if tipo not in TIPOS_ELEMENTO:
+        return list(resultado)
+    partes, inicio = [], 0
+    for n in respuesta["largos"]:
+        partes.append(resultado[inicio:inicio + n])
+        inicio += n
+    return partes
+
+class _ConexionPipeline:
+    """Conexión persistente con el coordinador con muchas solicitudes en vuelo: cada una
+    lleva un req_id y un hilo lector entrega cada respuesta al Future de su solicitud,
+    en el orden en que lleguen."""
+    def __init__(self, host: str, puerto: int, timeout_conexion: float):
+        """Conecta y arranca el hilo lector."""
+        self.sock = abrir_cliente(host, puerto, timeout=timeout_conexion)
+        # Las esperas se acotan en los Future; el socket bloquea sin límite
+        self.sock.settimeout(None)
+        self.lector = LectorJson(self.sock)
+        self.lock_envio = threading.Lock()
+        self.lock_pendientes = threading.Lock()
+        self.pendientes: Dict[int, Future] = {}
+        self.abierta = True
+        threading.Thread(target=self._leer, daemon=True, name="LectorCliente").start()
+
+    def enviar(self, req_id: int, solicitud: Dict[str, Any]) -> Future:
+        """Envía la solicitud con su req_id y retorna el Future de la respuesta."""
+        futuro = Future()
+        with self.lock_pendientes:
+            if not self.abierta:
+                raise ConnectionError("Conexión con el coordinador cerrada")
+            self.pendientes[req_id] = futuro
+        try:
+            # El envío puede bloquear si el coordinador aplica contrapresión; el lector
+            # sigue entregando respuestas mientras tanto
+            with self.lock_envio:
+                enviar_mensaje(self.sock, dict(solicitud, req_id=req_id))
+        except OSError as e:
+            self._fallar(e)
+            raise
+        return futuro
+
+    def _leer(self):
+        """Hilo lector: empareja cada respuesta con su solicitud por req_id."""
+        try:
+            while True:
+                respuesta = self.lector.recibir()
+                with self.lock_pendientes:
+                    futuro = self.pendientes.pop(respuesta.get("req_id"), None)
+                if futuro is not None:
+                    try:
+                        futuro.set_result(respuesta)
+                    except InvalidStateError:
+                        pass   # quien la pidió la canceló
+        except Exception as e:
+            self._fallar(e)
+
+    def _fallar(self, error: Exception):
+        """Cierra la conexión y falla todas las solicitudes que seguían esperando."""
+        with self.lock_pendientes:
+            self.abierta = False
+            pendientes, self.pendientes = self.pendientes, {}
+        self.cerrar()
+        for futuro in pendientes.values():
+            try:
+                futuro.set_exception(ErrorCalculo(f"Conexión con el coordinador perdida: {error}"))
+            except InvalidStateError:
+                pass
+
+    def cerrar(self):
+        """Cierra el socket (el hilo lector termina al notarlo)."""
+        self.abierta = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+class ClienteCalculo:
+    """Cliente reutilizable del coordinador. Mantiene 'conexiones' conexiones persistentes
+    y reparte las solicitudes entre ellas en ronda; cada una admite muchas solicitudes en
+    vuelo (pipelining), así que enviar() retorna sin esperar la respuesta."""
+    def __init__(self, host: str = "127.0.0.1", puerto: int = 5000, conexiones: int = 1,
+                 timeout: float = 30.0, binario: bool = True, reintentos_ocupado: int = 3):
+        """- conexiones: conexiones persistentes a abrir (a medida que se usan)
+        - timeout: espera máxima de cada respuesta en los métodos que la esperan
+        - binario: envía los arreglos como buffers int64 en lugar de listas JSON
+        - reintentos_ocupado: veces que solicitar() reenvía una solicitud que recibió
+          'busy', esperando el retry_after_ms sugerido"""
+        self.host = host
+        self.puerto = puerto
+        self.timeout = timeout
+        self.binario = binario
+        self.reintentos_ocupado = reintentos_ocupado
+        self._conexiones: List[Optional[_ConexionPipeline]] = [None] * max(1, conexiones)
+        self._turno = itertools.count()
+        self._req_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _conexion(self) -> _ConexionPipeline:
+        """Siguiente conexión de la ronda, reabriéndola si se cerró."""
+        i = next(self._turno) % len(self._conexiones)
+        with self._lock:
+            conexion = self._conexiones[i]
+            if conexion is None or not conexion.abierta:
+                conexion = self._conexiones[i] = _ConexionPipeline(self.host, self.puerto, min(self.timeout, 10.0))
+            return conexion
+
+    def enviar(self, solicitud: Dict[str, Any]) -> Future:
+        """Envía una solicitud cualquiera y retorna un Future con la respuesta (dict).
+        Si la conexión elegida se había cerrado (p. ej. por inactividad) reintenta una vez
+        por una nueva."""
+        try:
+            return self._conexion().enviar(next(self._req_ids), solicitud)
+        except (ConnectionError, OSError):
+            return self._conexion().enviar(next(self._req_ids), solicitud)
+
+    def solicitar(self, solicitud: Dict[str, Any]) -> Dict[str, Any]:
+        """Envía una solicitud y espera su respuesta; ante un 'busy' espera lo sugerido y
+        reintenta (hasta reintentos_ocupado veces, luego retorna el 'busy')."""
+        for _ in range(self.reintentos_ocupado):
+            respuesta = self.enviar(solicitud).result(self.timeout)
+            if respuesta.get("type") != "busy":
+                return respuesta
+            time.sleep(respuesta.get("retry_after_ms", 100) / 1000)
+        return self.enviar(solicitud).result(self.timeout)
+
+    def operar(self, tipo: str, a: Sequence[int], b: Optional[Sequence[int]] = None, funcion: str = "sum",
+               deadline_ms: Optional[int] = None, task_id: Optional[str] = None) -> Any:
+        """Resuelve una operación (sum_arrays, dot_arrays, reduce_array, ...) y retorna el
+        resultado. Lanza ErrorCalculo si el coordinador responde un error.
+        Con task_id (coordinador con --diario) la llamada puede repetirse tras perder la
+        conexión: no se recalcula, y si la tarea sigue en curso espera su resultado."""
+        solicitud = armar_solicitud(tipo, a, b, funcion, deadline_ms, self.binario, task_id)
+        try:
+            return resultado_de(self.solicitar(solicitud))
+        except ErrorPendiente:
+            return self.resultado_tarea(task_id)
+
+    def resultado_tarea(self, task_id: str, espera_seg: Optional[float] = None) -> Any:
+        """Resultado de una tarea anotada en el diario del coordinador (por su task_id),
+        consultando con 'get_result' mientras siga en curso, hasta espera_seg (por omisión
+        el timeout del cliente). Tolera que el coordinador se esté reiniciando."""
+        limite = time.monotonic() + (self.timeout if espera_seg is None else espera_seg)
+        while True:
+            try:
+                return resultado_de(self.solicitar({"type": "get_result", "task_id": task_id}))
+            except ErrorPendiente as exc:
+                espera = exc.retry_after_ms / 1000
+                if time.monotonic() + espera > limite:
+                    raise
+            except (ConnectionError, OSError) as exc:
+                espera = 0.5
+                if time.monotonic() + espera > limite:
+                    raise ErrorCalculo(f"Sin conexión con el coordinador: {exc}")
+            time.sleep(espera)
+
+    def sumar(self, a: Sequence[int], b: Sequence[int], deadline_ms: Optional[int] = None) -> Any:
+        """Suma elemento a elemento de a y b."""
+        return self.operar("sum_arrays", a, b, deadline_ms=deadline_ms)
+
+    def operar_muchos(self, tipo: str, pares: Iterable[Tuple[Sequence[int], Optional[Sequence[int]]]],
+                      funcion: str = "sum", deadline_ms: Optional[int] = None) -> List[Any]:
+        """Resuelve una solicitud por par, todas en vuelo a la vez, y retorna los
+        resultados en el orden de los pares (sin reintentos: un 'busy' lanza ErrorOcupado)."""
+        futuros = [self.enviar(armar_solicitud(tipo, a, b, funcion, deadline_ms, self.binario)) for a, b in pares]
+        return [resultado_de(futuro.result(self.timeout)) for futuro in futuros]
+
+    def lote(self, tipo: str, pares: Iterable[Tuple[Sequence[int], Optional[Sequence[int]]]],
+             funcion: str = "sum", deadline_ms: Optional[int] = None) -> List[Any]:
+        """Resuelve todos los pares en un solo mensaje 'batch' y retorna un resultado por par."""
+        respuesta = self.solicitar(armar_lote(tipo, pares, funcion, deadline_ms, self.binario))
+        return separar_lote(respuesta, tipo)
+
+    def cerrar(self):
+        """Cierra las conexiones; las solicitudes aún en vuelo fallan con ErrorCalculo."""
+        with self._lock:
+            conexiones, self._conexiones = self._conexiones, [None] * len(self._conexiones)
+        for conexion in conexiones:
+            if conexion is not None:
+                conexion.cerrar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+class _ConexionPipelineAsync:
+    """Versión asyncio de _ConexionPipeline: una tarea lectora entrega las respuestas."""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Toma una conexión ya abierta y arranca la tarea lectora."""
+        self.reader = reader
+        self.writer = writer
+        self.pendientes: Dict[int, asyncio.Future] = {}
+        self.abierta = True
+        self.lectora = asyncio.create_task(self._leer())
+
+    @classmethod
+    async def abrir(cls, host: str, puerto: int, timeout: float) -> "_ConexionPipelineAsync":
+        """Conecta con timeout de conexión."""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, puerto, limit=MAX_MENSAJE_BYTES), timeout)
+        return cls(reader, writer)
+
+    async def enviar(self, req_id: int, solicitud: Dict[str, Any]) -> asyncio.Future:
+        """Envía la solicitud con su req_id y retorna el future de la respuesta."""
+        if not self.abierta:
+            raise ConnectionError("Conexión con el coordinador cerrada")
+        futuro = asyncio.get_running_loop().create_future()
+        self.pendientes[req_id] = futuro
+        try:
+            await enviar_mensaje_async(self.writer, dict(solicitud, req_id=req_id))
+        except OSError as e:
+            self._fallar(e)
+            raise
+        return futuro
+
+    async def _leer(self):
+        """Tarea lectora: empareja cada respuesta con su solicitud por req_id."""
+        try:
+            while True:
+                respuesta = await recibir_mensaje_async(self.reader)
+                futuro = self.pendientes.pop(respuesta.get("req_id"), None)
+                if futuro is not None and not futuro.done():
+                    futuro.set_result(respuesta)
+        except asyncio.CancelledError:
+            self._fallar(ConnectionError("cerrada por el cliente"))
+        except Exception as e:
+            self._fallar(e)
+
+    def _fallar(self, error: Exception):
+        """Cierra la conexión y falla todas las solicitudes que seguían esperando."""
+        self.abierta = False
+        pendientes, self.pendientes = self.pendientes, {}
+        self.writer.close()
+        for futuro in pendientes.values():
+            if not futuro.done():
+                futuro.set_exception(ErrorCalculo(f"Conexión con el coordinador perdida: {error}"))
+                futuro.exception()   # marca el error como leído aunque nadie lo espere
+
+    def cerrar(self):
+        """Cierra la conexión y detiene la tarea lectora."""
+        self.abierta = False
+        self.lectora.cancel()
+        self.writer.close()
+
+class ClienteCalculoAsync:
+    """Versión asyncio de ClienteCalculo (mismos métodos, como corrutinas). Se usa desde
+    un único event loop."""
+    def __init__(self, host: str = "127.0.0.1", puerto: int = 5000, conexiones: int = 1,
+                 timeout: float = 30.0, binario: bool = True, reintentos_ocupado: int = 3):
+        """Mismos parámetros que ClienteCalculo."""
+        self.host = host
+        self.puerto = puerto
+        self.timeout = timeout
+        self.binario = binario
+        self.reintentos_ocupado = reintentos_ocupado
+        self._conexiones: List[Optional[_ConexionPipelineAsync]] = [None] * max(1, conexiones)
+        self._turno = itertools.count()
+        self._req_ids = itertools.count(1)
+        self._lock = asyncio.Lock()
+
+    async def _conexion(self) -> _ConexionPipelineAsync:
+        """Siguiente conexión de la ronda, reabriéndola si se cerró."""
+        i = next(self._turno) % len(self._conexiones)
+        async with self._lock:
+            conexion = self._conexiones[i]
+            if conexion is None or not conexion.abierta:
+                conexion = self._conexiones[i] = await _ConexionPipelineAsync.abrir(
+                    self.host, self.puerto, min(self.timeout, 10.0))
+            return conexion
+
+    async def enviar(self, solicitud: Dict[str, Any]) -> asyncio.Future:
+        """Envía una solicitud y retorna un future con la respuesta (reintenta una vez si
+        la conexión elegida se había cerrado)."""
+        try:
+            return await (await self._conexion()).enviar(next(self._req_ids), solicitud)
+        except (ConnectionError, OSError):
+            return await (await self._conexion()).enviar(next(self._req_ids), solicitud)
+
+    async def solicitar(self, solicitud: Dict[str, Any]) -> Dict[str, Any]:
+        """Ver ClienteCalculo.solicitar."""
+        for _ in range(self.reintentos_ocupado):
+            respuesta = await asyncio.wait_for(await self.enviar(solicitud), self.timeout)
+            if respuesta.get("type") != "busy":
+                return respuesta
+            await asyncio.sleep(respuesta.get("retry_after_ms", 100) / 1000)
+        return await asyncio.wait_for(await self.enviar(solicitud), self.timeout)
+
+    async def operar(self, tipo: str, a: Sequence[int], b: Optional[Sequence[int]] = None,
+                     funcion: str = "sum", deadline_ms: Optional[int] = None, task_id: Optional[str] = None) -> Any:
+        """Ver ClienteCalculo.operar."""
+        solicitud = armar_solicitud(tipo, a, b, funcion, deadline_ms, self.binario, task_id)
+        try:
+            return resultado_de(await self.solicitar(solicitud))
+        except ErrorPendiente:
+            return await self.resultado_tarea(task_id)
+
+    async def resultado_tarea(self, task_id: str, espera_seg: Optional[float] = None) -> Any:
+        """Ver ClienteCalculo.resultado_tarea."""
+        limite = time.monotonic() + (self.timeout if espera_seg is None else espera_seg)
+        while True:
+            try:
+                return resultado_de(await self.solicitar({"type": "get_result", "task_id": task_id}))
+            except ErrorPendiente as exc:
+                espera = exc.retry_after_ms / 1000
+                if time.monotonic() + espera > limite:
+                    raise
+            except (ConnectionError, OSError) as exc:
+                espera = 0.5
+                if time.monotonic() + espera > limite:
+                    raise ErrorCalculo(f"Sin conexión con el coordinador: {exc}")
+            await asyncio.sleep(espera)
+
+    async def sumar(self, a: Sequence[int], b: Sequence[int], deadline_ms: Optional[int] = None) -> Any:
+        """Suma elemento a elemento de a y b."""
+        return await self.operar("sum_arrays", a, b, deadline_ms=deadline_ms)
+
+    async def operar_muchos(self, tipo: str, pares: Iterable[Tuple[Sequence[int], Optional[Sequence[int]]]],
+                            funcion: str = "sum", deadline_ms: Optional[int] = None) -> List[Any]:
+        """Ver ClienteCalculo.operar_muchos."""
+        futuros = [await self.enviar(armar_solicitud(tipo, a, b, funcion, deadline_ms, self.binario))
+                   for a, b in pares]
+        return [resultado_de(await asyncio.wait_for(futuro, self.timeout)) for futuro in futuros]
+
+    async def lote(self, tipo: str, pares: Iterable[Tuple[Sequence[int], Optional[Sequence[int]]]],
+                   funcion: str = "sum", deadline_ms: Optional[int] = None) -> List[Any]:
+        """Ver ClienteCalculo.lote."""
+        respuesta = await self.solicitar(armar_lote(tipo, pares, funcion, deadline_ms, self.binario))
+        return separar_lote(respuesta, tipo)
+
+    async def cerrar(self):
+        """Cierra las conexiones; las solicitudes aún en vuelo fallan con ErrorCalculo."""
+        conexiones, self._conexiones = self._conexiones, [None] * len(self._conexiones)
+        for conexion in conexiones:
+            if conexion is not None:
+                conexion.cerrar()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.cerrar()
@@ -0,0 +1,345 @@
+import json, logging, mmap, os, struct, threading, time, zlib
+from array import array
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils import es_buffer
+
+log = logging.getLogger("diario")
+
+# Cada registro es una cabecera fija (marca, tipo, crc32 y largo del cuerpo) seguida del
+# cuerpo: largo de la cabecera JSON, la cabecera JSON y, alineados a 8 bytes, los datos
+# int64 si los hay. El cuerpo se copia antes que la cabecera fija, así un registro a medio
+# escribir (el proceso murió en el medio) no pasa la verificación y marca el final.
+_REGISTRO = struct.Struct("<2sBxIQ")
+_LARGO_JSON = struct.Struct("<I")
+MARCA = b"DT"
+TAREA, DESPACHO, CHUNK, FIN = (ord(tipo) for tipo in "TDCF")
+TAM_MINIMO = 1 << 20   # el archivo arranca en 1 MiB y crece al doble cuando se llena
+
+def _alinear(n: int) -> int:
+    """n redondeado hacia arriba a múltiplo de 8."""
+    return (n + 7) & ~7
+
+class TareaDiario:
+    """Lo que el diario sabe de una tarea: su definición, dónde están sus entradas en el
+    archivo, los chunks despachados y resueltos y cómo terminó."""
+    def __init__(self, id_tarea: str, cabecera: Dict[str, Any], pos_entradas: int):
+        """Arma la entrada a partir de la cabecera del registro de la tarea.
+        - pos_entradas: posición en el archivo de 'a' (y a continuación 'b'), en int64
+        """
+        self.id = id_tarea
+        self.operacion = cabecera["operacion"]
+        self.funcion = cabecera["funcion"]
+        self.formato = cabecera["formato"]    # 'bin' o 'json': cómo se responde el resultado
+        self.n = cabecera["n"]
+        self.con_derecha = cabecera["con_derecha"]
+        self.partes: List[Tuple[int, int, int]] = [tuple(parte) for parte in cabecera["partes"]]
+        self.inicio_ts = cabecera["ts"]
+        self.plazo_seg: Optional[float] = cabecera.get("plazo_seg")
+        self.pos_entradas = pos_entradas
+        # idx -> (posición de los datos int64, None) o (None, valor JSON)
+        self.resueltos: Dict[int, Tuple[Optional[int], Any]] = {}
+        self.despachados: set = set()
+        self.terminada = False
+        self.error: Optional[str] = None
+        self.fin_ts: Optional[float] = None
+
+    def reubicar(self, otra: "TareaDiario"):
+        """Toma las posiciones en el archivo de otra entrada de la misma tarea (la del
+        archivo recién compactado); el estado en memoria no cambia."""
+        self.pos_entradas = otra.pos_entradas
+        self.resueltos.update(otra.resueltos)
+
+class DiarioTareas:
+    """Diario de tareas en disco para retomar trabajos largos si el coordinador muere: un
+    archivo de solo agregado, mapeado en memoria (mmap), donde se anota cada tarea con
+    task_id (definición y entradas), sus chunks despachados y resueltos (con el resultado)
+    y su fin. Al abrirlo se recorre el archivo para reconstruir el índice, así un
+    coordinador reiniciado sabe qué chunks faltan y reparte solo esos. Las tareas terminadas
+    hace más de ttl_seg salen del índice, y cada vez que el archivo duplica su tamaño desde
+    la última compactación se reescribe sin los registros que ya no sirven.
+    Copiar al mapa deja los datos en el page cache, que sobrevive a la muerte del proceso;
+    al terminar cada tarea se hace msync para que sobreviva también a una caída del sistema.
+    Es seguro entre hilos."""
+    def __init__(self, ruta: str, ttl_seg: float = 3600.0):
+        """Abre (o crea) el diario y lo compacta.
+        - ruta: archivo del diario
+        - ttl_seg: segundos que se guarda una tarea terminada para 'get_result'
+        """
+        self.ruta = ruta
+        self.ttl_seg = ttl_seg
+        self.lock = threading.Lock()
+        self.tareas: Dict[str, TareaDiario] = {}
+        self.terminadas: deque = deque()   # (fin_ts, task_id) en orden de fin, para vencerlas
+        self.fd = -1
+        self.mapa: Optional[mmap.mmap] = None
+        self.retirados: List[mmap.mmap] = []   # mapas reemplazados con vistas todavía abiertas
+        self.fin = 0   # posición donde va el próximo registro
+        self._abrir()
+        self._vencer(time.time())
+        self._compactar()
+        self.tam_compactado = self.fin
+        pendientes = sum(not tarea.terminada for tarea in self.tareas.values())
+        log.info("Diario %s: %d tareas (%d sin terminar), %d bytes", ruta, len(self.tareas), pendientes, self.fin)
+
+    def _abrir(self):
+        """Mapea el archivo y reconstruye el índice de tareas recorriendo sus registros. Las
+        tareas que ya estaban en el índice (reapertura tras compactar) conservan su entrada,
+        con las posiciones nuevas, así quien la tiene en la mano sigue leyendo bien."""
+        previas = self.tareas
+        self._cerrar_mapa()
+        self.fd = os.open(self.ruta, os.O_RDWR | os.O_CREAT, 0o644)
+        tam = os.fstat(self.fd).st_size
+        if tam < TAM_MINIMO:
+            os.ftruncate(self.fd, TAM_MINIMO)
+            tam = TAM_MINIMO
+        self.mapa = mmap.mmap(self.fd, tam)
+        self.tareas = {}
+        self.fin = 0
+        self.terminadas = deque()
+        for pos, tipo, cabecera, pos_datos, fin in self._registros():
+            self._indexar(tipo, cabecera, pos_datos, fin - pos_datos)
+            self.fin = fin
+        if previas:
+            for id_tarea, tarea in list(self.tareas.items()):
+                if id_tarea in previas:
+                    previas[id_tarea].reubicar(tarea)
+                    self.tareas[id_tarea] = previas[id_tarea]
+            self.terminadas = deque((tarea.fin_ts, tarea.id) for tarea in sorted(
+                (tarea for tarea in self.tareas.values() if tarea.terminada), key=lambda tarea: tarea.fin_ts))
+
+    def _registros(self) -> Iterator[Tuple[int, int, Dict[str, Any], int, int]]:
+        """Recorre los registros válidos desde el principio y retorna (posición, tipo,
+        cabecera, posición de los datos, fin) de cada uno; se detiene en el primero
+        incompleto o corrupto."""
+        pos, tam = 0, len(self.mapa)
+        with memoryview(self.mapa) as vista:
+            while pos + _REGISTRO.size <= tam:
+                marca, tipo, crc, largo = _REGISTRO.unpack_from(vista, pos)
+                inicio = pos + _REGISTRO.size
+                if marca != MARCA or inicio + largo > tam or zlib.crc32(vista[inicio:inicio + largo]) != crc:
+                    return
+                (largo_json,) = _LARGO_JSON.unpack_from(vista, inicio)
+                cabecera = json.loads(bytes(vista[inicio + _LARGO_JSON.size:inicio + _LARGO_JSON.size + largo_json]))
+                yield pos, tipo, cabecera, inicio + _alinear(_LARGO_JSON.size + largo_json), inicio + largo
+                pos = inicio + largo
+
+    def _indexar(self, tipo: int, cabecera: Dict[str, Any], pos_datos: int, largo_datos: int):
+        """Aplica un registro al índice de tareas."""
+        if tipo == TAREA:
+            self.tareas[cabecera["task_id"]] = TareaDiario(cabecera["task_id"], cabecera, pos_datos)
+            return
+        tarea = self.tareas.get(cabecera["task_id"])
+        if tarea is None:
+            return
+        if tipo == DESPACHO:
+            tarea.despachados.add(cabecera["idx"])
+        elif tipo == CHUNK:
+            tarea.resueltos[cabecera["idx"]] = (pos_datos, None) if largo_datos else (None, cabecera["valor"])
+        elif tipo == FIN:
+            tarea.terminada, tarea.error, tarea.fin_ts = True, cabecera["error"], cabecera["ts"]
+            self.terminadas.append((tarea.fin_ts, tarea.id))
+
+    def _vencida(self, tarea: TareaDiario, ahora: float) -> bool:
+        """True si la tarea terminó hace más de ttl_seg."""
+        return tarea.terminada and tarea.fin_ts + self.ttl_seg < ahora
+
+    def _vencer(self, ahora: float):
+        """Saca del índice las tareas terminadas hace más de ttl_seg; sus registros se
+        descartan en la próxima compactación (llamar con lock)."""
+        while self.terminadas and self.terminadas[0][0] + self.ttl_seg < ahora:
+            fin_ts, id_tarea = self.terminadas.popleft()
+            tarea = self.tareas.get(id_tarea)
+            # Una tarea reabierta (o terminada de nuevo después) deja aquí una marca vieja
+            if tarea is not None and tarea.terminada and tarea.fin_ts == fin_ts:
+                del self.tareas[id_tarea]
+
+    def _compactar(self) -> bool:
+        """Reescribe el archivo sin los registros de tareas que ya no están en el índice
+        (vencidas) ni los despachos de tareas terminadas, copiando tal cual los demás, y lo
+        vuelve a abrir. Retorna False si no había nada que descartar (llamar con lock)."""
+        conservar = []
+        for pos, tipo, cabecera, _, fin in self._registros():
+            tarea = self.tareas.get(cabecera["task_id"])
+            if tarea is not None and not (tipo == DESPACHO and tarea.terminada):
+                conservar.append((pos, fin))
+        if sum(fin - pos for pos, fin in conservar) == self.fin:
+            return False
+        antes = self.fin
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "wb") as archivo, memoryview(self.mapa) as vista:
+            for pos, fin in conservar:
+                archivo.write(vista[pos:fin])
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        self._cerrar_mapa()
+        os.replace(temporal, self.ruta)
+        self._abrir()
+        log.info("Diario compactado: %d → %d bytes", antes, self.fin)
+        return True
+
+    def _agregar(self, tipo: int, cabecera: Dict[str, Any], datos: Sequence[Any] = ()) -> int:
+        """Agrega un registro con la cabecera y los buffers int64 de datos; retorna la
+        posición de los datos en el archivo (llamar con lock)."""
+        texto = json.dumps(cabecera, separators=(",", ":")).encode("utf-8")
+        largo_cabecera = _alinear(_LARGO_JSON.size + len(texto))
+        vistas = [memoryview(dato).cast("B") for dato in datos]
+        largo = largo_cabecera + sum(vista.nbytes for vista in vistas)
+        self._asegurar(_REGISTRO.size + largo)
+        inicio = self.fin + _REGISTRO.size
+        previo = _LARGO_JSON.pack(len(texto)) + texto + bytes(largo_cabecera - _LARGO_JSON.size - len(texto))
+        self.mapa[inicio:inicio + largo_cabecera] = previo
+        crc = zlib.crc32(previo)
+        pos = pos_datos = inicio + largo_cabecera
+        for vista in vistas:
+            self.mapa[pos:pos + vista.nbytes] = vista
+            crc = zlib.crc32(vista, crc)
+            pos += vista.nbytes
+        self.mapa[self.fin:inicio] = _REGISTRO.pack(MARCA, tipo, crc, largo)
+        self.fin = pos
+        return pos_datos
+
+    def _asegurar(self, tam: int):
+        """Agranda el archivo (al doble) si el próximo registro no entra (llamar con lock)."""
+        if self.fin + tam <= len(self.mapa):
+            return
+        nuevo = max(2 * len(self.mapa), _alinear(self.fin + tam))
+        os.ftruncate(self.fd, nuevo)
+        viejo, self.mapa = self.mapa, mmap.mmap(self.fd, nuevo)
+        self._retirar(viejo)
+
+    def _retirar(self, mapa: Optional[mmap.mmap]):
+        """Cierra un mapa reemplazado. Si todavía hay vistas sobre él (entradas de tareas en
+        curso) no se puede: queda en retirados y se reintenta cada vez que se retira otro."""
+        pendientes = self.retirados + ([mapa] if mapa is not None else [])
+        self.retirados = []
+        for viejo in pendientes:
+            try:
+                viejo.close()
+            except BufferError:
+                self.retirados.append(viejo)
+
+    def iniciar(self, id_tarea: str, operacion: str, funcion: str, formato: str, partes: List[Tuple[int, int, int]],
+                izquierda: Any, derecha: Optional[Any], plazo_seg: Optional[float] = None) -> TareaDiario:
+        """Anota una tarea nueva con sus entradas (buffers int64) y el plazo pedido por el
+        cliente, que vuelve a usarse si se reanuda. ValueError si el task_id ya está en el diario."""
+        cabecera = {"task_id": id_tarea, "operacion": operacion, "funcion": funcion, "formato": formato,
+                    "n": len(izquierda), "con_derecha": derecha is not None,
+                    "partes": [list(parte) for parte in partes], "plazo_seg": plazo_seg, "ts": time.time()}
+        datos = [izquierda] if derecha is None else [izquierda, derecha]
+        with self.lock:
+            if id_tarea in self.tareas:
+                raise ValueError(f"La tarea {id_tarea} ya está en el diario")
+            tarea = self.tareas[id_tarea] = TareaDiario(id_tarea, cabecera, self._agregar(TAREA, cabecera, datos))
+        return tarea
+
+    def despachado(self, id_tarea: str, indice_parte: int):
+        """Anota que un chunk salió hacia un operador."""
+        with self.lock:
+            self._agregar(DESPACHO, {"task_id": id_tarea, "idx": indice_parte})
+            tarea = self.tareas.get(id_tarea)
+            if tarea is not None:
+                tarea.despachados.add(indice_parte)
+
+    def resuelto(self, id_tarea: str, indice_parte: int, resultado: Any):
+        """Anota el resultado de un chunk: un arreglo va como datos int64 (o en la cabecera
+        si trae enteros fuera de rango) y un parcial de dot/reduce en la cabecera."""
+        cabecera: Dict[str, Any] = {"task_id": id_tarea, "idx": indice_parte}
+        datos = ()
+        if es_buffer(resultado):
+            datos = (resultado,)
+        elif isinstance(resultado, list):
+            try:
+                datos = (array("q", resultado),)
+            except OverflowError:
+                cabecera["valor"] = resultado
+        else:
+            cabecera["valor"] = resultado
+        with self.lock:
+            pos = self._agregar(CHUNK, cabecera, datos)
+            tarea = self.tareas.get(id_tarea)
+            if tarea is not None:
+                tarea.resueltos[indice_parte] = (pos, None) if datos else (None, cabecera["valor"])
+
+    def terminar(self, id_tarea: str, error: Optional[str] = None):
+        """Anota el fin de una tarea (con el error si falló) y baja el diario a disco. De
+        paso vence las tareas viejas y, si el archivo duplicó su tamaño desde la última
+        compactación, lo compacta."""
+        ahora = time.time()
+        with self.lock:
+            self._agregar(FIN, {"task_id": id_tarea, "error": error, "ts": ahora})
+            tarea = self.tareas.get(id_tarea)
+            if tarea is not None:
+                tarea.terminada, tarea.error, tarea.fin_ts = True, error, ahora
+                self.terminadas.append((ahora, id_tarea))
+            self._vencer(ahora)
+            if self.fin >= max(TAM_MINIMO, 2 * self.tam_compactado):
+                self._compactar()   # copia con fsync: deja el archivo en disco
+                self.tam_compactado = self.fin
+                return
+            mapa = self.mapa
+        try:
+            mapa.flush()
+        except ValueError:
+            # Otro hilo lo reemplazó al crecer y ya lo cerró; el mapa nuevo cubre el mismo archivo
+            with self.lock:
+                self.mapa.flush()
+
+    def reabrir(self, id_tarea: str):
+        """Vuelve a dar por no terminada una tarea que falló, porque se reanuda; el próximo
+        fin anotado reemplaza al anterior."""
+        with self.lock:
+            tarea = self.tareas[id_tarea]
+            tarea.terminada, tarea.error, tarea.fin_ts = False, None, None
+
+    def tarea(self, id_tarea: str) -> Optional[TareaDiario]:
+        """Entrada de la tarea, o None si no está o ya venció."""
+        with self.lock:
+            tarea = self.tareas.get(id_tarea)
+        return None if tarea is None or self._vencida(tarea, time.time()) else tarea
+
+    def pendientes(self) -> List[TareaDiario]:
+        """Tareas anotadas que no terminaron."""
+        with self.lock:
+            return [tarea for tarea in self.tareas.values() if not tarea.terminada]
+
+    def entradas(self, tarea: TareaDiario) -> Tuple[memoryview, Optional[memoryview]]:
+        """Entradas de la tarea como vistas int64 sobre el mapa (sin copiarlas)."""
+        with self.lock:
+            vista = memoryview(self.mapa)
+            inicio, largo = tarea.pos_entradas, 8 * tarea.n
+        izquierda = vista[inicio:inicio + largo].cast("q")
+        derecha = vista[inicio + largo:inicio + 2 * largo].cast("q") if tarea.con_derecha else None
+        return izquierda, derecha
+
+    def resultado_chunk(self, tarea: TareaDiario, indice_parte: int) -> Any:
+        """Resultado anotado de un chunk: vista int64 sobre el mapa o el valor JSON."""
+        with self.lock:
+            pos, valor = tarea.resueltos[indice_parte]
+            if pos is None:
+                return valor
+            vista = memoryview(self.mapa)
+        _, inicio, fin = tarea.partes[indice_parte]
+        return vista[pos:pos + 8 * (fin - inicio)].cast("q")
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Tareas anotadas, cuántas siguen sin terminar y bytes usados del archivo."""
+        with self.lock:
+            return {"tareas": len(self.tareas), "pendientes": sum(not t.terminada for t in self.tareas.values()),
+                    "bytes": self.fin}
+
+    def _cerrar_mapa(self):
+        """Cierra el mapa (ver _retirar) y el archivo abiertos."""
+        mapa, self.mapa = self.mapa, None
+        self._retirar(mapa)
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def cerrar(self):
+        """Baja el diario a disco y lo cierra."""
+        with self.lock:
+            if self.mapa is not None:
+                self.mapa.flush()
+            self._cerrar_mapa()
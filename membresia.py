@@ -0,0 +1,66 @@
+import logging
+from typing import Any, Dict, Optional, Tuple
+from utils import abrir_cliente, enviar_mensaje, LectorJson, Repetidor
+
+log = logging.getLogger("membresia")
+
+def direccion(texto: str) -> Tuple[str, int]:
+    """Convierte 'host:puerto' en (host, puerto)."""
+    host, puerto = texto.rsplit(":", 1)
+    return host, int(puerto)
+
+class Anunciante:
+    """Mantiene a este proceso registrado como operador de un coordinador: envía
+    'register' al arrancar y cada intervalo_seg (el registro es idempotente, así un
+    coordinador reiniciado lo vuelve a conocer sin intervención) y 'leave' al detenerse,
+    para que el coordinador deje de repartirle chunks sin esperar a darlo por caído.
+    Lo usan los operadores (--registrar) y los coordinadores hijos (--padre)."""
+    def __init__(self, coordinador: Tuple[str, int], host: str, puerto: int, nombre: str,
+                 intervalo_seg: float = 10.0, token: Optional[str] = None):
+        """- coordinador: (host, puerto) del coordinador en el que registrarse
+        - host, puerto: dirección en la que este proceso atiende chunks
+        - nombre: nombre con que aparece en el coordinador (logs y métricas)
+        - token: secreto compartido que el coordinador exige en 'register'/'leave'
+        """
+        self.coordinador = coordinador
+        self.anuncio = {"host": host, "puerto": puerto, "nombre": nombre}
+        if token is not None:
+            self.anuncio["token"] = token
+        self.registrado: Optional[bool] = None   # None = aún sin intentar
+        self.hilo = Repetidor(intervalo_seg, self.registrar, nombre="Anunciante")
+
+    def _enviar(self, tipo: str, timeout: float = 3.0) -> Dict[str, Any]:
+        """Envía un mensaje de membresía al coordinador y retorna su respuesta."""
+        sock = abrir_cliente(*self.coordinador, timeout=timeout)
+        try:
+            enviar_mensaje(sock, dict(self.anuncio, type=tipo))
+            return LectorJson(sock).recibir(timeout=timeout)
+        finally:
+            sock.close()
+
+    def registrar(self):
+        """Envía un 'register'; solo se loguea cuando cambia el resultado."""
+        try:
+            respuesta = self._enviar("register")
+            ok = respuesta.get("type") == "register_ok"
+        except Exception as e:
+            respuesta, ok = {"error": str(e)}, False
+        if ok and self.registrado is not True:
+            log.info("Registrado en %s:%d como %s", *self.coordinador, respuesta.get("nombre"))
+        elif not ok and self.registrado is not False:
+            log.warning("No se pudo registrar en %s:%d (se reintenta): %s", *self.coordinador,
+                        respuesta.get("error") or respuesta.get("type"))
+        self.registrado = ok
+
+    def iniciar(self):
+        """Arranca el registro periódico (el primero sale de inmediato)."""
+        self.hilo.start()
+
+    def detener(self):
+        """Detiene el registro periódico y avisa al coordinador con un 'leave'."""
+        self.hilo.detener()
+        try:
+            self._enviar("leave", timeout=1.0)
+            log.info("Baja enviada a %s:%d", *self.coordinador)
+        except Exception as e:
+            log.warning("No se pudo enviar la baja a %s:%d: %s", *self.coordinador, e)
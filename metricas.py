@@ -0,0 +1,161 @@
+import bisect, threading, time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Tuple
+
+# Límites superiores (segundos) de los buckets de los histogramas: de 50µs a ~52s, cada
+# uno el doble del anterior
+LIMITES_SEG: List[float] = [5e-5 * 2 ** i for i in range(21)]
+
+def _clave(nombre: str, etiquetas: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """Clave de una serie: nombre y etiquetas ordenadas."""
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+def _serie(nombre: str, etiquetas: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    """Nombre de la serie en formato Prometheus: nombre{k="v",...}."""
+    partes = [f'{k}="{v}"' for k, v in etiquetas]
+    if extra:
+        partes.append(extra)
+    return f"{nombre}{{{','.join(partes)}}}" if partes else nombre
+
+class Histograma:
+    """Histograma de duraciones con buckets fijos (LIMITES_SEG). Registrar una muestra
+    es una búsqueda binaria y un incremento; los percentiles se estiman con el límite
+    superior del bucket donde caen."""
+    def __init__(self):
+        """Buckets en cero (el último recibe lo que supera el mayor límite)."""
+        self.cuentas = [0] * (len(LIMITES_SEG) + 1)
+        self.cuenta = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, valor: float):
+        """Registra una muestra (llamar con el lock de Metricas tomado)."""
+        self.cuentas[bisect.bisect_left(LIMITES_SEG, valor)] += 1
+        self.cuenta += 1
+        self.suma += valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def percentil(self, p: float) -> float:
+        """Estimación del percentil p (0-1): límite del bucket que lo contiene (el máximo
+        observado si cae en el último)."""
+        if not self.cuenta:
+            return 0.0
+        objetivo, acumulado = p * self.cuenta, 0
+        for i, cuenta in enumerate(self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo and cuenta:
+                return min(LIMITES_SEG[i], self.maximo) if i < len(LIMITES_SEG) else self.maximo
+        return self.maximo
+
+    def resumen(self) -> Dict[str, float]:
+        """Cuenta, suma y percentiles aproximados, en segundos."""
+        return {"cuenta": self.cuenta, "suma": round(self.suma, 6), "p50": round(self.percentil(0.5), 6),
+                "p95": round(self.percentil(0.95), 6), "p99": round(self.percentil(0.99), 6),
+                "max": round(self.maximo, 6)}
+
+class Metricas:
+    """Registro de métricas de un proceso, seguro entre hilos: contadores, medidores
+    (valores actuales) e histogramas de duraciones, con etiquetas. Se exporta como dict
+    (mensaje 'metrics') o como texto Prometheus."""
+    def __init__(self, prefijo: str):
+        """- prefijo: se antepone al nombre de cada serie en el texto Prometheus"""
+        self.prefijo = prefijo
+        self.contadores: Dict[tuple, float] = {}
+        self.medidores: Dict[tuple, float] = {}
+        self.histogramas: Dict[tuple, Histograma] = {}
+        self.lock = threading.Lock()
+        self.inicio = time.time()
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas):
+        """Suma valor al contador."""
+        clave = _clave(nombre, etiquetas)
+        with self.lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + valor
+
+    def fijar(self, nombre: str, valor: float, **etiquetas):
+        """Fija el valor actual de un medidor."""
+        with self.lock:
+            self.medidores[_clave(nombre, etiquetas)] = valor
+
+    def observar(self, nombre: str, segundos: float, **etiquetas):
+        """Registra una duración en el histograma."""
+        clave = _clave(nombre, etiquetas)
+        with self.lock:
+            histograma = self.histogramas.get(clave)
+            if histograma is None:
+                histograma = self.histogramas[clave] = Histograma()
+            histograma.observar(segundos)
+
+    @contextmanager
+    def cronometro(self, nombre: str, **etiquetas):
+        """Mide la duración del bloque 'with' y la registra en el histograma."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def instantanea(self) -> Dict[str, Any]:
+        """Copia de todas las series como dict serializable a JSON."""
+        with self.lock:
+            return {
+                "uptime_seg": round(time.time() - self.inicio, 3),
+                "contadores": {_serie(n, e): v for (n, e), v in sorted(self.contadores.items())},
+                "medidores": {_serie(n, e): v for (n, e), v in sorted(self.medidores.items())},
+                "histogramas": {_serie(n, e): h.resumen() for (n, e), h in sorted(self.histogramas.items())},
+            }
+
+    def texto_prometheus(self) -> str:
+        """Todas las series en el formato de texto de Prometheus."""
+        lineas, tipos = [], set()
+
+        def tipo(nombre: str, clase: str):
+            if nombre not in tipos:
+                tipos.add(nombre)
+                lineas.append(f"# TYPE {nombre} {clase}")
+
+        with self.lock:
+            for (nombre, etiquetas), valor in sorted(self.contadores.items()):
+                completo = f"{self.prefijo}_{nombre}"
+                tipo(completo, "counter")
+                lineas.append(f"{_serie(completo, etiquetas)} {valor}")
+            for (nombre, etiquetas), valor in sorted(self.medidores.items()):
+                completo = f"{self.prefijo}_{nombre}"
+                tipo(completo, "gauge")
+                lineas.append(f"{_serie(completo, etiquetas)} {valor}")
+            for (nombre, etiquetas), histograma in sorted(self.histogramas.items()):
+                completo = f"{self.prefijo}_{nombre}"
+                tipo(completo, "histogram")
+                acumulado = 0
+                for limite, cuenta in zip(LIMITES_SEG + [float("inf")], histograma.cuentas):
+                    acumulado += cuenta
+                    le = "+Inf" if limite == float("inf") else f"{limite:g}"
+                    serie = _serie(completo + "_bucket", etiquetas, f'le="{le}"')
+                    lineas.append(f"{serie} {acumulado}")
+                lineas.append(f"{_serie(completo + '_sum', etiquetas)} {histograma.suma}")
+                lineas.append(f"{_serie(completo + '_count', etiquetas)} {histograma.cuenta}")
+        return "\n".join(lineas) + "\n"
+
+def servir_prometheus(host: str, puerto: int, generar: Callable[[], str]) -> ThreadingHTTPServer:
+    """Sirve GET /metrics con el texto que retorne generar(), en un hilo daemon."""
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = generar().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass   # sin una línea de log por cada scrape
+
+    servidor = ThreadingHTTPServer((host, puerto), Manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="Prometheus").start()
+    return servidor
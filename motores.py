@@ -0,0 +1,260 @@
+import multiprocessing, operator, os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usan los motores de array('q')
+    np = None
+
+# Operaciones elemento a elemento: el resultado es un arreglo del mismo largo
+OPERACIONES_ELEMENTO: Dict[str, Callable[[int, int], int]] = {
+    "sum": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+}
+# Operaciones de reducción: cada chunk devuelve un escalar que el coordinador combina
+OPERACIONES_REDUCCION = ("dot", "reduce")
+OPERACIONES = tuple(OPERACIONES_ELEMENTO) + OPERACIONES_REDUCCION
+# Funciones válidas para 'reduce' y cómo se combinan los parciales de varios chunks
+REDUCTORES: Dict[str, Callable] = {"sum": sum, "min": min, "max": max}
+
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+def validar_operacion(operacion: str, izquierdo: Sequence[int], derecho: Optional[Sequence[int]],
+                      funcion: str = "sum") -> None:
+    """Lanza ValueError si la operación o sus argumentos no son válidos."""
+    if operacion not in OPERACIONES:
+        raise ValueError(f"Operación desconocida: {operacion}")
+    if operacion == "reduce":
+        if funcion not in REDUCTORES:
+            raise ValueError(f"Función de reducción desconocida: {funcion}")
+        return
+    if derecho is None:
+        raise ValueError(f"La operación {operacion} requiere dos arreglos")
+    if len(izquierdo) != len(derecho):
+        raise ValueError("Subarreglos con longitudes distintas")
+
+def cabe_en_int64(operacion: str, izquierdo: Sequence[int], derecho: Optional[Sequence[int]]) -> bool:
+    """True si se sabe que el resultado de la operación cabe en int64, acotándolo con el
+    mayor valor absoluto de cada arreglo. Las reducciones retornan un escalar exacto
+    (entero de Python) y siempre cuentan como que caben."""
+    if operacion not in OPERACIONES_ELEMENTO or not len(izquierdo):
+        return True
+    cota_izquierda = max(max(izquierdo), -min(izquierdo))
+    cota_derecha = max(max(derecho), -min(derecho))
+    if operacion == "mul":
+        return cota_izquierda * cota_derecha <= INT64_MAX
+    return cota_izquierda + cota_derecha <= INT64_MAX
+
+def combinar_parciales(operacion: str, parciales: Sequence[int], funcion: str = "sum") -> int:
+    """Combina los resultados escalares de varios chunks de una reducción."""
+    if operacion == "dot":
+        return sum(parciales)
+    return REDUCTORES[funcion](parciales)
+
+class MotorPython:
+    """Motor de referencia sin dependencias. Con listas (JSON) opera con enteros de
+    Python de tamaño arbitrario; con buffers int64 usa map en C sobre array('q')."""
+    nombre = "python"
+
+    def calcular(self, operacion: str, izquierdo, derecho=None, funcion: str = "sum") -> Any:
+        """Resuelve la operación sobre un chunk y retorna lista, array('q') o escalar."""
+        validar_operacion(operacion, izquierdo, derecho, funcion)
+        if operacion in OPERACIONES_ELEMENTO:
+            f = OPERACIONES_ELEMENTO[operacion]
+            if isinstance(izquierdo, list):
+                return [f(valor_izq, valor_der) for valor_izq, valor_der in zip(izquierdo, derecho)]
+            return array("q", map(f, izquierdo, derecho))
+        if operacion == "dot":
+            return sum(map(operator.mul, izquierdo, derecho))
+        if not len(izquierdo) and funcion != "sum":
+            raise ValueError(f"No se puede aplicar {funcion} a un chunk vacío")
+        return REDUCTORES[funcion](izquierdo)
+
+class MotorNumpy:
+    """Motor vectorizado con NumPy: opera sobre la memoria de los buffers sin iterar en
+    Python. Detecta desbordes de int64 y, cuando el resultado puede expresarse igual
+    (entradas JSON o reducciones, que retornan un escalar), recurre a MotorPython para
+    conservar la aritmética exacta."""
+    nombre = "numpy"
+
+    def __init__(self):
+        """Falla si NumPy no está instalado."""
+        if np is None:
+            raise RuntimeError("El motor 'numpy' requiere tener NumPy instalado")
+        self._respaldo = MotorPython()
+
+    def calcular(self, operacion: str, izquierdo, derecho=None, funcion: str = "sum") -> Any:
+        """Resuelve la operación; con listas retorna lista y con buffers un ndarray int64."""
+        validar_operacion(operacion, izquierdo, derecho, funcion)
+        es_lista = isinstance(izquierdo, list)
+        try:
+            vi = _a_ndarray(izquierdo)
+            vd = _a_ndarray(derecho) if derecho is not None else None
+            resultado = calcular_ndarray(operacion, vi, vd, funcion)
+        except OverflowError:
+            if not es_lista and operacion in OPERACIONES_ELEMENTO:
+                raise
+            return self._respaldo.calcular(operacion, izquierdo, derecho, funcion)
+        if es_lista and operacion in OPERACIONES_ELEMENTO:
+            return resultado.tolist()
+        return resultado
+
+class MotorProcesos:
+    """Motor multinúcleo: los chunks grandes se copian una vez a memoria compartida y se
+    reparten en tramos entre procesos de un ProcessPoolExecutor, cada uno escribiendo su
+    tramo del resultado. Los chunks pequeños (o en JSON) los resuelve el motor interno."""
+    nombre = "procesos"
+
+    def __init__(self, procesos: Optional[int] = None, umbral: int = 1_000_000):
+        """- procesos: cantidad de procesos (None = núcleos disponibles)
+        - umbral: largo mínimo de chunk para repartirlo entre procesos"""
+        self.procesos = procesos or os.cpu_count() or 1
+        self.umbral = umbral
+        self._interno = MotorNumpy() if np is not None else MotorPython()
+        # 'spawn' evita que los procesos hereden por fork los sockets abiertos del operador
+        self._pool = ProcessPoolExecutor(max_workers=self.procesos,
+                                         mp_context=multiprocessing.get_context("spawn"))
+
+    def calcular(self, operacion: str, izquierdo, derecho=None, funcion: str = "sum") -> Any:
+        """Resuelve la operación repartiendo el chunk entre procesos si es grande."""
+        validar_operacion(operacion, izquierdo, derecho, funcion)
+        if isinstance(izquierdo, list) or len(izquierdo) < self.umbral or self.procesos < 2:
+            return self._interno.calcular(operacion, izquierdo, derecho, funcion)
+
+        n = len(izquierdo)
+        entradas = [izquierdo] if derecho is None else [izquierdo, derecho]
+        memorias = []
+        try:
+            for datos in entradas:
+                memoria = shared_memory.SharedMemory(create=True, size=max(1, n * 8))
+                memorias.append(memoria)
+                memoria.buf[:n * 8] = memoryview(datos).cast("B")
+            salida = None
+            if operacion in OPERACIONES_ELEMENTO:
+                salida = shared_memory.SharedMemory(create=True, size=max(1, n * 8))
+                memorias.append(salida)
+
+            tramo = -(-n // self.procesos)
+            futuros = [
+                self._pool.submit(_calcular_tramo, operacion, funcion, [m.name for m in memorias[:len(entradas)]],
+                                  salida.name if salida else None, inicio, min(n, inicio + tramo))
+                for inicio in range(0, n, tramo)
+            ]
+            parciales = [futuro.result() for futuro in futuros]
+            if salida is None:
+                return combinar_parciales(operacion, parciales, funcion)
+            resultado = array("q", [0]) * n
+            memoryview(resultado).cast("B")[:] = salida.buf[:n * 8]
+            return resultado
+        finally:
+            for memoria in memorias:
+                memoria.close()
+                memoria.unlink()
+
+def _calcular_tramo(operacion: str, funcion: str, nombres_entrada, nombre_salida: Optional[str],
+                    inicio: int, fin: int):
+    """Trabajo de un proceso del MotorProcesos: resuelve [inicio, fin) leyendo de memoria
+    compartida. En operaciones elemento a elemento escribe su tramo en la salida y no
+    retorna nada; en reducciones retorna el parcial."""
+    memorias = [shared_memory.SharedMemory(name=nombre) for nombre in nombres_entrada]
+    salida = shared_memory.SharedMemory(name=nombre_salida) if nombre_salida else None
+    try:
+        return _resolver_tramo(operacion, funcion, memorias, salida, inicio, fin)
+    finally:
+        for memoria in memorias + ([salida] if salida else []):
+            try:
+                memoria.close()
+            except BufferError:
+                # Solo ocurre si un traceback retiene vistas; el SO libera al salir
+                pass
+
+def _resolver_tramo(operacion: str, funcion: str, memorias, salida, inicio: int, fin: int):
+    """Cuerpo de _calcular_tramo; sus vistas sobre la memoria compartida se liberan al
+    retornar, antes de que se cierren los segmentos."""
+    vistas = [m.buf.cast("q")[inicio:fin] for m in memorias]
+    izquierdo = vistas[0]
+    derecho = vistas[1] if len(vistas) > 1 else None
+    if np is None:
+        resultado = MotorPython().calcular(operacion, izquierdo, derecho, funcion)
+    else:
+        vd = np.frombuffer(derecho, dtype=np.int64) if derecho is not None else None
+        try:
+            resultado = calcular_ndarray(operacion, np.frombuffer(izquierdo, dtype=np.int64), vd, funcion)
+        except OverflowError:
+            if salida is not None:
+                raise
+            resultado = MotorPython().calcular(operacion, izquierdo, derecho, funcion)
+    if salida is None:
+        return int(resultado)
+    salida.buf.cast("q")[inicio:fin] = memoryview(resultado).cast("B").cast("q")
+    return None
+
+def _a_ndarray(datos):
+    """Vista int64 sin copia de un buffer, o conversión de una lista JSON.
+    Lanza OverflowError si una lista trae enteros fuera de int64."""
+    if isinstance(datos, list):
+        return np.array(datos, dtype=np.int64)
+    return np.frombuffer(datos, dtype=np.int64)
+
+def calcular_ndarray(operacion: str, vi, vd=None, funcion: str = "sum"):
+    """Aplica la operación a ndarrays int64 y lanza OverflowError si el resultado exacto
+    no cabe en int64. Los productos y sumas se hacen en aritmética modular de 64 bits:
+    si el resultado exacto cabe en int64, el modular coincide con él."""
+    if operacion == "sum":
+        resultado = vi + vd
+        # Hubo desborde si el signo del resultado difiere del de ambos sumandos
+        desborde = ((vi ^ resultado) & (vd ^ resultado)) < 0
+    elif operacion == "sub":
+        resultado = vi - vd
+        desborde = ((vi ^ vd) & (vi ^ resultado)) < 0
+    elif operacion == "mul":
+        resultado = vi * vd
+        # Sin desborde la división es exacta; -1 * INT64_MIN es el único caso que la engaña
+        divisor = np.where(vi == 0, 1, vi)
+        desborde = ((resultado // divisor) != vd) & (vi != 0)
+        desborde |= ((vi == -1) & (vd == INT64_MIN)) | ((vd == -1) & (vi == INT64_MIN))
+    elif operacion == "dot":
+        # n·max|a|·max|b| acota toda suma parcial: por debajo de int64 el dot nativo no
+        # desborda; si no, se calcula exacto con enteros de Python (hay términos que se
+        # cancelan y el resultado puede caber igual)
+        if len(vi) * _cota(vi) * _cota(vd) <= INT64_MAX:
+            return int(np.dot(vi, vd))
+        return _exacto_int64(sum(map(operator.mul, vi.tolist(), vd.tolist())), "El producto punto")
+    else:
+        if funcion != "sum":
+            if not len(vi):
+                raise ValueError(f"No se puede aplicar {funcion} a un chunk vacío")
+            return int(vi.min() if funcion == "min" else vi.max())
+        if len(vi) * _cota(vi) <= INT64_MAX:
+            return int(vi.sum())
+        return _exacto_int64(sum(vi.tolist()), "La reducción")
+    if desborde.any():
+        raise OverflowError(f"El resultado de '{operacion}' no cabe en un entero de 64 bits")
+    return resultado
+
+def _cota(v) -> int:
+    """Mayor valor absoluto de un ndarray int64, como entero de Python (0 si está vacío)."""
+    return max(int(v.max()), -int(v.min())) if len(v) else 0
+
+def _exacto_int64(valor: int, que: str) -> int:
+    """Retorna el resultado exacto si cabe en int64; si no, OverflowError."""
+    if not INT64_MIN <= valor <= INT64_MAX:
+        raise OverflowError(f"{que} no cabe en un entero de 64 bits")
+    return valor
+
+MOTORES = {"python": MotorPython, "numpy": MotorNumpy, "procesos": MotorProcesos}
+
+def crear_motor(nombre: str, **opciones):
+    """Instancia el motor por nombre ('python', 'numpy' o 'procesos')."""
+    if nombre not in MOTORES:
+        raise ValueError(f"Motor desconocido: {nombre} (opciones: {', '.join(MOTORES)})")
+    return MOTORES[nombre](**opciones)
+
+def motor_por_defecto() -> str:
+    """Nombre del motor a usar si no se indica: 'numpy' si está instalado, si no 'python'."""
+    return "numpy" if np is not None else "python"
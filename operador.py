@@ -1,77 +1,352 @@
-import argparse, time, socket, threading, sys
-from utils import abrir_servidor, recibir_json, enviar_json
-
-def atender_conexion(conexion: socket.socket, direccion, nombre_operador: str, delay_artificial_seg: float):
-    """Atiende una conexión entrante: responde health o procesa 'compute_sum'.
-    Parámetros:
-      - conexion: socket aceptado ya conectado con el coordinador
-      - direccion: tupla (host, puerto) del peer (informativo)
-      - nombre_operador: nombre de este proceso operador
-      - delay_artificial_seg: delay intencional por petición (simular carga)
-    Respuestas:
-      - 'health_ok' con campo 'operador' para health
-      - 'result' con suma de subarreglos para compute_sum
-    """
-    try:
-        mensaje = recibir_json(conexion, timeout=10.0)
+import argparse, asyncio, logging, os, signal, time, socket, threading, sys
+from collections import OrderedDict
+from utils import (abrir_servidor, enviar_mensaje, LectorJson, MAX_MENSAJE_BYTES,
+                   enviar_mensaje_async, recibir_mensaje_async, es_buffer, configurar_logs, NIVELES_LOG)
+from cacheResultados import CacheResultados, clave_contenido
+from metricas import Metricas, servir_prometheus
+from admision import AdmisionAsync, Cupos, ErrorOcupado, respuesta_ocupado
+from membresia import Anunciante, direccion
+from motores import crear_motor, motor_por_defecto, MOTORES, OPERACIONES
+
+# Segundos que una conexión persistente puede quedar ociosa antes de cerrarla
+TIMEOUT_INACTIVIDAD_SEG = 60.0
+# Prefijo de los mensajes de cálculo: compute_sum, compute_sub, compute_mul, compute_dot, compute_reduce
+PREFIJO_CALCULO = "compute_"
+# Cancelaciones (task_id, idx) recordadas; las más viejas se olvidan
+MAX_CANCELACIONES = 4096
+
+log = logging.getLogger("operador")
+
+class Operador:
+    """Servidor de operación: atiende health checks y resuelve chunks con su motor de cálculo."""
+    def __init__(self, nombre_operador: str, delay_artificial_seg: float = 0.0, motor=None,
+                 cache: CacheResultados = None, max_concurrentes: int = 8, max_cola: int = 64,
+                 max_conexiones: int = 256):
+        """Configura el operador.
+        - nombre_operador: nombre de este proceso operador
+        - delay_artificial_seg: delay intencional por petición (simular carga)
+        - motor: motor de cálculo (ver motores.py); por defecto NumPy si está instalado
+        - cache: cache de resultados por contenido de chunk (None = sin cache)
+        - max_concurrentes: chunks calculándose a la vez
+        - max_cola: chunks esperando turno; con la cola llena se responde 'busy'
+        - max_conexiones: conexiones abiertas a la vez; las que sobran reciben 'busy'
+        """
+        self.nombre = nombre_operador
+        self.delay_artificial_seg = delay_artificial_seg
+        self.motor = motor or crear_motor(motor_por_defecto())
+        self.cache = cache
+        # Chunks que el coordinador ya no necesita (otro operador respondió antes)
+        self.cancelados: "OrderedDict[tuple, None]" = OrderedDict()
+        self.lock_cancelados = threading.Lock()
+        self.metricas = Metricas("operador")
+        self.max_concurrentes = max_concurrentes
+        self.max_cola = max_cola
+        self.admision = None   # la crea servir() o servir_async() según el modo
+        self.max_conexiones = max_conexiones
+        self.conexiones = 0
+        self.lock_conexiones = threading.Lock()
+        # Registro en un coordinador (--registrar); arranca cuando el socket ya escucha
+        self.anunciante: Anunciante = None
+
+    def atender_conexion(self, conexion: socket.socket, direccion):
+        """Atiende una conexión persistente: procesa mensajes uno tras otro hasta que el
+        coordinador la cierre o quede ociosa más de TIMEOUT_INACTIVIDAD_SEG. Los chunks
+        esperan un cupo de cálculo (ver Cupos) o reciben 'busy' si ya hay max_cola
+        esperando; el resto se responde en el acto.
+        Parámetros:
+          - conexion: socket aceptado ya conectado con el coordinador
+          - direccion: tupla (host, puerto) del peer (informativo)
+        """
+        lector = LectorJson(conexion, medir=self._medir_decodificacion)
+        try:
+            while True:
+                try:
+                    mensaje = lector.recibir(timeout=TIMEOUT_INACTIVIDAD_SEG)
+                except (ConnectionError, socket.timeout):
+                    return
+                recibido = time.monotonic()
+                try:
+                    if es_calculo(mensaje):
+                        respuesta = self.admision.ejecutar(
+                            lambda: self.procesar_mensaje(mensaje, self.delay_artificial_seg, recibido))
+                    else:
+                        respuesta = self.procesar_mensaje(mensaje, 0.0, recibido)
+                except ErrorOcupado:
+                    respuesta = self._respuesta_ocupado(mensaje)
+                except Exception as e:
+                    respuesta = respuesta_error(mensaje, e)
+                with self.metricas.cronometro("etapa_seg", etapa="serializar"):
+                    enviar_mensaje(conexion, respuesta)
+        except Exception:
+            pass
+        finally:
+            conexion.close()
+            self._fin_conexion()
+
+    async def atender_conexion_async(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Versión asyncio de atender_conexion. Cada mensaje se resuelve en su propia tarea,
+        así que una conexión puede tener varias peticiones en vuelo; las respuestas llevan
+        task_id/idx para emparejarlas."""
+        if not self._admitir_conexion():
+            try:
+                await enviar_mensaje_async(writer, self._respuesta_ocupado({}))
+            except Exception:
+                pass
+            writer.close()
+            return
+        tareas = set()
+        try:
+            while True:
+                try:
+                    mensaje = await asyncio.wait_for(recibir_mensaje_async(reader, medir=self._medir_decodificacion),
+                                                     TIMEOUT_INACTIVIDAD_SEG)
+                except (ConnectionError, asyncio.TimeoutError):
+                    break
+                tarea = asyncio.create_task(self.responder_async(writer, mensaje, time.monotonic()))
+                tareas.add(tarea)
+                tarea.add_done_callback(tareas.discard)
+        except (Exception, asyncio.CancelledError):
+            pass   # también al apagarse el loop (SIGTERM/Ctrl+C): se cierra sin traza
+        finally:
+            if tareas:
+                await asyncio.gather(*tareas, return_exceptions=True)
+            writer.close()
+            self._fin_conexion()
+
+    async def responder_async(self, writer: asyncio.StreamWriter, mensaje, recibido: float):
+        """Procesa un mensaje sin bloquear el loop: los chunks pasan por la cola de admisión,
+        el delay es un asyncio.sleep y el cálculo corre en el executor por defecto; luego
+        escribe la respuesta."""
+        try:
+            if es_calculo(mensaje):
+                futuro = self.admision.enviar(writer.get_extra_info("peername")[0],
+                                              lambda: self._calcular_async(mensaje, recibido))
+                respuesta = self._respuesta_ocupado(mensaje) if futuro is None else await futuro
+            else:
+                respuesta = self.procesar_mensaje(mensaje, 0.0)
+        except Exception as e:
+            respuesta = respuesta_error(mensaje, e)
+        try:
+            with self.metricas.cronometro("etapa_seg", etapa="serializar"):
+                await enviar_mensaje_async(writer, respuesta)
+        except Exception:
+            pass
+
+    async def _calcular_async(self, mensaje, recibido: float):
+        """Cuerpo de un chunk admitido en modo asyncio: delay y cálculo en el executor."""
+        if self.delay_artificial_seg > 0:
+            await asyncio.sleep(self.delay_artificial_seg)
+        return await asyncio.get_running_loop().run_in_executor(None, self.procesar_mensaje, mensaje, 0.0, recibido)
+
+    def _respuesta_ocupado(self, mensaje):
+        """Respuesta 'busy' a un chunk que no entra en la cola (o a una conexión de más, con
+        mensaje vacío), con task_id/idx y la cola actual."""
+        if es_calculo(mensaje):
+            self.metricas.incrementar("chunks_total", operacion=mensaje["type"][len(PREFIJO_CALCULO):],
+                                      resultado="ocupado")
+        else:
+            self.metricas.incrementar("conexiones_rechazadas_total")
+        respuesta = respuesta_ocupado(self.admision.reintentar_en_seg())
+        respuesta["cola"] = self.admision.profundidad()
+        for campo in ("task_id", "idx"):
+            if campo in mensaje:
+                respuesta[campo] = mensaje[campo]
+        return respuesta
+
+    def _estado_cola(self):
+        """Campos de health_ok sobre la cola de chunks: profundidad, en curso y límites."""
+        if self.admision is None:
+            return {}
+        estado = self.admision.estado()
+        return {"cola": estado["en_cola"], "capacidad_cola": estado["capacidad"], "en_curso": estado["en_curso"],
+                "max_concurrentes": estado["max_concurrentes"]}
+
+    def _admitir_conexion(self) -> bool:
+        """Cuenta una conexión nueva; False si ya hay max_conexiones abiertas."""
+        with self.lock_conexiones:
+            if self.conexiones >= self.max_conexiones:
+                return False
+            self.conexiones += 1
+            return True
+
+    def _fin_conexion(self):
+        """Descuenta una conexión cerrada."""
+        with self.lock_conexiones:
+            self.conexiones -= 1
+
+    def _medir_decodificacion(self, segundos: float):
+        """Registra lo que tardó en llegar y decodificarse un mensaje del coordinador."""
+        self.metricas.observar("etapa_seg", segundos, etapa="deserializar")
+
+    def procesar_mensaje(self, mensaje, delay_artificial_seg: float, recibido: float = None):
+        """Procesa un mensaje ya decodificado y retorna la respuesta a enviar.
+        - recibido: time.monotonic() de llegada del mensaje, base de su deadline_ms
+        Respuestas:
+          - 'health_ok' con campo 'operador', formatos, motor, operaciones y el estado de
+            la cola de chunks (cola, capacidad_cola, en_curso, max_concurrentes) para health
+          - 'result' con el resultado del chunk para compute_<operacion> (binario si
+            llegó binario; escalar en dot/reduce), calculo_seg, lo que tardó el cálculo, y
+            cola, los chunks que esperan turno
+          - 'cancelled' si el chunk se canceló antes de empezar a calcularlo
+          - 'error' deadline_exceeded si su deadline_ms venció antes de calcularlo
+          - 'cancel_ok' para cancel
+          - 'metrics_ok' con contadores e histogramas para metrics
+        """
         tipo_mensaje = mensaje.get("type")
+        if recibido is None:
+            recibido = time.monotonic()
 
         if tipo_mensaje == "health":
-            enviar_json(conexion, {"type": "health_ok", "operador": nombre_operador})
-            return
+            respuesta = {"type": "health_ok", "operador": self.nombre, "formatos": ["json", "bin"],
+                         "motor": self.motor.nombre, "operaciones": list(OPERACIONES)}
+            respuesta.update(self._estado_cola())
+            if self.cache is not None:
+                respuesta["cache"] = self.cache.estadisticas()
+            return respuesta
+
+        if tipo_mensaje == "cancel":
+            with self.lock_cancelados:
+                self.cancelados[(mensaje.get("task_id"), mensaje.get("idx"))] = None
+                while len(self.cancelados) > MAX_CANCELACIONES:
+                    self.cancelados.popitem(last=False)
+            return {"type": "cancel_ok", "task_id": mensaje.get("task_id"), "idx": mensaje.get("idx")}
+
+        if tipo_mensaje == "metrics":
+            return {"type": "metrics_ok", "operador": self.nombre, "metricas": self.exportar_metricas()}
 
-        if tipo_mensaje == "compute_sum":
+        operacion = tipo_mensaje[len(PREFIJO_CALCULO):] if str(tipo_mensaje).startswith(PREFIJO_CALCULO) else None
+        if operacion in OPERACIONES:
             subarreglo_izquierdo = mensaje["a"]
-            subarreglo_derecho  = mensaje["b"]
+            subarreglo_derecho  = mensaje.get("b")
             indice_parte = mensaje.get("idx", 0)
             identificador_tarea = mensaje.get("task_id", "?")
 
-        
-            print(f"[{nombre_operador}] Va a resolver el chunk idx={indice_parte} id task={identificador_tarea} A={subarreglo_izquierdo} B={subarreglo_derecho}")
+            log.debug("[%s] Va a resolver %s del chunk idx=%s id task=%s (n=%d)",
+                      self.nombre, operacion, indice_parte, identificador_tarea, len(subarreglo_izquierdo))
 
             if delay_artificial_seg > 0:
                 time.sleep(delay_artificial_seg)
 
-            if len(subarreglo_izquierdo) != len(subarreglo_derecho):
-                raise ValueError("Subarreglos con longitudes distintas")
-
-            resultado_parcial = [
-                valor_izq + valor_der
-                for valor_izq, valor_der in zip(subarreglo_izquierdo, subarreglo_derecho)
-            ]
-            enviar_json(
-                conexion,
-                {"type": "result", "task_id": identificador_tarea, "idx": indice_parte,
-                 "result": resultado_parcial, "operador": nombre_operador}
-            )
-            return
+            # Último punto en que se puede ahorrar el cálculo
+            clave = (identificador_tarea, indice_parte)
+            with self.lock_cancelados:
+                cancelado = clave in self.cancelados
+                if cancelado:
+                    del self.cancelados[clave]
+            if cancelado:
+                log.debug("[%s] Chunk idx=%s id task=%s cancelado", self.nombre, indice_parte, identificador_tarea)
+                self.metricas.incrementar("chunks_total", operacion=operacion, resultado="cancelado")
+                return {"type": "cancelled", "task_id": identificador_tarea, "idx": indice_parte}
+            if "deadline_ms" in mensaje and time.monotonic() - recibido > mensaje["deadline_ms"] / 1000:
+                self.metricas.incrementar("chunks_total", operacion=operacion, resultado="plazo_vencido")
+                return {"type": "error", "error": "deadline_exceeded", "task_id": identificador_tarea,
+                        "idx": indice_parte}
+
+            funcion = mensaje.get("funcion", "sum")
+            calcular = lambda: self.motor.calcular(operacion, subarreglo_izquierdo, subarreglo_derecho,
+                                                   funcion=funcion)
+            inicio = time.perf_counter()
+            if self.cache is None:
+                resultado_parcial = calcular()
+            else:
+                # El formato entra en la clave: define si el resultado es lista o buffer
+                formato = "bin" if es_buffer(subarreglo_izquierdo) else "json"
+                clave = clave_contenido(operacion, funcion if operacion == "reduce" else "", formato,
+                                        subarreglo_izquierdo, subarreglo_derecho)
+                resultado_parcial = self.cache.obtener_o_calcular(clave, calcular)
+            duracion = time.perf_counter() - inicio
+            self.metricas.observar("calculo_seg", duracion, operacion=operacion)
+            self.metricas.incrementar("chunks_total", operacion=operacion, resultado="ok")
+            self.metricas.incrementar("elementos_total", len(subarreglo_izquierdo), operacion=operacion)
+            respuesta = {"type": "result", "task_id": identificador_tarea, "idx": indice_parte,
+                         "result": resultado_parcial, "operador": self.nombre, "calculo_seg": round(duracion, 6)}
+            if self.admision is not None:
+                respuesta["cola"] = self.admision.profundidad()
+            return respuesta
+
+        return {"type": "error", "error": "unknown_message", "detail": tipo_mensaje}
+
+    def exportar_metricas(self):
+        """Métricas actuales como dict (respuesta de 'metrics'), con las de la cola y el cache."""
+        if self.admision is not None:
+            estado = self.admision.estado()
+            self.metricas.fijar("cola_chunks", estado["en_cola"])
+            self.metricas.fijar("chunks_en_curso", estado["en_curso"])
+        self.metricas.fijar("conexiones", self.conexiones)
+        if self.cache is not None:
+            for nombre, valor in self.cache.estadisticas().items():
+                self.metricas.fijar(f"cache_{nombre}", valor)
+        return self.metricas.instantanea()
+
+    def texto_metricas(self) -> str:
+        """Métricas actuales en texto Prometheus (ver --metricas-puerto)."""
+        self.exportar_metricas()
+        return self.metricas.texto_prometheus()
+
+    def servir(self, host: str, puerto: int):
+        """Inicia el servidor del operador y atiende conexiones concurrentemente."""
+        servidor = self._abrir(host, puerto)
+        self.admision = Cupos(self.max_concurrentes, self.max_cola)
+        self._anunciar()
+        log.info("[%s] Operador escuchando en %s:%d (delay=%ss, motor=%s)",
+                 self.nombre, host, puerto, self.delay_artificial_seg, self.motor.nombre)
+        while True:
+            conexion, direccion = servidor.accept()
+            if not self._admitir_conexion():
+                try:
+                    conexion.settimeout(1.0)
+                    enviar_mensaje(conexion, self._respuesta_ocupado({}))
+                except Exception:
+                    pass
+                conexion.close()
+                continue
+            threading.Thread(target=self.atender_conexion, args=(conexion, direccion), daemon=True).start()
+
+    def servir_async(self, host: str, puerto: int):
+        """Inicia el operador en modo asyncio: todas las conexiones en un solo event loop."""
+        servidor = self._abrir(host, puerto)
+
+        async def principal():
+            """Sirve sobre el socket ya abierto hasta que el proceso termine."""
+            self.admision = AdmisionAsync(self.max_concurrentes, self.max_cola, nombre="Chunks")
+            self.admision.iniciar()
+            self._anunciar()
+            servidor_async = await asyncio.start_server(self.atender_conexion_async, sock=servidor,
+                                                        limit=MAX_MENSAJE_BYTES)
+            async with servidor_async:
+                await servidor_async.serve_forever()
 
-        enviar_json(conexion, {"type": "error", "error": "unknown_message", "detail": tipo_mensaje})
+        log.info("[%s] Operador (asyncio) escuchando en %s:%d (delay=%ss, motor=%s)",
+                 self.nombre, host, puerto, self.delay_artificial_seg, self.motor.nombre)
+        asyncio.run(principal())
 
-    except Exception as e:
+    def _anunciar(self):
+        """Arranca el registro en el coordinador, si se configuró."""
+        if self.anunciante is not None:
+            self.anunciante.iniciar()
+
+    def _abrir(self, host: str, puerto: int) -> socket.socket:
+        """Abre el socket servidor o termina el proceso si el puerto no está disponible."""
         try:
-            enviar_json(conexion, {"type": "error", "error": str(e)})
-        except Exception:
-            pass
-    finally:
-        conexion.close()
+            return abrir_servidor(host, puerto)
+        except Exception as e:
+            log.error("[%s] No se pudo iniciar: %s", self.nombre, e)
+            sys.exit(1)
 
-def servir(host: str, puerto: int, nombre_operador: str, delay_artificial_seg: float):
-    """Inicia el servidor del operador y atiende conexiones concurrentemente."""
-    try:
-        servidor = abrir_servidor(host, puerto)
-    except Exception as e:
-        print(f"[{nombre_operador}] No se pudo iniciar: {e}")
-        sys.exit(1)
+def es_calculo(mensaje) -> bool:
+    """True si el mensaje pide calcular un chunk (compute_<operacion>)."""
+    return str(mensaje.get("type", "")).startswith(PREFIJO_CALCULO)
 
-    print(f"[{nombre_operador}] Operador escuchando en {host}:{puerto} (delay={delay_artificial_seg}s)")
-    while True:
-        conexion, direccion = servidor.accept()
-        threading.Thread(
-            target=atender_conexion,
-            args=(conexion, direccion, nombre_operador, delay_artificial_seg),
-            daemon=True
-        ).start()
+def respuesta_error(mensaje, error: Exception):
+    """Arma la respuesta 'error' conservando task_id/idx para que el coordinador la empareje
+    y marcando los desbordes de int64."""
+    respuesta = {"type": "error", "error": str(error)}
+    if isinstance(error, OverflowError):
+        respuesta["overflow"] = True   # el coordinador reenvía la tarea en JSON (exacta)
+    for campo in ("task_id", "idx"):
+        if campo in mensaje:
+            respuesta[campo] = mensaje[campo]
+    return respuesta
 
 if __name__ == "__main__":
     """Punto de entrada: parsea flags y lanza el operador."""
@@ -80,6 +355,61 @@ if __name__ == "__main__":
     ap.add_argument("--port", type=int, default=6001)
     ap.add_argument("--name", default="operador-1")
     ap.add_argument("--delay", type=float, default=0.0, help="delay artificial por solicitud (segundos)")
+    ap.add_argument("--asyncio", action="store_true",
+                    help="atiende todas las conexiones con asyncio en lugar de un hilo por conexión")
+    ap.add_argument("--engine", choices=list(MOTORES), default=motor_por_defecto(),
+                    help="motor de cálculo de los chunks (por defecto numpy si está instalado)")
+    ap.add_argument("--procesos", type=int, default=0,
+                    help="procesos del motor 'procesos' (0 = núcleos disponibles)")
+    ap.add_argument("--umbral-procesos", type=int, default=1_000_000,
+                    help="largo mínimo de chunk que el motor 'procesos' reparte entre procesos")
+    ap.add_argument("--cache-mb", type=int, default=32,
+                    help="memoria del cache de chunks resueltos en MiB (0 = sin cache)")
+    ap.add_argument("--cache-ttl", type=float, default=60.0,
+                    help="segundos que vale un chunk resuelto en el cache")
+    ap.add_argument("--max-concurrentes", type=int, default=8,
+                    help="chunks calculándose a la vez")
+    ap.add_argument("--max-cola", type=int, default=64,
+                    help="chunks esperando turno; con la cola llena se responde 'busy'")
+    ap.add_argument("--max-conexiones", type=int, default=256,
+                    help="conexiones abiertas a la vez; las que sobran reciben 'busy'")
+    ap.add_argument("--registrar", default=None,
+                    help="host:port de un coordinador en el que registrarse al arrancar (y darse de baja al salir)")
+    ap.add_argument("--token-membresia", default=os.environ.get("TOKEN_MEMBRESIA"),
+                    help="secreto compartido con el coordinador para --registrar (por defecto $TOKEN_MEMBRESIA)")
+    ap.add_argument("--log-level", choices=NIVELES_LOG, default="INFO",
+                    help="nivel de log (DEBUG muestra cada chunk)")
+    ap.add_argument("--metricas-puerto", type=int, default=0,
+                    help="puerto HTTP donde servir /metrics en formato Prometheus (0 = sin endpoint)")
     args = ap.parse_args()
-    servir(args.host, args.port, args.name, args.delay)
+    configurar_logs(args.log_level)
 
+    opciones = {}
+    if args.engine == "procesos":
+        opciones = {"procesos": args.procesos or None, "umbral": args.umbral_procesos}
+    try:
+        motor = crear_motor(args.engine, **opciones)
+    except RuntimeError as e:
+        log.error("[%s] %s", args.name, e)
+        sys.exit(1)
+
+    cache = CacheResultados(args.cache_mb * 1024 * 1024, args.cache_ttl) if args.cache_mb else None
+    operador = Operador(args.name, args.delay, motor, cache, max_concurrentes=args.max_concurrentes,
+                        max_cola=args.max_cola, max_conexiones=args.max_conexiones)
+    if args.metricas_puerto:
+        servir_prometheus(args.host, args.metricas_puerto, operador.texto_metricas)
+    if args.registrar:
+        operador.anunciante = Anunciante(direccion(args.registrar), args.host, args.port, args.name,
+                                         token=args.token_membresia)
+    # SIGTERM termina como Ctrl+C, para que el 'leave' alcance a salir
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        if args.asyncio:
+            operador.servir_async(args.host, args.port)
+        else:
+            operador.servir(args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if operador.anunciante is not None:
+            operador.anunciante.detener()
@@ -1,9 +1,54 @@
-import argparse, socket, threading, time, uuid, datetime
-from typing import List, Tuple, Dict, Optional
-from utils import abrir_servidor, abrir_cliente, recibir_json, enviar_json, Repetidor
-from collections import Counter
+import argparse, asyncio, hmac, itertools, logging, os, signal, socket, threading, time, uuid
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Any, Callable, List, Tuple, Dict, Optional, Sequence
+from utils import (abrir_servidor, enviar_mensaje, es_buffer, Repetidor, PoolConexiones,
+                   LectorJson, PoolConexionesAsync, MAX_MENSAJE_BYTES, enviar_mensaje_async,
+                   recibir_mensaje_async, configurar_logs, NIVELES_LOG)
+from motores import OPERACIONES, OPERACIONES_ELEMENTO, cabe_en_int64, combinar_parciales, validar_operacion
+from cacheResultados import CacheResultados, clave_contenido
+from metricas import Metricas, servir_prometheus
+from admision import Admision, AdmisionAsync, ErrorOcupado, respuesta_ocupado
+from membresia import Anunciante, direccion
+from diarioTareas import DiarioTareas, TareaDiario
+from collections import Counter, deque
 import sys
 
+# Tipos de solicitud de cliente y la operación que cada uno reparte entre operadores.
+# Las operaciones elemento a elemento devuelven un arreglo; dot y reduce, un escalar.
+TIPOS_SOLICITUD = {
+    "sum_arrays": "sum",
+    "sub_arrays": "sub",
+    "mul_arrays": "mul",
+    "dot_arrays": "dot",
+    "reduce_array": "reduce",
+}
+# Streams (sum_stream): bloques en vuelo por conexión (por defecto y máximo aceptado) y
+# espera máxima entre bloques
+VENTANA_STREAM = 4
+VENTANA_STREAM_MAX = 64
+TIMEOUT_BLOQUE_SEG = 60.0
+# Conexiones de cliente persistentes: solicitudes en vuelo por conexión (pipelining) y
+# segundos que puede quedar ociosa antes de cerrarla
+MAX_SOLICITUDES_POR_CONEXION = 32
+TIMEOUT_INACTIVIDAD_SEG = 60.0
+# Solicitudes que se responden en el acto, sin pasar por la cola de admisión, para que el
+# monitoreo siga funcionando con el coordinador saturado
+TIPOS_INMEDIATOS = ("health", "metrics", "register", "leave", "cancel")
+# Prefijo de los chunks que se envían a los operadores (compute_sum, ...). Un coordinador
+# también los atiende cuando hace de operador de un coordinador padre (--padre)
+PREFIJO_CALCULO = "compute_"
+# Chunks por debajo de este tamaño no compensan su costo de envío (salvo con --chunks fijo)
+TAM_CHUNK_MINIMO = 1024
+# Espera sugerida al cliente antes de volver a pedir con 'get_result' una tarea en curso
+ESPERA_PENDIENTE_MS = 500
+
+log = logging.getLogger("coord")
+
+def ewma(previo: Optional[float], muestra: float, peso: float = 0.2) -> float:
+    """Promedio móvil exponencial; la primera muestra se toma tal cual."""
+    return muestra if previo is None else (1 - peso) * previo + peso * muestra
+
 class InfoTrabajador:
     """DTO para almacenar el estado de un operador (host, puerto, vivo, etc.)."""
     def __init__(self, nombre: str, host: str, puerto: int):
@@ -13,53 +58,581 @@ class InfoTrabajador:
         self.puerto = puerto
         self.vivo = False
         self.ultimo_ok = 0.0
+        self.binario = False   # el operador anunció soporte de tramas binarias en health_ok
+        # Detección de fallos: pings/subtareas fallidas seguidas, RTT suavizado del ping
+        # y momento (time.monotonic) en que toca volver a chequearlo
+        self.fallos_consecutivos = 0
+        self.latencia_salud: Optional[float] = None
+        self.proximo_chequeo = 0.0
+        # Carga: subtareas y elementos en vuelo, latencia por subtarea (seg) y rendimiento
+        # (elementos/seg) suavizados; guían el reparto de chunks (ver PlanDespacho)
+        self.en_vuelo = 0
+        self.carga_en_vuelo = 0
+        self.latencia_ewma: Optional[float] = None
+        self.rendimiento: Optional[float] = None
+        self.medido_en = 0.0   # time.monotonic() de la última medición de rendimiento
+        # Admisión del operador: profundidad de su cola (informada en health_ok y en cada
+        # result), su capacidad y hasta cuándo (time.monotonic) no recibe trabajo por un 'busy'
+        self.cola = 0
+        self.capacidad_cola: Optional[int] = None
+        self.saturado_hasta = 0.0
         self.lock = threading.Lock()
+        # Conexiones persistentes reutilizadas por subtareas y health checks
+        self.pool = PoolConexiones(host, puerto)
+        self.pool_async: Optional[PoolConexionesAsync] = None   # solo en modo asyncio
 
     def __repr__(self):
         """Representación legible del operador para logs."""
         return f"<Operador {self.nombre} {self.host}:{self.puerto} alive={self.vivo}>"
 
+class Tarea:
+    """DTO con el estado de una solicitud repartida en chunks."""
+    def __init__(self, id_tarea: str, operacion: str, funcion: str, izquierda, derecha,
+                 partes: List[Tuple[int, int, int]], limite: float, salida=None):
+        """Inicializa la tarea.
+        - operacion: 'sum', 'sub', 'mul', 'dot' o 'reduce' (ver motores.py)
+        - funcion: función de reducción para 'reduce'
+        - izquierda, derecha: entradas (listas o memoryview int64; derecha None en reduce)
+        - partes: tuplas (idx, inicio, fin) de cada chunk
+        - limite: time.monotonic() en que vence el plazo de la solicitud
+        - salida: en operaciones elemento a elemento, el resultado final ya reservado con
+          su largo (array('q') o lista) donde cada chunk se escribe en su lugar; None en
+          dot/reduce
+        """
+        self.id = id_tarea
+        self.operacion = operacion
+        self.funcion = funcion
+        self.izquierda = izquierda
+        self.derecha = derecha
+        self.partes = partes
+        self.limite = limite
+        self.salida = salida
+        self.resultados: Dict[int, Any] = {}   # idx -> parcial (None si ya se escribió en salida)
+        self.diario: Optional[DiarioTareas] = None   # solo en tareas con task_id del cliente
+
+    def restante_seg(self) -> float:
+        """Segundos que quedan del plazo de la solicitud."""
+        return self.limite - time.monotonic()
+
+    def guardar(self, indice_parte: int, resultado: Any):
+        """Registra el resultado de un chunk. Con salida lo copia en [inicio, fin) y no lo
+        retiene, así el pico de memoria es la salida más los chunks en vuelo y no todos los
+        parciales más su concatenación; sin salida guarda el parcial para combinarlo. Con
+        diario, además lo anota. Si un resultado JSON no cabe en la salida int64, la tarea
+        pasa a salida de lista (ver pasar_a_lista)."""
+        if self.salida is None:
+            self.resultados[indice_parte] = resultado
+        else:
+            _, inicio, fin = self.partes[indice_parte]
+            if isinstance(self.salida, array) and not es_buffer(resultado):
+                try:
+                    # Un chunk chico viajó en JSON y su resultado puede no caber en int64
+                    resultado = array("q", resultado)
+                except OverflowError:
+                    self.pasar_a_lista()
+            if isinstance(self.salida, array):
+                memoryview(self.salida).cast("B")[8 * inicio:8 * fin] = memoryview(resultado).cast("B")
+            else:
+                self.salida[inicio:fin] = resultado
+            self.resultados[indice_parte] = None
+        if self.diario is not None:
+            self.diario.resuelto(self.id, indice_parte, resultado)
+
+    def pasar_a_lista(self):
+        """Cambia la salida int64 por una lista de enteros de Python, para un resultado que
+        no cabe en int64: desde ahí los chunks viajan en JSON y el resultado es exacto."""
+        if isinstance(self.salida, array):
+            log.debug("Tarea %s: el resultado no cabe en int64, sigue en JSON", self.id)
+            self.salida = self.salida.tolist()
+
+    def anotar_despacho(self, indice_parte: int):
+        """Anota en el diario (si la tarea tiene) que el chunk sale hacia un operador."""
+        if self.diario is not None:
+            self.diario.despachado(self.id, indice_parte)
+
+class PlanDespacho:
+    """Reparto de los chunks de una Tarea entre operadores con robo de trabajo.
+    Cada operador arranca con una cola de chunks proporcional a su rendimiento medido (y
+    descontando lo que ya tiene en vuelo de otras tareas); cuando vacía la suya toma el
+    último chunk de la cola con más trabajo estimado, así un operador lento no fija la
+    latencia de toda la solicitud. Si un chunk en vuelo supera su plazo de especulación,
+    un operador ocioso lanza una copia y gana la primera respuesta. Un chunk fallido
+    vuelve como reintento para otro operador. El plan solo decide qué idx va a quién: el
+    envío y la espera los hace el coordinador, con hilos o con asyncio."""
+    def __init__(self, tarea: Tarea, operadores: List[InfoTrabajador],
+                 rendimientos: Dict[InfoTrabajador, float],
+                 plazo_especulacion: Optional[Callable[[int], float]] = None):
+        """Reparte los chunks iniciales.
+        - operadores: operadores que participan en la tarea
+        - rendimientos: elementos/seg estimados de cada operador
+        - plazo_especulacion: segundos que puede tardar un chunk de n elementos antes de
+          lanzar una copia en otro operador (None = sin especulación)
+        """
+        self.tarea = tarea
+        self.operadores = list(operadores)
+        self.rendimientos = {op: max(rendimientos[op], 1e-9) for op in self.operadores}
+        self.plazo_especulacion = plazo_especulacion
+        self.colas: Dict[InfoTrabajador, deque] = {op: deque() for op in self.operadores}
+        self.reintentos: deque = deque()
+        self.intentos: Dict[int, set] = {}     # idx -> operadores en los que ya falló
+        self.excluidos: set = set()            # operadores que fallaron por transporte/timeout
+        self.copias: Dict[int, Dict[InfoTrabajador, float]] = {}   # idx -> operador -> envío
+        self.en_vuelo = 0
+        self.en_curso: Dict[InfoTrabajador, int] = {op: 0 for op in self.operadores}   # elementos en vuelo
+        self.error: Optional[Exception] = None
+        self.robos = 0
+        self.copias_especulativas = 0
+        self.lock = threading.Lock()
+
+        fin_estimado = {op: op.carga_en_vuelo / self.rendimientos[op] for op in self.operadores}
+        for idx, inicio, fin in tarea.partes:
+            if idx in tarea.resultados:   # ya resuelto antes (tarea reanudada del diario)
+                continue
+            op = min(self.operadores, key=lambda o: fin_estimado[o] + (fin - inicio) / self.rendimientos[o])
+            self.colas[op].append(idx)
+            fin_estimado[op] += (fin - inicio) / self.rendimientos[op]
+
+    def tomar(self, operador: InfoTrabajador) -> Optional[int]:
+        """Siguiente chunk para el operador: un reintento que no haya fallado en él, su
+        propia cola, uno robado o la copia de un chunk rezagado, en ese orden. None si
+        ahora no hay nada para él."""
+        with self.lock:
+            if self._terminado() or operador in self.excluidos:
+                return None
+            indice_parte = self._tomar_reintento(operador)
+            if indice_parte is None and self.colas[operador]:
+                indice_parte = self.colas[operador].popleft()
+            if indice_parte is None:
+                indice_parte = self._robar(operador)
+            if indice_parte is None:
+                indice_parte = self._especular(operador)
+            if indice_parte is not None:
+                self.en_vuelo += 1
+                self.en_curso[operador] += self._tam(indice_parte)
+                self.copias.setdefault(indice_parte, {})[operador] = time.monotonic()
+            return indice_parte
+
+    def _tam(self, indice_parte: int) -> int:
+        """Cantidad de elementos del chunk."""
+        _, inicio, fin = self.tarea.partes[indice_parte]
+        return fin - inicio
+
+    def _tomar_reintento(self, operador: InfoTrabajador) -> Optional[int]:
+        """Saca de los reintentos el primer chunk que no haya fallado en el operador."""
+        for posicion, indice_parte in enumerate(self.reintentos):
+            if operador not in self.intentos.get(indice_parte, ()):
+                del self.reintentos[posicion]
+                return indice_parte
+        return None
+
+    def _pendiente_seg(self, operador: InfoTrabajador) -> float:
+        """Segundos estimados para que el operador termine lo que tiene en vuelo y en su
+        cola (infinito si fue excluido)."""
+        if operador in self.excluidos:
+            return float("inf")
+        elementos = self.en_curso[operador] + sum(self._tam(idx) for idx in self.colas[operador])
+        return elementos / self.rendimientos[operador]
+
+    def _robar(self, operador: InfoTrabajador) -> Optional[int]:
+        """Toma el último chunk de la cola con más trabajo estimado, solo si el operador
+        lo terminaría antes de que su dueño vacíe esa cola."""
+        victimas = [op for op, cola in self.colas.items() if cola and op is not operador]
+        if not victimas:
+            return None
+        victima = max(victimas, key=self._pendiente_seg)
+        if self._tam(self.colas[victima][-1]) / self.rendimientos[operador] >= self._pendiente_seg(victima):
+            return None
+        indice_parte = self.colas[victima].pop()
+        self.robos += 1
+        log.debug("%s toma el chunk %d de la cola de %s", operador.nombre, indice_parte, victima.nombre)
+        return indice_parte
+
+    def _rezagados(self):
+        """Pares (vencimiento, idx) de los chunks con una sola copia en vuelo."""
+        for indice_parte, copias in self.copias.items():
+            if len(copias) == 1 and indice_parte not in self.tarea.resultados:
+                (enviado,) = copias.values()
+                yield enviado + self.plazo_especulacion(self._tam(indice_parte)), indice_parte
+
+    def _especular(self, operador: InfoTrabajador) -> Optional[int]:
+        """Elige el chunk rezagado más antiguo que no esté ya en el operador ni haya
+        fallado en él, para enviarle una copia."""
+        if self.plazo_especulacion is None:
+            return None
+        ahora = time.monotonic()
+        vencidos = [(vence, idx) for vence, idx in self._rezagados()
+                    if vence <= ahora and operador not in self.copias[idx]
+                    and operador not in self.intentos.get(idx, ())]
+        if not vencidos:
+            return None
+        _, indice_parte = min(vencidos)
+        (dueno,) = self.copias[indice_parte]
+        self.copias_especulativas += 1
+        log.debug("Chunk %d rezagado en %s; copia especulativa a %s", indice_parte, dueno.nombre, operador.nombre)
+        return indice_parte
+
+    def proximo_vencimiento(self) -> Optional[float]:
+        """Segundos hasta que algún chunk en vuelo pase a ser rezagado (None si no hay)."""
+        if self.plazo_especulacion is None:
+            return None
+        with self.lock:
+            ahora = time.monotonic()
+            vencimientos = [vence for vence, _ in self._rezagados()]
+        return max(0.0, min(vencimientos) - ahora) if vencimientos else None
+
+    def _soltar(self, operador: InfoTrabajador, indice_parte: int) -> Dict[InfoTrabajador, float]:
+        """Quita la copia del operador de las cuentas en vuelo y retorna las que quedan."""
+        self.en_vuelo -= 1
+        self.en_curso[operador] -= self._tam(indice_parte)
+        copias = self.copias.get(indice_parte, {})
+        copias.pop(operador, None)
+        if not copias:
+            self.copias.pop(indice_parte, None)
+        return copias
+
+    def completar(self, operador: InfoTrabajador, indice_parte: int, resultado: Any) -> List[InfoTrabajador]:
+        """Registra el resultado de un chunk resuelto por el operador. Retorna los
+        operadores con copias del chunk aún en vuelo, que conviene cancelar; si el chunk
+        ya estaba resuelto por otro, el resultado se descarta."""
+        with self.lock:
+            restantes = list(self._soltar(operador, indice_parte))
+            if indice_parte in self.tarea.resultados or self.error is not None:
+                return []
+            self.tarea.guardar(indice_parte, resultado)
+            return restantes
+
+    def ceder(self, operador: InfoTrabajador, indice_parte: int) -> bool:
+        """El operador respondió 'busy' a un chunk mientras tiene otros de esta tarea en
+        curso: la sobrecarga la genera la propia tarea, así que el chunk vuelve al frente
+        de su cola sin culpar al operador. Retorna False, sin tocar nada, si no tenía
+        otro chunk en curso (entonces es un fallo, ver fallar)."""
+        with self.lock:
+            if self.en_curso[operador] <= self._tam(indice_parte):
+                return False
+            if not self._soltar(operador, indice_parte) and indice_parte not in self.tarea.resultados:
+                self.colas[operador].appendleft(indice_parte)
+            return True
+
+    def desbordar(self, operador: InfoTrabajador, indice_parte: int):
+        """El operador no pudo dar el resultado del chunk en int64: la tarea pasa a salida de
+        lista (ver Tarea.pasar_a_lista) y el chunk vuelve al frente de la cola del operador
+        para reenviarse en JSON, sin contarlo como fallo. En dot/reduce, que no desbordan
+        en el operador, la tarea falla."""
+        with self.lock:
+            if not self._soltar(operador, indice_parte) and indice_parte not in self.tarea.resultados:
+                if self.tarea.salida is None:
+                    self.error = self.error or OverflowError(
+                        f"El resultado de '{self.tarea.operacion}' no cabe en un entero de 64 bits")
+                    return
+                self.tarea.pasar_a_lista()
+                self.colas[operador].appendleft(indice_parte)
+
+    def fallar(self, operador: InfoTrabajador, indice_parte: int, excluir: bool,
+               causa: Optional[Exception] = None):
+        """Devuelve el chunk como reintento para otro operador, salvo que ya esté resuelto
+        o tenga otra copia en vuelo. Con excluir (error de transporte, timeout u operador
+        ocupado) el operador deja de recibir chunks de esta tarea. Si ya no queda operador
+        que pueda intentarlo, la tarea falla con causa (o un RuntimeError)."""
+        with self.lock:
+            restantes = self._soltar(operador, indice_parte)
+            self.intentos.setdefault(indice_parte, set()).add(operador)
+            if excluir:
+                self.excluidos.add(operador)
+            if restantes or indice_parte in self.tarea.resultados:
+                return
+            if any(op not in self.excluidos and op not in self.intentos[indice_parte] for op in self.operadores):
+                self.reintentos.append(indice_parte)
+            elif self.error is None:
+                self.error = causa or RuntimeError(
+                    f"No fue posible completar el chunk {indice_parte}; hay operadores caídos o sin respuesta.")
+
+    def abortar(self, error: Exception):
+        """Termina la tarea con error; los chunks en vuelo se ignorarán."""
+        with self.lock:
+            if self.error is None:
+                self.error = error
+
+    def _terminado(self) -> bool:
+        """True si la tarea falló o ya tiene todos sus resultados (llamar con lock)."""
+        return self.error is not None or len(self.tarea.resultados) == len(self.tarea.partes)
+
+    def terminado(self) -> bool:
+        """True si la tarea falló o ya tiene todos sus resultados."""
+        with self.lock:
+            return self._terminado()
+
+    def debe_esperar(self, operador: InfoTrabajador) -> bool:
+        """True si el operador no tiene chunk ahora pero alguno en vuelo podría volver o
+        quedar rezagado."""
+        with self.lock:
+            return not self._terminado() and operador not in self.excluidos and self.en_vuelo > 0
+
+    def verificar(self):
+        """Lanza el error de la tarea (RuntimeError si terminó sin todos sus resultados)."""
+        if self.error is not None:
+            raise self.error
+        faltantes = [idx for idx, _, _ in self.tarea.partes if idx not in self.tarea.resultados]
+        if faltantes:
+            raise RuntimeError(
+                f"No fue posible completar el chunk {faltantes[0]}; hay operadores caídos o sin respuesta.")
+
 class Coordinador:
     """Coordinador: recibe solicitudes, parte el trabajo y maneja fallos/health checks."""
-    def __init__(self, host: str, puerto: int, lista_operadores: List[Tuple[str,int]]):
-        """Configura el coordinador y arranca el health checker periódico."""
+    def __init__(self, host: str, puerto: int, lista_operadores: List[Tuple[str,int]],
+                 num_chunks: Optional[int] = None, tam_chunk_objetivo: int = 50_000,
+                 umbral_binario: int = 1024, chunks_por_operador: int = 4,
+                 subtareas_por_operador: int = 2, cache: Optional[CacheResultados] = None,
+                 max_solicitudes: int = 64, max_cola: int = 1024, max_conexiones: int = 1024,
+                 nombre: Optional[str] = None, diario: Optional[DiarioTareas] = None,
+                 max_operadores: int = 64, token_membresia: Optional[str] = None):
+        """Configura el coordinador y arranca el health checker periódico.
+        - num_chunks: cantidad fija de chunks por tarea (None = automático)
+        - tam_chunk_objetivo: tamaño deseado de chunk cuando el número es automático
+        - umbral_binario: chunks de al menos este tamaño viajan en binario a los
+          operadores que lo soportan; los más pequeños siguen en JSON
+        - chunks_por_operador: chunks mínimos por operador vivo en modo automático, para
+          que haya trabajo que repartir según rendimiento y que robar
+        - subtareas_por_operador: chunks de una misma tarea en vuelo a la vez por operador
+        - cache: cache de resultados por contenido de la solicitud (None = sin cache)
+        - max_solicitudes: solicitudes de clientes resolviéndose a la vez
+        - max_cola: solicitudes esperando turno; con la cola llena se responde 'busy'
+        - max_conexiones: conexiones de cliente abiertas a la vez; las que sobran se
+          rechazan con 'busy'
+        - nombre: nombre con que responde chunks y se registra en un coordinador padre
+          (por defecto coord-host:puerto)
+        - diario: diario de tareas donde se anotan las solicitudes con task_id, para
+          retomarlas si el coordinador se reinicia (None = sin diario)
+        - max_operadores: operadores que puede llegar a tener, contando los que se
+          registren después; dimensiona los pools de despacho, bloques y health checks
+        - token_membresia: secreto compartido que deben traer 'register' y 'leave' (None =
+          membresía dinámica deshabilitada)
+        """
         self.host = host
         self.puerto = puerto
+        self.nombre = nombre or f"coord-{host}:{puerto}"
+        # Membresía: la lista se reemplaza entera al registrar o retirar un operador (nunca
+        # se modifica en el lugar), así quien la recorre trabaja sobre una copia estable
+        self.lock_trabajadores = threading.Lock()
+        self.numeracion = itertools.count(1)
         self.trabajadores: List[InfoTrabajador] = [
-            InfoTrabajador(f"operador-{i+1}", h, p) for i, (h, p) in enumerate(lista_operadores)
+            self._nuevo_trabajador(f"operador-{next(self.numeracion)}", h, p) for h, p in lista_operadores
         ]
+        self.max_operadores = max(max_operadores, len(self.trabajadores))
+        self.token_membresia = token_membresia
+        self.num_chunks = num_chunks
+        self.tam_chunk_objetivo = max(1, tam_chunk_objetivo)
+        self.umbral_binario = umbral_binario
+        self.chunks_por_operador = max(1, chunks_por_operador)
+        self.subtareas_por_operador = max(1, subtareas_por_operador)
+        self.cache = cache
+        self.diario = diario
+        # task_id de las tareas del diario que se están ejecutando en este proceso
+        self.tareas_persistentes: set = set()
+        self.lock_persistentes = threading.Lock()
+        # Contadores, medidores e histogramas por etapa y por operador (mensaje 'metrics')
+        self.metricas = Metricas("coord")
+        # Pools dimensionados para max_operadores (los hilos se crean a medida que hacen falta,
+        # así un tope holgado no cuesta nada mientras haya pocos operadores).
+        # Despacho de chunks en paralelo a todos los operadores; holgado porque las copias
+        # perdedoras retienen su hilo hasta que su operador responda
+        self.ejecutor = ThreadPoolExecutor(max_workers=max(64, 8 * self.subtareas_por_operador * self.max_operadores),
+                                           thread_name_prefix="Despacho")
+        # Admisión de solicitudes de clientes: max_solicitudes en curso y hasta max_cola
+        # esperando, atendidas por turnos entre conexiones (ver admision.py)
+        self.admision = self._crear_admision(max_solicitudes, max_cola)
+        self.max_conexiones = max_conexiones
+        self.conexiones = 0
+        self.lock_conexiones = threading.Lock()
+        # Bloques de streams y pares de lotes en curso (uno por subtarea que los operadores
+        # pueden tener en vuelo); aparte para que esperarlos no quite hilos al despacho
+        self.ejecutor_bloques = ThreadPoolExecutor(max_workers=max(32, self.subtareas_por_operador * self.max_operadores),
+                                                   thread_name_prefix="Bloques")
         # Timings que definimos
         self.intervalo_salud_seg = 3.0   # cada 3s se lanza un health-check
         self.timeout_salud_seg   = 3.0   # se espera hasta 3s la respuesta de cada ping
         self.timeout_calculo_seg = 4.0   # tiempo máximo por sub-tarea antes de que lo declare muerto jdsajdas
+        self.tick_salud_seg      = 0.5   # cada cuánto se revisa a qué operadores les toca ping
+        self.fallos_para_caida   = 2     # pings perdidos seguidos para declarar caído a un operador
+        self.backoff_max_seg     = 60.0  # espera máxima entre chequeos de un operador caído
+        self.vigencia_rendimiento_seg = 30.0  # antigüedad máxima de una medición de rendimiento
+        self.plazo_solicitud_seg = 30.0  # plazo total de una solicitud si el cliente no manda deadline_ms
+        self.fraccion_saturacion = 0.8   # con su cola a esta fracción de la capacidad, un operador no recibe trabajo
+        # Especulación: un chunk que tarda más que el percentil de las latencias recientes
+        # (por elemento, con un piso) recibe una copia en otro operador
+        self.percentil_especulacion   = 0.95
+        self.piso_especulacion_seg    = 0.05
+        self.muestras_min_especulacion = 20
+        self.latencias_por_elemento: deque = deque(maxlen=512)
+        # Los pings de una ronda salen todos a la vez, en su propio pool
+        self.ejecutor_salud = ThreadPoolExecutor(max_workers=self.max_operadores, thread_name_prefix="Salud")
 
-        self.hilo_salud = Repetidor(self.intervalo_salud_seg, self.verificar_salud, nombre="HealthChecker")
         self.socket_servidor = abrir_servidor(self.host, self.puerto)
-        print(f"[coord] Escuchando clientes en {self.host}:{self.puerto}")
-        self.hilo_salud.start()
+        log.info("Escuchando clientes en %s:%d", self.host, self.puerto)
 
-    def _ahora(self) -> str:
-        """Devuelve hora local HH:MM:SS para prefijar logs."""
-        return datetime.datetime.now().strftime("%H:%M:%S")
+    def _nuevo_trabajador(self, nombre: str, host: str, puerto: int) -> InfoTrabajador:
+        """Estado de un operador nuevo (del arranque o registrado después)."""
+        return InfoTrabajador(nombre, host, puerto)
 
-    def verificar_salud(self):
-        """Hace ping a cada operador; marca su estado y lo imprime en consola."""
-        for operador in self.trabajadores:
-            try:
-                with abrir_cliente(operador.host, operador.puerto, timeout=self.timeout_salud_seg) as sock:
-                    enviar_json(sock, {"type": "health"})
-                    respuesta = recibir_json(sock, timeout=self.timeout_salud_seg)
-                    ok = (respuesta.get("type") == "health_ok")
-                with operador.lock:
-                    operador.vivo = ok
-                    if ok:
-                        operador.ultimo_ok = time.time()
-                estado = "OK" if ok else "NO-RESPONDE"
-                print(f"[{self._ahora()}][salud] {operador.nombre} {estado}")
-            except Exception:
-                with operador.lock:
-                    operador.vivo = False
-                print(f"[{self._ahora()}][salud] {operador.nombre} DOWN")
+    def registrar_operador(self, host: str, puerto: int, nombre: Optional[str] = None) -> InfoTrabajador:
+        """Agrega un operador en caliente (mensaje 'register'). Es idempotente: si la
+        dirección ya está registrada retorna el existente. Se pide un chequeo de inmediato
+        para que empiece a recibir chunks apenas responda su primer ping. ValueError si ya
+        hay max_operadores."""
+        with self.lock_trabajadores:
+            for op in self.trabajadores:
+                if (op.host, op.puerto) == (host, puerto):
+                    return op
+            if len(self.trabajadores) >= self.max_operadores:
+                raise ValueError(f"Se alcanzó el máximo de {self.max_operadores} operadores")
+            if not nombre or any(op.nombre == nombre for op in self.trabajadores):
+                nombre = f"operador-{next(self.numeracion)}"
+            operador = self._nuevo_trabajador(nombre, host, puerto)
+            self.trabajadores = self.trabajadores + [operador]
+        log.info("[membresía] %s registrado en %s:%d (%d operadores)", nombre, host, puerto, len(self.trabajadores))
+        self.pedir_chequeo()
+        return operador
+
+    def retirar_operador(self, host: str, puerto: int) -> Optional[InfoTrabajador]:
+        """Quita un operador (mensaje 'leave'); None si no estaba registrado. Las tareas
+        nuevas ya no lo incluyen y las que lo tenían terminan sus chunks en vuelo (si no
+        responde, esos chunks se reintentan en otro operador como ante cualquier caída)."""
+        with self.lock_trabajadores:
+            retirado = next((op for op in self.trabajadores if (op.host, op.puerto) == (host, puerto)), None)
+            if retirado is None:
+                return None
+            self.trabajadores = [op for op in self.trabajadores if op is not retirado]
+        retirado.pool.cerrar()
+        log.info("[membresía] %s retirado (%d operadores)", retirado.nombre, len(self.trabajadores))
+        return retirado
+
+    def responder_membresia(self, solicitud: Dict) -> Dict:
+        """Atiende 'register' y 'leave': {'host', 'puerto', 'nombre'?, 'token'} del operador.
+        Sin token_membresia configurado, o con un token distinto, se rechazan: si no,
+        cualquier cliente podría dar de baja a todos los operadores."""
+        if self.token_membresia is None:
+            return {"type": "error", "error": "Membresía dinámica deshabilitada (--token-membresia)"}
+        if not hmac.compare_digest(str(solicitud.get("token", "")).encode(), self.token_membresia.encode()):
+            log.warning("[membresía] '%s' rechazado: token inválido", solicitud["type"])
+            return {"type": "error", "error": "Token de membresía inválido"}
+        host, puerto = solicitud.get("host"), solicitud.get("puerto")
+        if not isinstance(host, str) or not isinstance(puerto, int):
+            raise ValueError("'register'/'leave' requieren host (str) y puerto (int)")
+        if solicitud["type"] == "register":
+            operador = self.registrar_operador(host, puerto, solicitud.get("nombre"))
+            return {"type": "register_ok", "nombre": operador.nombre, "operadores": len(self.trabajadores)}
+        operador = self.retirar_operador(host, puerto)
+        if operador is None:
+            return {"type": "error", "error": f"Operador {host}:{puerto} no registrado"}
+        return {"type": "leave_ok", "nombre": operador.nombre, "operadores": len(self.trabajadores)}
+
+    def _crear_admision(self, max_solicitudes: int, max_cola: int) -> Admision:
+        """Cola de admisión de solicitudes (con hilos)."""
+        return Admision(max_solicitudes, max_cola, nombre="Solicitudes")
+
+    def verificar_salud(self, forzar: bool = False):
+        """Hace ping a la vez a los operadores a los que les toca chequeo (o a todos si
+        forzar) y registra su estado. Una ronda tarda lo que el ping más lento."""
+        futuros = [self.ejecutor_salud.submit(self._ping, op) for op in self._chequeos_vencidos(forzar)]
+        for futuro in as_completed(futuros):
+            futuro.result()
+
+    def _chequeos_vencidos(self, forzar: bool = False) -> List[InfoTrabajador]:
+        """Operadores cuyo proximo_chequeo ya pasó."""
+        ahora = time.monotonic()
+        return [op for op in self.trabajadores if forzar or op.proximo_chequeo <= ahora]
+
+    def _timeout_ping(self, operador: InfoTrabajador) -> float:
+        """Timeout adaptativo del ping: varias veces el RTT habitual del operador, acotado
+        entre 1s y timeout_salud_seg. Un operador que responde mucho más lento de lo normal
+        cuenta como latido perdido."""
+        if operador.latencia_salud is None:
+            return self.timeout_salud_seg
+        return min(self.timeout_salud_seg, max(1.0, 10 * operador.latencia_salud))
+
+    def _ping(self, operador: InfoTrabajador):
+        """Envía un health al operador y registra la respuesta y su latencia."""
+        inicio = time.monotonic()
+        try:
+            respuesta = operador.pool.solicitar({"type": "health"}, timeout=self._timeout_ping(operador))
+        except Exception:
+            respuesta = None
+        self._registrar_salud(operador, respuesta, time.monotonic() - inicio)
+
+    def _registrar_salud(self, operador: InfoTrabajador, respuesta: Optional[Dict], latencia: float):
+        """Marca al operador según la respuesta a su ping (None = no respondió)."""
+        ok = respuesta is not None and respuesta.get("type") == "health_ok"
+        with operador.lock:
+            estaba_vivo = operador.vivo
+            if ok:
+                self._marcar_vivo(operador)
+                operador.binario = "bin" in respuesta.get("formatos", ())
+                operador.latencia_salud = ewma(operador.latencia_salud, latencia)
+                operador.capacidad_cola = respuesta.get("capacidad_cola", operador.capacidad_cola)
+                operador.cola = respuesta.get("cola", 0)
+            else:
+                self._contar_fallo(operador)
+            vivo = operador.vivo
+        self.metricas.observar("ping_seg", latencia, operador=operador.nombre)
+        if ok:
+            # Un OK que no cambia nada se repite en cada ronda: solo en DEBUG
+            log.log(logging.DEBUG if estaba_vivo else logging.INFO, "[salud] %s OK", operador.nombre)
+            return
+        self.metricas.incrementar("pings_fallidos_total", operador=operador.nombre)
+        if respuesta is not None:
+            estado = "NO-RESPONDE"
+        else:
+            estado = "DOWN" if not vivo else "SOSPECHOSO"
+        log.warning("[salud] %s %s", operador.nombre, estado)
+
+    def _marcar_vivo(self, operador: InfoTrabajador):
+        """Registra una respuesta sana (llamar con operador.lock tomado). Aplaza el próximo
+        ping: el tráfico real también sirve de latido."""
+        operador.vivo = True
+        operador.fallos_consecutivos = 0
+        operador.ultimo_ok = time.time()
+        operador.proximo_chequeo = time.monotonic() + self.intervalo_salud_seg
+
+    def _contar_fallo(self, operador: InfoTrabajador, definitivo: bool = False):
+        """Registra un fallo (llamar con operador.lock tomado). Tras fallos_para_caida
+        seguidos (o de inmediato si es definitivo, p.ej. conexión rechazada) queda caído y
+        se vuelve a chequear con backoff exponencial; si solo es sospechoso se chequea en
+        el siguiente tick."""
+        operador.fallos_consecutivos += 1
+        if definitivo or operador.fallos_consecutivos >= self.fallos_para_caida:
+            operador.vivo = False
+        if operador.vivo:
+            operador.proximo_chequeo = time.monotonic()
+            return
+        exponente = max(0, operador.fallos_consecutivos - self.fallos_para_caida)
+        espera = min(self.backoff_max_seg, self.intervalo_salud_seg * (2 ** min(exponente, 16)))
+        operador.proximo_chequeo = time.monotonic() + espera
+
+    def registrar_exito(self, operador: InfoTrabajador):
+        """Una subtarea resuelta confirma que el operador está vivo."""
+        with operador.lock:
+            revivio = not operador.vivo
+            self._marcar_vivo(operador)
+        if revivio:
+            log.info("[salud] %s OK (respondió una subtarea)", operador.nombre)
+
+    def registrar_fallo(self, operador: InfoTrabajador, error: Exception):
+        """Una subtarea fallida cuenta como latido perdido; si la conexión fue rechazada o
+        cortada el operador se marca caído de inmediato. Los timeouts solo suman."""
+        definitivo = isinstance(error, OSError) and not isinstance(error, (TimeoutError, socket.timeout))
+        with operador.lock:
+            estaba_vivo = operador.vivo
+            self._contar_fallo(operador, definitivo)
+            cayo = estaba_vivo and not operador.vivo
+        if cayo:
+            log.warning("[salud] %s DOWN (falló una subtarea)", operador.nombre)
+
+    def pedir_chequeo(self):
+        """Adelanta el chequeo de todos los operadores sin esperar su resultado."""
+        for op in self.trabajadores:
+            op.proximo_chequeo = 0.0
+        hilo = getattr(self, "hilo_salud", None)
+        if hilo is not None:
+            hilo.despertar()
 
     def trabajadores_vivos(self) -> List[InfoTrabajador]:
         """Retorna la lista de operadores actualmente marcados como vivos."""
@@ -70,133 +643,1433 @@ class Coordinador:
                     vivos.append(op)
         return vivos
 
-    def enviar_subtarea(self, operador: InfoTrabajador, id_tarea: str, indice_parte: int,
-                        subarreglo_izquierdo, subarreglo_derecho) -> Dict:
-        """Envía un chunk de la suma al operador seleccionado y espera su 'result'."""
-        with abrir_cliente(operador.host, operador.puerto, timeout=self.timeout_calculo_seg) as sock:
-            enviar_json(sock, {"type": "compute_sum", "task_id": id_tarea, "idx": indice_parte,
-                               "a": subarreglo_izquierdo, "b": subarreglo_derecho})
-            return recibir_json(sock, timeout=self.timeout_calculo_seg)
-
-    def calcular_suma_distribuida(self, arreglo_numeros_izquierda: List[int],
-                                  arreglo_numeros_derecha: List[int]) -> List[int]:
-        """Divide los arreglos en 2 mitades, asigna a operadores (con reintentos) y recombina."""
-        if len(arreglo_numeros_izquierda) != len(arreglo_numeros_derecha):
-            raise ValueError("Los arreglos deben tener la misma longitud")
-        tam_total = len(arreglo_numeros_izquierda)
-        mitad = tam_total // 2
-        partes = [
-            (0, arreglo_numeros_izquierda[:mitad], arreglo_numeros_derecha[:mitad]),
-            (1, arreglo_numeros_izquierda[mitad:], arreglo_numeros_derecha[mitad:])
-        ]
-        id_tarea = str(uuid.uuid4())
-        print(f"[coord] Nueva tarea {id_tarea} con n={tam_total} (chunks={len(partes)})")
-
-        # --- imprimir los chunks a resolver ---
-        for idx, a_chunk, b_chunk in partes:
-            print(f"[coord] Tarea {id_tarea} → chunk {idx}: A={a_chunk}  B={b_chunk}")
-
-        resultados_por_parte: Dict[int, List[int]] = {}
-
-        def intentar_asignar(indice_parte: int, preferido: Optional[InfoTrabajador] = None) -> bool:
-            """Intenta una asignación al operador preferido y, si falla, a cualquiera vivo."""
-            sub_izq, sub_der = partes[indice_parte][1], partes[indice_parte][2]
-            candidatos = self.trabajadores_vivos()
-            if preferido and preferido in candidatos:
-                candidatos.remove(preferido)
-                candidatos.insert(0, preferido)
-            for op in candidatos:
-                try:
-                    print(f"[coord] Enviando chunk {indice_parte} a {op.nombre}...")
-                    respuesta = self.enviar_subtarea(op, id_tarea, indice_parte, sub_izq, sub_der)
-                    if respuesta.get("type") == "result" and respuesta.get("idx") == indice_parte:
-                        resultados_por_parte[indice_parte] = respuesta["result"]
-                        print(f"[coord] Chunk {indice_parte} resuelto por {op.nombre} -> {respuesta['result']}")
-                        return True
-                    else:
-                        print(f"[coord] Respuesta inesperada de {op.nombre}: {respuesta}")
-                except Exception as exc:
-                    print(f"[coord] {op.nombre} falló en chunk {indice_parte}: {exc}")
-            return False
+    def _saturado(self, operador: InfoTrabajador, ahora: float) -> bool:
+        """True si el operador respondió 'busy' hace poco o su cola informada está por
+        encima de fraccion_saturacion de su capacidad."""
+        if operador.saturado_hasta > ahora:
+            return True
+        return operador.capacidad_cola is not None and operador.cola >= self.fraccion_saturacion * operador.capacidad_cola
+
+    def trabajadores_libres(self, disponibles: List[InfoTrabajador]) -> List[InfoTrabajador]:
+        """De los operadores disponibles, los que no están saturados. Si lo están todos
+        lanza ErrorOcupado con la espera hasta que el primero vuelva a considerarse (fin de
+        su 'busy' o su próximo health check)."""
+        ahora = time.monotonic()
+        libres = [op for op in disponibles if not self._saturado(op, ahora)]
+        if libres:
+            return libres
+        espera = min((op.saturado_hasta if op.saturado_hasta > ahora else op.proximo_chequeo) - ahora
+                     for op in disponibles)
+        raise ErrorOcupado(max(0.05, espera), "Todos los operadores están saturados")
+
+    def _registrar_cola(self, operador: InfoTrabajador, respuesta: Dict):
+        """Anota la profundidad de cola que informa una respuesta del operador."""
+        if "cola" in respuesta:
+            operador.cola = respuesta["cola"]
 
+    def _operador_ocupado(self, operador: InfoTrabajador, respuesta: Dict) -> ErrorOcupado:
+        """Registra un 'busy' del operador: no recibe trabajo hasta que pase su retry_after_ms."""
+        espera = respuesta.get("retry_after_ms", 100) / 1000
+        with operador.lock:
+            operador.saturado_hasta = time.monotonic() + espera
+        self._registrar_cola(operador, respuesta)
+        log.info("%s ocupado (cola=%s), sin trabajo por %.0fms", operador.nombre, respuesta.get("cola"), espera * 1000)
+        return ErrorOcupado(espera, f"{operador.nombre} ocupado")
+
+    def trabajadores_disponibles(self) -> List[InfoTrabajador]:
+        """Operadores a los que se puede enviar trabajo: los vivos o, si no queda ninguno,
+        todos (los de menos fallos primero) para que la propia subtarea sirva de sonda en
+        lugar de esperar una ronda de health checks. En ese caso adelanta el chequeo."""
         vivos = self.trabajadores_vivos()
-        if not vivos:
-            self.verificar_salud()
-            vivos = self.trabajadores_vivos()
+        if vivos:
+            return vivos
+        self.pedir_chequeo()
+        return sorted(self.trabajadores, key=lambda op: op.fallos_consecutivos)
+
+    def enviar_subtarea(self, operador: InfoTrabajador, mensaje: Dict, timeout: Optional[float] = None) -> Dict:
+        """Envía un chunk (ver _mensaje_chunk) al operador por una conexión del pool y
+        espera su 'result' (hasta timeout, por defecto timeout_calculo_seg)."""
+        return operador.pool.solicitar(mensaje, timeout=timeout or self.timeout_calculo_seg)
+
+    def cancelar_subtarea(self, operador: InfoTrabajador, id_tarea: str, indice_parte: int):
+        """Avisa al operador que ya no hace falta el chunk (otra copia respondió antes)."""
+        try:
+            operador.pool.solicitar({"type": "cancel", "task_id": id_tarea, "idx": indice_parte}, timeout=1.0)
+        except Exception:
+            pass
+
+    def _como_vistas(self, operacion: str, izquierda: Sequence[int], derecha: Optional[Sequence[int]]):
+        """Retorna los arreglos como memoryview int64 cuando conviene el formato binario,
+        para cortar chunks sin copiar. Si no (entrada JSON pequeña, ningún operador
+        binario, enteros fuera de int64 o un resultado que podría no caber en int64) los
+        retorna tal cual, así una entrada JSON siempre da el resultado exacto."""
+        entradas = [izquierda] if derecha is None else [izquierda, derecha]
+        if all(es_buffer(datos) for datos in entradas):
+            vistas = [memoryview(datos) for datos in entradas]
+        elif (len(izquierda) < self.umbral_binario or not any(op.binario for op in self.trabajadores)
+              or not cabe_en_int64(operacion, izquierda, derecha)):
+            return izquierda, derecha
+        else:
+            try:
+                vistas = [memoryview(array("q", datos)) for datos in entradas]
+            except (OverflowError, TypeError):
+                return izquierda, derecha
+        return vistas[0], (vistas[1] if derecha is not None else None)
+
+    def _carga_chunk(self, operador: InfoTrabajador, tarea: Tarea, datos, inicio: int, fin: int):
+        """Corta [inicio, fin) en el formato que corresponde al operador: vista binaria
+        (sin copia) si lo soporta, el chunk es grande y la tarea no pasó a salida de lista;
+        lista JSON en otro caso."""
+        trozo = datos[inicio:fin]
+        binario = operador.binario and fin - inicio >= self.umbral_binario and not isinstance(tarea.salida, list)
+        if isinstance(trozo, memoryview) and not binario:
+            return trozo.tolist()
+        return trozo
+
+    def _mensaje_chunk(self, operador: InfoTrabajador, tarea: Tarea, indice_parte: int) -> Dict:
+        """Arma el mensaje compute_<operacion> de un chunk para ese operador."""
+        _, inicio, fin = tarea.partes[indice_parte]
+        mensaje = {"type": f"{PREFIJO_CALCULO}{tarea.operacion}", "task_id": tarea.id, "idx": indice_parte,
+                   "deadline_ms": max(0, int(tarea.restante_seg() * 1000)),
+                   "a": self._carga_chunk(operador, tarea, tarea.izquierda, inicio, fin)}
+        if tarea.derecha is not None:
+            mensaje["b"] = self._carga_chunk(operador, tarea, tarea.derecha, inicio, fin)
+        if tarea.operacion == "reduce":
+            mensaje["funcion"] = tarea.funcion
+        return mensaje
+
+    def planificar_chunks(self, tam_total: int, num_vivos: int) -> List[Tuple[int, int, int]]:
+        """Decide cómo partir [0, tam_total) y retorna tuplas (idx, inicio, fin).
+        Si no se fijó --chunks, usa al menos chunks_por_operador chunks por operador vivo
+        (sin bajar de TAM_CHUNK_MINIMO elementos ni del umbral binario, pero siempre uno por
+        operador) y tantos
+        como hagan falta para no superar el tamaño objetivo."""
+        if self.num_chunks:
+            cantidad = self.num_chunks
+        else:
+            cantidad = max(num_vivos * self.chunks_por_operador, -(-tam_total // self.tam_chunk_objetivo))
+            tam_minimo = max(TAM_CHUNK_MINIMO, self.umbral_binario)
+            cantidad = min(cantidad, max(num_vivos, tam_total // tam_minimo,
+                                         -(-tam_total // self.tam_chunk_objetivo)))
+        cantidad = max(1, min(cantidad, tam_total))
+        base, resto = divmod(tam_total, cantidad)
+        rangos, inicio = [], 0
+        for idx in range(cantidad):
+            fin = inicio + base + (1 if idx < resto else 0)
+            rangos.append((idx, inicio, fin))
+            inicio = fin
+        return rangos
+
+    def _reservar_salida(self, operacion: str, izquierda) -> Any:
+        """Resultado final de una operación elemento a elemento, reservado de una vez con su
+        largo: array('q') si la tarea se trabaja en binario y lista si no (None en dot/reduce)."""
+        if operacion not in OPERACIONES_ELEMENTO:
+            return None
+        if isinstance(izquierda, memoryview):
+            return array("q", [0]) * len(izquierda)
+        return [0] * len(izquierda)
+
+    def _preparar_tarea(self, operacion: str, izquierda, derecha, funcion: str,
+                        vivos: List[InfoTrabajador], plazo_seg: Optional[float],
+                        id_tarea: Optional[str] = None) -> Tarea:
+        """Parte el trabajo y crea la Tarea (entradas ya en su formato, ver _como_vistas)
+        con el id dado o uno nuevo."""
+        with self.metricas.cronometro("etapa_seg", etapa="particion"):
+            tarea = Tarea(id_tarea or str(uuid.uuid4()), operacion, funcion, izquierda, derecha,
+                          self.planificar_chunks(len(izquierda), len(vivos)),
+                          time.monotonic() + (plazo_seg or self.plazo_solicitud_seg),
+                          self._reservar_salida(operacion, izquierda))
+        log.debug("Nueva tarea %s (%s) con n=%d (chunks=%d, vivos=%d)",
+                  tarea.id, operacion, len(izquierda), len(tarea.partes), len(vivos))
+        if log.isEnabledFor(logging.DEBUG):
+            for idx, inicio, fin in tarea.partes:
+                log.debug("Tarea %s → chunk %d: [%d:%d]", tarea.id, idx, inicio, fin)
+        return tarea
+
+    def _respuesta_chunk(self, operador: InfoTrabajador, tarea: Tarea, indice_parte: int, enviado: float,
+                         respuesta: Dict) -> Any:
+        """Registra la respuesta de un operador a un chunk (carga, mediciones y cola) y
+        retorna su resultado. Un 'busy' lanza ErrorOcupado sin contar como fallo del operador."""
+        _, inicio, fin = tarea.partes[indice_parte]
+        if respuesta.get("type") == "busy":
+            error = self._operador_ocupado(operador, respuesta)
+            self._fin_subtarea(operador, fin - inicio, enviado, error)
+            raise error
+        self._fin_subtarea(operador, fin - inicio, enviado, completa=respuesta.get("type") != "cancelled")
+        self._medir_chunk(operador, respuesta, time.monotonic() - enviado)
+        self._registrar_cola(operador, respuesta)
+        resultado = self._resultado_chunk(operador, indice_parte, respuesta)
+        if tarea.salida is not None and len(resultado) != fin - inicio:
+            raise ValueError(f"resultado de {len(resultado)} elementos para un chunk de {fin - inicio}")
+        return resultado
+
+    def _resultado_chunk(self, operador: InfoTrabajador, indice_parte: int, respuesta: Dict) -> Any:
+        """Extrae el resultado de la respuesta de un operador (ValueError si no es válida)."""
+        if respuesta.get("type") == "result" and respuesta.get("idx") == indice_parte:
+            log.debug("Chunk %d resuelto por %s", indice_parte, operador.nombre)
+            return respuesta["result"]
+        if respuesta.get("type") == "cancelled":
+            raise ValueError("subtarea cancelada")
+        if respuesta.get("overflow"):
+            raise OverflowError(respuesta.get("error"))
+        raise ValueError(f"respuesta inesperada: {respuesta.get('error', respuesta.get('type'))}")
+
+    def _plazo_especulacion(self) -> Optional[Callable[[int], float]]:
+        """Plazo de un chunk de n elementos antes de lanzarle una copia: el percentil
+        percentil_especulacion de las latencias por elemento recientes por n, con piso
+        piso_especulacion_seg. None mientras no haya muestras suficientes."""
+        muestras = sorted(self.latencias_por_elemento)
+        if len(muestras) < self.muestras_min_especulacion:
+            return None
+        por_elemento = muestras[min(len(muestras) - 1, int(self.percentil_especulacion * len(muestras)))]
+        piso = self.piso_especulacion_seg
+        return lambda elementos: max(piso, por_elemento * elementos)
+
+    def _espera_plan(self, plan: PlanDespacho, tarea: Tarea) -> float:
+        """Cuánto puede dormir quien espera al plan: hasta el próximo chunk rezagado o
+        hasta el fin del plazo de la solicitud."""
+        espera = tarea.restante_seg()
+        vencimiento = plan.proximo_vencimiento()
+        if vencimiento is not None:
+            espera = min(espera, vencimiento)
+        return max(0.001, espera)
+
+    def _chunk_fallido(self, plan: PlanDespacho, tarea: Tarea, operador: InfoTrabajador,
+                       indice_parte: int, error: Exception) -> bool:
+        """Informa al plan de un chunk fallido. Si se agotó el plazo de la solicitud la
+        tarea termina; si no, el chunk vuelve a repartirse y, salvo que el operador haya
+        respondido (ValueError), se excluye al operador de la tarea. Un 'busy' con otros
+        chunks de la tarea en curso en el operador solo le devuelve el chunk (ver
+        PlanDespacho.ceder); si el chunk no pudo ir a ningún operador porque todos estaban
+        ocupados, la tarea falla con ErrorOcupado. Un resultado que no cupo en int64 pasa
+        la tarea a JSON (ver PlanDespacho.desbordar). Retorna True si quien envió el chunk
+        debe dejar de tomar chunks de la tarea (el operador tiene menos capacidad)."""
+        if isinstance(error, TimeoutError) and tarea.restante_seg() <= 0:
+            plan.abortar(self._error_plazo(tarea))
+        elif isinstance(error, OverflowError):
+            plan.desbordar(operador, indice_parte)
+        elif isinstance(error, ErrorOcupado) and plan.ceder(operador, indice_parte):
+            return True
+        else:
+            plan.fallar(operador, indice_parte, excluir=not isinstance(error, ValueError),
+                        causa=error if isinstance(error, ErrorOcupado) else None)
+        return False
+
+    def _error_plazo(self, tarea: Tarea) -> TimeoutError:
+        """Error de una tarea que agotó el plazo de su solicitud."""
+        return TimeoutError(f"Se agotó el plazo de la solicitud con {len(tarea.resultados)} de "
+                            f"{len(tarea.partes)} chunks resueltos")
+
+    def _rendimientos(self, operadores: List[InfoTrabajador]) -> Dict[InfoTrabajador, float]:
+        """Elementos/seg estimados de cada operador. Los que no tienen una medición reciente
+        toman el promedio de los medidos (o 1 si no hay ninguno: reparto en partes iguales),
+        así un operador que dejó de recibir trabajo por lento vuelve a ser probado."""
+        limite = time.monotonic() - self.vigencia_rendimiento_seg
+        medidos = {op: op.rendimiento for op in operadores if op.rendimiento and op.medido_en >= limite}
+        por_defecto = sum(medidos.values()) / len(medidos) if medidos else 1.0
+        return {op: medidos.get(op, por_defecto) for op in operadores}
+
+    def _inicio_subtarea(self, operador: InfoTrabajador, elementos: int) -> float:
+        """Suma la subtarea a la carga en vuelo del operador y retorna el instante de envío."""
+        with operador.lock:
+            operador.en_vuelo += 1
+            operador.carga_en_vuelo += elementos
+        return time.monotonic()
+
+    def _fin_subtarea(self, operador: InfoTrabajador, elementos: int, inicio: float,
+                      error: Optional[BaseException] = None, completa: bool = True,
+                      recortada: bool = False):
+        """Descuenta la subtarea de la carga en vuelo y actualiza latencia y rendimiento.
+        Un timeout o una cancelación (completa=False) también cuentan como medición (el
+        tiempo transcurrido es una cota inferior) pero no entran a las muestras de
+        especulación; otros errores no dicen nada de la velocidad del operador. Un timeout
+        recortado por el plazo de la solicitud no cuenta como fallo del operador."""
+        latencia = max(time.monotonic() - inicio, 1e-6)
+        with operador.lock:
+            operador.en_vuelo -= 1
+            operador.carga_en_vuelo -= elementos
+            if error is None or isinstance(error, TimeoutError):
+                operador.latencia_ewma = ewma(operador.latencia_ewma, latencia)
+                operador.rendimiento = ewma(operador.rendimiento, elementos / latencia)
+                operador.medido_en = time.monotonic()
+        if error is None and completa:
+            self.latencias_por_elemento.append(latencia / max(1, elementos))
+            self.metricas.observar("subtarea_seg", latencia, operador=operador.nombre)
+            self.metricas.incrementar("elementos_total", elementos, operador=operador.nombre)
+        if error is None:
+            resultado = "ok" if completa else "cancelada"
+        elif isinstance(error, ErrorOcupado):
+            resultado = "ocupado"
+        else:
+            resultado = "timeout" if isinstance(error, TimeoutError) else "error"
+        self.metricas.incrementar("subtareas_total", operador=operador.nombre, resultado=resultado)
+        if isinstance(error, ErrorOcupado):
+            return   # el operador respondió: está vivo, solo sin capacidad
+        if isinstance(error, Exception) and not (recortada and isinstance(error, TimeoutError)):
+            self.registrar_fallo(operador, error)
+        elif error is None:
+            self.registrar_exito(operador)
+
+    def _medir_chunk(self, operador: InfoTrabajador, respuesta: Dict, latencia: float):
+        """Separa la latencia de un chunk en cálculo en el operador (calculo_seg de su
+        respuesta) y despacho: serializar, enviar, esperar turno y recibir."""
+        calculo = respuesta.get("calculo_seg")
+        if calculo is None:
+            return
+        self.metricas.observar("etapa_seg", calculo, etapa="calculo_operador")
+        self.metricas.observar("calculo_operador_seg", calculo, operador=operador.nombre)
+        self.metricas.observar("etapa_seg", max(0.0, latencia - calculo), etapa="despacho")
+
+    def resolver_chunk(self, operador: InfoTrabajador, tarea: Tarea, indice_parte: int) -> Any:
+        """Envía un chunk al operador y retorna su resultado, registrando su carga, latencia
+        y salud. El timeout es el menor entre timeout_calculo_seg y lo que queda del plazo
+        de la solicitud. Propaga el error si el envío falla, lanza ErrorOcupado si el
+        operador responde 'busy' y ValueError si la respuesta no es un resultado válido."""
+        _, inicio, fin = tarea.partes[indice_parte]
+        log.debug("Enviando chunk %d a %s", indice_parte, operador.nombre)
+        timeout = min(self.timeout_calculo_seg, max(0.001, tarea.restante_seg()))
+        enviado = self._inicio_subtarea(operador, fin - inicio)
+        tarea.anotar_despacho(indice_parte)
+        try:
+            respuesta = self.enviar_subtarea(operador, self._mensaje_chunk(operador, tarea, indice_parte), timeout)
+        except Exception as exc:
+            self._fin_subtarea(operador, fin - inicio, enviado, exc, recortada=timeout < self.timeout_calculo_seg)
+            raise
+        return self._respuesta_chunk(operador, tarea, indice_parte, enviado, respuesta)
+
+    def _ensamblar(self, tarea: Tarea) -> Any:
+        """Resultado final de la tarea: en las operaciones elemento a elemento es la salida,
+        que los chunks ya escribieron en su lugar (array('q') si la tarea fue binaria); en
+        dot/reduce combina los parciales en orden de idx."""
+        with self.metricas.cronometro("etapa_seg", etapa="ensamblado"):
+            resultado_final = self._combinar(tarea)
+        log.debug("Tarea %s resuelta", tarea.id)
+        return resultado_final
+
+    def _combinar(self, tarea: Tarea) -> Any:
+        """Cuerpo de _ensamblar."""
+        if tarea.salida is not None:
+            return tarea.salida
+        return combinar_parciales(
+            tarea.operacion, [tarea.resultados[idx] for idx in range(len(tarea.partes))], tarea.funcion)
+
+    def _validar_entrada(self, operacion: str, izquierda: Sequence[int], derecha: Optional[Sequence[int]],
+                         funcion: str) -> None:
+        """Valida la solicitud antes de repartirla (ValueError si no es válida)."""
+        validar_operacion(operacion, izquierda, derecha, funcion)
+        if operacion == "reduce" and funcion != "sum" and not len(izquierda):
+            raise ValueError(f"No se puede aplicar {funcion} a un arreglo vacío")
+
+    def calcular_distribuido(self, operacion: str, arreglo_numeros_izquierda: Sequence[int],
+                             arreglo_numeros_derecha: Optional[Sequence[int]] = None,
+                             funcion: str = "sum", plazo_seg: Optional[float] = None) -> Any:
+        """Divide los arreglos en N chunks, los reparte entre los operadores vivos según su
+        rendimiento (con robo de trabajo, copias de rezagados y reintentos, ver
+        PlanDespacho) y recombina los resultados por idx. Falla con TimeoutError si no
+        termina en plazo_seg (por defecto plazo_solicitud_seg).
+        Acepta listas o buffers int64; en operaciones elemento a elemento el resultado es
+        un array('q') si la entrada se trabaja en binario y una lista si no; en dot y
+        reduce es un entero."""
+        self._validar_entrada(operacion, arreglo_numeros_izquierda, arreglo_numeros_derecha, funcion)
+        if len(arreglo_numeros_izquierda) == 0:
+            return [] if operacion in OPERACIONES_ELEMENTO else 0
+
+        izquierda, derecha = self._como_vistas(operacion, arreglo_numeros_izquierda, arreglo_numeros_derecha)
+        if self.cache is None:
+            return self._resolver_distribuido(operacion, izquierda, derecha, funcion, plazo_seg)
+        clave = self._clave_cache(operacion, izquierda, derecha, funcion)
+        return self.cache.obtener_o_calcular(
+            clave, lambda: self._resolver_distribuido(operacion, izquierda, derecha, funcion, plazo_seg),
+            timeout=plazo_seg or self.plazo_solicitud_seg)
+
+    def _clave_cache(self, operacion: str, izquierda, derecha, funcion: str) -> bytes:
+        """Clave de cache de una solicitud: hash del contenido de los arreglos, la operación
+        y el formato de trabajo (que define si el resultado es array('q') o lista)."""
+        formato = "bin" if isinstance(izquierda, memoryview) else "json"
+        return clave_contenido(operacion, funcion if operacion == "reduce" else "", formato, izquierda, derecha)
+
+    def _resolver_distribuido(self, operacion: str, izquierda, derecha, funcion: str,
+                              plazo_seg: Optional[float]) -> Any:
+        """Cuerpo de calcular_distribuido sin cache: reparte la tarea y ensambla el resultado."""
+        vivos = self._operadores_tarea()
+        tarea = self._preparar_tarea(operacion, izquierda, derecha, funcion, vivos, plazo_seg)
+        return self._ejecutar_tarea(tarea, vivos)
+
+    def _operadores_tarea(self) -> List[InfoTrabajador]:
+        """Operadores que participan en una tarea nueva: los vivos con capacidad
+        (RuntimeError si no hay ninguno vivo, ErrorOcupado si todos están saturados)."""
+        vivos = self.trabajadores_disponibles()
         if not vivos:
             raise RuntimeError("No hay operadores vivos para procesar la solicitud")
+        return self.trabajadores_libres(vivos)
 
-        preferidos = {0: vivos[0], 1: (vivos[1] if len(vivos) > 1 else vivos[0])}
-
-        for indice_parte, _, _ in partes:
-            exito = intentar_asignar(indice_parte, preferidos[indice_parte])
-            if not exito:
-                print(f"[coord] Reintentando chunk {indice_parte} con cualquier operador vivo...")
-                exito = intentar_asignar(indice_parte, None)
-                if not exito:
-                    raise RuntimeError(
-                        f"No fue posible completar el chunk {indice_parte}; hay operadores caídos o sin respuesta."
-                    )
-
-        resultado_final = resultados_por_parte[0] + resultados_por_parte[1]
-        # --- imprimir solución final ---
-        print(f"[coord] Tarea {id_tarea} RESUELTA → resultado final = {resultado_final}")
-        return resultado_final
+    def _ejecutar_tarea(self, tarea: Tarea, vivos: List[InfoTrabajador]) -> Any:
+        """Reparte los chunks que le faltan a la tarea entre los operadores y ensambla el resultado."""
+        plan = PlanDespacho(tarea, vivos, self._rendimientos(vivos), self._plazo_especulacion())
+        cambio = threading.Condition()
+        activos = len(vivos) * self.subtareas_por_operador
+
+        def trabajar(operador: InfoTrabajador):
+            """Resuelve chunks del plan con el operador hasta que no quede trabajo para él."""
+            nonlocal activos
+            try:
+                while True:
+                    with cambio:
+                        indice_parte = plan.tomar(operador)
+                        while indice_parte is None and plan.debe_esperar(operador):
+                            cambio.wait(self._espera_plan(plan, tarea))
+                            indice_parte = plan.tomar(operador)
+                    if indice_parte is None:
+                        return
+                    try:
+                        resultado = self.resolver_chunk(operador, tarea, indice_parte)
+                        for perdedor in plan.completar(operador, indice_parte, resultado):
+                            self.ejecutor.submit(self.cancelar_subtarea, perdedor, tarea.id, indice_parte)
+                    except Exception as exc:
+                        if not isinstance(exc, (ErrorOcupado, OverflowError)):   # no son fallos del operador
+                            log.warning("%s falló en chunk %d: %s", operador.nombre, indice_parte, exc)
+                        if self._chunk_fallido(plan, tarea, operador, indice_parte, exc):
+                            return
+                    with cambio:
+                        cambio.notify_all()
+            finally:
+                with cambio:
+                    activos -= 1
+                    cambio.notify_all()
+
+        # Cada operador procesa hasta subtareas_por_operador chunks de la tarea a la vez.
+        # No se espera a las copias perdedoras: terminan solas y su resultado se descarta.
+        for op in vivos:
+            for _ in range(self.subtareas_por_operador):
+                self.ejecutor.submit(trabajar, op)
+        with cambio:
+            while activos and not plan.terminado():
+                if tarea.restante_seg() <= 0:
+                    plan.abortar(self._error_plazo(tarea))
+                    cambio.notify_all()
+                    break
+                cambio.wait(tarea.restante_seg())
+        self._contar_plan(plan)
+        plan.verificar()
+        return self._ensamblar(tarea)
+
+    def _contar_plan(self, plan: PlanDespacho):
+        """Suma a las métricas lo que hizo el plan de una tarea."""
+        self.metricas.incrementar("tareas_total", operacion=plan.tarea.operacion,
+                                  resultado="ok" if plan.error is None else "error")
+        self.metricas.incrementar("chunks_total", len(plan.tarea.partes))
+        if plan.robos:
+            self.metricas.incrementar("chunks_robados_total", plan.robos)
+        if plan.copias_especulativas:
+            self.metricas.incrementar("copias_especulativas_total", plan.copias_especulativas)
+
+    def calcular_suma_distribuida(self, arreglo_numeros_izquierda: Sequence[int],
+                                  arreglo_numeros_derecha: Sequence[int]) -> Sequence[int]:
+        """Suma elemento a elemento distribuida (ver calcular_distribuido)."""
+        return self.calcular_distribuido("sum", arreglo_numeros_izquierda, arreglo_numeros_derecha)
+
+    def calcular_bloque(self, arreglo_numeros_izquierda: Sequence[int],
+                        arreglo_numeros_derecha: Sequence[int]) -> Any:
+        """Suma un bloque de un stream: como calcular_distribuido pero sin pasar por el
+        cache (los bloques de un stream rara vez se repiten y lo llenarían)."""
+        self._validar_entrada("sum", arreglo_numeros_izquierda, arreglo_numeros_derecha, "sum")
+        if len(arreglo_numeros_izquierda) == 0:
+            return []
+        izquierda, derecha = self._como_vistas("sum", arreglo_numeros_izquierda, arreglo_numeros_derecha)
+        return self._resolver_distribuido("sum", izquierda, derecha, "sum", None)
+
+    def _como_int64(self, izquierda: Sequence[int], derecha: Optional[Sequence[int]]):
+        """Entradas como memoryview int64 para anotarlas en el diario (las listas se copian a
+        array('q')). ValueError si traen enteros fuera de int64."""
+        try:
+            return tuple(None if datos is None else memoryview(datos if es_buffer(datos) else array("q", datos))
+                         for datos in (izquierda, derecha))
+        except (OverflowError, TypeError):
+            raise ValueError("Una tarea con task_id requiere enteros de 64 bits")
+
+    def _buscar_persistente(self, solicitud: Dict) -> Tuple[str, Optional[TareaDiario]]:
+        """Valida una solicitud con task_id y retorna (task_id, su entrada en el diario o None
+        si es nueva). ValueError si el task_id ya se usó para otra operación o largo."""
+        operacion, izquierda, derecha, funcion, _ = self._argumentos_solicitud(solicitud)
+        self._validar_entrada(operacion, izquierda, derecha, funcion)
+        id_tarea = str(solicitud["task_id"])
+        entrada = self.diario.tarea(id_tarea)
+        if entrada is not None and (entrada.operacion != operacion or entrada.n != len(izquierda)):
+            raise ValueError(f"El task_id {id_tarea} ya se usó para otra tarea")
+        return id_tarea, entrada
+
+    def _reclamar(self, id_tarea: str, entrada: Optional[TareaDiario]) -> bool:
+        """True (y la marca como en ejecución) si a quien llama le toca ejecutar la tarea: es
+        nueva, falló o quedó a medias, y nadie en este proceso la está ejecutando."""
+        if entrada is not None and entrada.terminada and entrada.error is None:
+            return False
+        with self.lock_persistentes:
+            if id_tarea in self.tareas_persistentes:
+                return False
+            self.tareas_persistentes.add(id_tarea)
+            return True
+
+    def _liberar(self, id_tarea: str):
+        """Quita la tarea de las que se están ejecutando (ver _reclamar)."""
+        with self.lock_persistentes:
+            self.tareas_persistentes.discard(id_tarea)
+
+    def _nueva_persistente(self, solicitud: Dict, id_tarea: str) -> Tuple[Tarea, List[InfoTrabajador]]:
+        """Crea la Tarea de una solicitud con task_id y la anota en el diario con sus entradas."""
+        operacion, izquierda, derecha, funcion, plazo_seg = self._argumentos_solicitud(solicitud)
+        formato = "bin" if es_buffer(izquierda) else "json"
+        izquierda, derecha = self._como_int64(izquierda, derecha)
+        vivos = self._operadores_tarea()
+        tarea = self._preparar_tarea(operacion, izquierda, derecha, funcion, vivos, plazo_seg, id_tarea)
+        self.diario.iniciar(id_tarea, operacion, funcion, formato, tarea.partes, izquierda, derecha, plazo_seg)
+        tarea.diario = self.diario
+        return tarea, vivos
+
+    def _tarea_del_diario(self, entrada: TareaDiario) -> Tarea:
+        """Arma la Tarea de una entrada del diario: entradas como vistas sobre el archivo y
+        los chunks ya resueltos escritos en su lugar."""
+        izquierda, derecha = self.diario.entradas(entrada)
+        tarea = Tarea(entrada.id, entrada.operacion, entrada.funcion, izquierda, derecha, entrada.partes,
+                      time.monotonic() + (entrada.plazo_seg or self.plazo_solicitud_seg),
+                      self._reservar_salida(entrada.operacion, izquierda))
+        for indice_parte in list(entrada.resueltos):
+            tarea.guardar(indice_parte, self.diario.resultado_chunk(entrada, indice_parte))
+        return tarea
+
+    def _retomar(self, entrada: TareaDiario,
+                 vivos: Optional[List[InfoTrabajador]] = None) -> Tuple[Tarea, List[InfoTrabajador]]:
+        """Prepara una tarea del diario que falló o quedó a medias para repartir solo los
+        chunks que le faltan, entre vivos (por defecto los de _operadores_tarea). Si no se
+        puede (p. ej. sin operadores) la anota como fallida."""
+        try:
+            vivos = vivos or self._operadores_tarea()
+            tarea = self._tarea_del_diario(entrada)
+        except Exception as exc:
+            self.diario.terminar(entrada.id, str(exc) or repr(exc))
+            raise
+        self.diario.reabrir(entrada.id)
+        tarea.diario = self.diario
+        log.info("Reanudando tarea %s: %d de %d chunks ya resueltos (%d estaban en vuelo)", entrada.id,
+                 len(entrada.resueltos), len(entrada.partes), len(entrada.despachados - set(entrada.resueltos)))
+        self.metricas.incrementar("tareas_reanudadas_total")
+        self.metricas.incrementar("chunks_recuperados_total", len(entrada.resueltos))
+        return tarea, vivos
+
+    def _ejecutar_persistente(self, tarea: Tarea, vivos: List[InfoTrabajador]) -> Any:
+        """Ejecuta una tarea del diario y anota cómo terminó."""
+        try:
+            resultado = self._ejecutar_tarea(tarea, vivos)
+        except Exception as exc:
+            self.diario.terminar(tarea.id, str(exc) or repr(exc))
+            raise
+        self.diario.terminar(tarea.id)
+        return resultado
+
+    def responder_persistente(self, solicitud: Dict) -> Dict:
+        """Resuelve una solicitud de cálculo con task_id anotándola en el diario. Si el
+        task_id ya está (el cliente la reenvía tras perder la conexión) no se recalcula: se
+        responde como a 'get_result', salvo que la tarea haya fallado o quedado a medias, que
+        se reanuda repartiendo solo los chunks que le faltaban."""
+        inicio = time.time()
+        id_tarea, entrada = self._buscar_persistente(solicitud)
+        if not self._reclamar(id_tarea, entrada):
+            return self._respuesta_tarea(id_tarea, entrada)
+        try:
+            tarea, vivos = self._retomar(entrada) if entrada is not None else self._nueva_persistente(solicitud, id_tarea)
+            resultado = self._ejecutar_persistente(tarea, vivos)
+        finally:
+            self._liberar(id_tarea)
+        return self._respuesta_ok(solicitud, resultado, time.time() - inicio)
+
+    def responder_resultado(self, solicitud: Dict) -> Dict:
+        """Responde un 'get_result': el estado o el resultado de una tarea del diario."""
+        if self.diario is None:
+            return {"type": "error", "error": "El coordinador no tiene diario de tareas (--diario)"}
+        id_tarea = str(solicitud.get("task_id"))
+        entrada = self.diario.tarea(id_tarea)
+        if entrada is None:
+            return {"type": "error", "error": f"Tarea desconocida: {id_tarea}"}
+        return self._respuesta_tarea(id_tarea, entrada)
+
+    def _respuesta_tarea(self, id_tarea: str, entrada: Optional[TareaDiario]) -> Dict:
+        """Estado de una tarea del diario: 'ok' con el resultado (en el formato en que llegó
+        la solicitud) si terminó, 'error' si falló y 'pending' con su avance si sigue en curso."""
+        if entrada is None or not entrada.terminada:
+            return {"type": "pending", "task_id": id_tarea, "retry_after_ms": ESPERA_PENDIENTE_MS,
+                    "chunks": len(entrada.partes) if entrada else None,
+                    "chunks_resueltos": len(entrada.resueltos) if entrada else 0}
+        if entrada.error is not None:
+            return {"type": "error", "task_id": id_tarea, "error": entrada.error}
+        resultado = self._ensamblar(self._tarea_del_diario(entrada))
+        if entrada.formato == "json" and es_buffer(resultado):
+            resultado = resultado.tolist()
+        return {"type": "ok", "task_id": id_tarea, "result": resultado,
+                "elapsed": entrada.fin_ts - entrada.inicio_ts}
+
+    def reanudar_pendientes(self):
+        """Retoma en segundo plano las tareas que el diario tiene a medias (el proceso
+        anterior murió antes de terminarlas), cada una apenas haya operadores vivos; el
+        resultado queda en el diario para 'get_result'."""
+        for entrada in self.diario.pendientes():
+            if self._reclamar(entrada.id, entrada):
+                threading.Thread(target=self._reanudar_en_fondo, args=(entrada,), daemon=True,
+                                 name="Reanudar").start()
+
+    def _operadores_para_reanudar(self) -> List[InfoTrabajador]:
+        """Operadores vivos con capacidad para retomar una tarea (vacía si todavía no hay).
+        A diferencia de trabajadores_disponibles no recurre a los caídos: reanudar puede
+        esperar al health check que los vuelva a dar por vivos, que se adelanta aquí para
+        no esperar el backoff de los caídos."""
+        vivos = self.trabajadores_vivos()
+        if not vivos:
+            self.pedir_chequeo()
+        try:
+            return self.trabajadores_libres(vivos) if vivos else []
+        except ErrorOcupado:
+            return []
+
+    def _reanudar_en_fondo(self, entrada: TareaDiario):
+        """Cuerpo de los hilos de reanudar_pendientes: espera con backoff (hasta el intervalo
+        de health checks) a que haya operadores vivos, sin anotar la tarea como fallida
+        mientras tanto, y la retoma."""
+        try:
+            vivos = self._operadores_para_reanudar()
+            espera = self.tick_salud_seg
+            while not vivos:
+                time.sleep(espera)
+                espera = min(2 * espera, self.intervalo_salud_seg)
+                vivos = self._operadores_para_reanudar()
+            self._ejecutar_persistente(*self._retomar(entrada, vivos))
+        except Exception as exc:
+            log.warning("No se pudo reanudar la tarea %s: %s", entrada.id, exc)
+        finally:
+            self._liberar(entrada.id)
+
+    def _argumentos_solicitud(self, solicitud: Dict) -> Tuple[str, Sequence[int], Optional[Sequence[int]], str,
+                                                              Optional[float]]:
+        """Extrae (operacion, a, b, funcion, plazo_seg) de una solicitud de cálculo de
+        cliente; el plazo viene opcionalmente en deadline_ms."""
+        operacion = TIPOS_SOLICITUD[solicitud["type"]]
+        derecha = None if operacion == "reduce" else solicitud["b"]
+        plazo_seg = solicitud["deadline_ms"] / 1000 if solicitud.get("deadline_ms") else None
+        return operacion, solicitud["a"], derecha, solicitud.get("funcion", "sum"), plazo_seg
+
+    def _en_formato(self, solicitud: Dict, resultado: Any) -> Any:
+        """Convierte el resultado al formato (JSON o binario) en que llegó la solicitud."""
+        if not es_buffer(solicitud["a"]) and es_buffer(resultado):
+            return resultado.tolist()
+        return resultado
+
+    def _respuesta_ok(self, solicitud: Dict, resultado_total: Any, duracion: float) -> Dict:
+        """Arma la respuesta 'ok' en el mismo formato (JSON o binario) en que llegó la solicitud."""
+        resultado_total = self._en_formato(solicitud, resultado_total)
+        return {"type": "ok", "result": resultado_total, "elapsed": duracion,
+                "operadores": [
+                    {"nombre": op.nombre, "host": op.host, "puerto": op.puerto, "vivo": op.vivo,
+                     "en_vuelo": op.en_vuelo,
+                     "latencia_ms": None if op.latencia_ewma is None else round(op.latencia_ewma * 1000, 2)}
+                    for op in self.trabajadores]}
+
+    def _argumentos_lote(self, solicitud: Dict) -> Tuple[str, Sequence[int], Optional[Sequence[int]], str,
+                                                         Optional[float], List[Tuple[int, int]]]:
+        """Valida un 'batch' y extrae (operacion, a, b, funcion, plazo_seg, rangos). Un lote
+        trae todos los pares concatenados en 'a' y 'b' (así viaja igual en JSON o binario) y
+        en 'largos' el largo de cada par; rangos son los (inicio, fin) de cada uno."""
+        tipo = solicitud.get("operacion")
+        if tipo not in TIPOS_SOLICITUD:
+            raise ValueError(f"Operación de lote desconocida: {tipo}")
+        operacion, izquierda, derecha, funcion, plazo_seg = self._argumentos_solicitud(dict(solicitud, type=tipo))
+        largos = solicitud.get("largos") or []
+        if any(not isinstance(n, int) or n < 0 for n in largos) or sum(largos) != len(izquierda):
+            raise ValueError("'largos' no coincide con el largo de los arreglos del lote")
+        rangos, inicio = [], 0
+        for n in largos:
+            rangos.append((inicio, inicio + n))
+            inicio += n
+        # Los pares de dot/reduce se cortan como vistas, sin copiar el lote
+        izquierda, derecha = (memoryview(datos) if es_buffer(datos) else datos for datos in (izquierda, derecha))
+        return operacion, izquierda, derecha, funcion, plazo_seg, rangos
+
+    def responder_lote(self, solicitud: Dict) -> Dict:
+        """Resuelve un 'batch'. En operaciones elemento a elemento el lote completo es una
+        sola tarea (el resultado de la concatenación es la concatenación de los resultados)
+        y el cliente lo corta con 'largos'; en dot y reduce 'result' trae un escalar por par,
+        y los pares se resuelven a la vez con un plazo común para todo el lote."""
+        inicio = time.time()
+        operacion, izquierda, derecha, funcion, plazo_seg, rangos = self._argumentos_lote(solicitud)
+        if operacion in OPERACIONES_ELEMENTO:
+            resultado = self._en_formato(solicitud, self.calcular_distribuido(operacion, izquierda, derecha,
+                                                                              funcion, plazo_seg))
+        else:
+            # En su propio pool: cada par espera a sus chunks, que van por self.ejecutor
+            limite = time.monotonic() + (plazo_seg or self.plazo_solicitud_seg)
+            futuros = [self.ejecutor_bloques.submit(self._calcular_par, operacion, izquierda[i:f],
+                                                    None if derecha is None else derecha[i:f], funcion, limite)
+                       for i, f in rangos]
+            resultado = [futuro.result() for futuro in futuros]
+        return {"type": "batch_ok", "result": resultado, "largos": solicitud["largos"],
+                "elapsed": time.time() - inicio}
+
+    def _plazo_par(self, limite: float) -> float:
+        """Lo que queda del plazo común de un lote para un par que recién empieza
+        (TimeoutError si ya no queda)."""
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            raise TimeoutError("Se agotó el plazo del lote")
+        return restante
+
+    def _calcular_par(self, operacion: str, izquierda, derecha, funcion: str, limite: float) -> Any:
+        """Resuelve un par de un lote de dot/reduce dentro del plazo común del lote."""
+        return self.calcular_distribuido(operacion, izquierda, derecha, funcion, self._plazo_par(limite))
+
+    def responder_solicitud(self, solicitud: Dict) -> Dict:
+        """Resuelve una solicitud de cliente (ver TIPOS_SOLICITUD, 'batch', 'health' o
+        'metrics'), de membresía ('register'/'leave') o un chunk de un coordinador padre
+        (compute_<operacion>, 'cancel') y retorna la respuesta. Las solicitudes de cálculo
+        con task_id se anotan en el diario, si hay (ver responder_persistente y 'get_result')."""
+        if solicitud.get("type") in TIPOS_SOLICITUD:
+            if self.diario is not None and solicitud.get("task_id") is not None:
+                return self.responder_persistente(solicitud)
+            inicio = time.time()
+            resultado_total = self.calcular_distribuido(*self._argumentos_solicitud(solicitud))
+            return self._respuesta_ok(solicitud, resultado_total, time.time() - inicio)
+        if solicitud.get("type") == "batch":
+            return self.responder_lote(solicitud)
+        if solicitud.get("type") == "get_result":
+            return self.responder_resultado(solicitud)
+        if str(solicitud.get("type")).startswith(PREFIJO_CALCULO):
+            inicio = time.perf_counter()
+            resultado = self.calcular_distribuido(*self._argumentos_chunk(solicitud))
+            return self._respuesta_chunk_padre(solicitud, resultado, time.perf_counter() - inicio)
+        if solicitud.get("type") in ("register", "leave"):
+            return self.responder_membresia(solicitud)
+        if solicitud.get("type") == "cancel":
+            # Un chunk del padre ya repartido no se interrumpe: termina y el padre descarta
+            # el resultado
+            return {"type": "cancel_ok", "task_id": solicitud.get("task_id"), "idx": solicitud.get("idx")}
+        if solicitud.get("type") == "health":
+            respuesta = {"type": "health_ok", "role": "coordinator", "formatos": ["json", "bin"],
+                         "solicitudes": list(TIPOS_SOLICITUD) + ["batch", "sum_stream", "get_result"]}
+            respuesta.update(self._estado_admision())
+            respuesta["operadores"] = [{"nombre": op.nombre, "direccion": f"{op.host}:{op.puerto}", "vivo": op.vivo}
+                                       for op in self.trabajadores]
+            if self.cache is not None:
+                respuesta["cache"] = self.cache.estadisticas()
+            if self.diario is not None:
+                respuesta["diario"] = self.diario.estadisticas()
+            return respuesta
+        if solicitud.get("type") == "metrics":
+            return {"type": "metrics_ok", "role": "coordinator", "metricas": self.exportar_metricas()}
+        return {"type": "error", "error": "unknown_request"}
+
+    def _estado_admision(self) -> Dict:
+        """Campos de health_ok sobre la cola de admisión: profundidad, solicitudes en curso
+        y límites (los mismos que informa un operador)."""
+        estado = self.admision.estado()
+        return {"cola": estado["en_cola"], "capacidad_cola": estado["capacidad"], "en_curso": estado["en_curso"],
+                "max_concurrentes": estado["max_concurrentes"], "conexiones": self.conexiones}
+
+    def _respuesta_ocupado(self) -> Dict:
+        """Respuesta 'busy' para una solicitud que no entra en la cola de admisión."""
+        return respuesta_ocupado(self.admision.reintentar_en_seg())
+
+    def _argumentos_chunk(self, mensaje: Dict) -> Tuple[str, Sequence[int], Optional[Sequence[int]], str,
+                                                        Optional[float]]:
+        """Extrae (operacion, a, b, funcion, plazo_seg) de un chunk compute_<operacion> de un
+        coordinador padre; el plazo es su deadline_ms."""
+        operacion = mensaje["type"][len(PREFIJO_CALCULO):]
+        if operacion not in OPERACIONES:
+            raise ValueError(f"Operación desconocida: {operacion}")
+        plazo_seg = max(0.001, mensaje["deadline_ms"] / 1000) if "deadline_ms" in mensaje else None
+        return operacion, mensaje["a"], mensaje.get("b"), mensaje.get("funcion", "sum"), plazo_seg
+
+    def _respuesta_chunk_padre(self, mensaje: Dict, resultado: Any, duracion: float) -> Dict:
+        """Respuesta 'result' a un chunk del padre, como la de un operador: el resultado de
+        dot/reduce es el parcial de este subárbol, que el padre combina con los demás."""
+        return {"type": "result", "task_id": mensaje.get("task_id"), "idx": mensaje.get("idx"),
+                "result": self._en_formato(mensaje, resultado), "operador": self.nombre,
+                "calculo_seg": round(duracion, 6), "cola": self.admision.profundidad()}
+
+    def _actualizar_medidores(self):
+        """Copia a los medidores el estado actual de operadores, cola de admisión, cache y diario."""
+        estado = self.admision.estado()
+        self.metricas.fijar("cola_solicitudes", estado["en_cola"])
+        self.metricas.fijar("solicitudes_en_curso", estado["en_curso"])
+        self.metricas.fijar("conexiones_cliente", self.conexiones)
+        for op in self.trabajadores:
+            self.metricas.fijar("operador_vivo", int(op.vivo), operador=op.nombre)
+            self.metricas.fijar("operador_en_vuelo", op.en_vuelo, operador=op.nombre)
+            self.metricas.fijar("operador_cola", op.cola, operador=op.nombre)
+            if op.rendimiento is not None:
+                self.metricas.fijar("operador_elementos_por_seg", round(op.rendimiento), operador=op.nombre)
+        if self.cache is not None:
+            for nombre, valor in self.cache.estadisticas().items():
+                self.metricas.fijar(f"cache_{nombre}", valor)
+        if self.diario is not None:
+            for nombre, valor in self.diario.estadisticas().items():
+                self.metricas.fijar(f"diario_{nombre}", valor)
+
+    def exportar_metricas(self) -> Dict:
+        """Métricas actuales como dict (respuesta de 'metrics')."""
+        self._actualizar_medidores()
+        return self.metricas.instantanea()
+
+    def texto_metricas(self) -> str:
+        """Métricas actuales en texto Prometheus (ver --metricas-puerto)."""
+        self._actualizar_medidores()
+        return self.metricas.texto_prometheus()
+
+    def _medir_solicitud(self, solicitud: Dict, respuesta: Dict, inicio: float):
+        """Cuenta una solicitud de cliente resuelta y registra su duración por tipo."""
+        tipo = str(solicitud.get("type"))
+        self.metricas.observar("solicitud_seg", time.perf_counter() - inicio, tipo=tipo)
+        self.metricas.incrementar("solicitudes_total", tipo=tipo,
+                                  resultado={"error": "error", "busy": "ocupado"}.get(respuesta.get("type"), "ok"))
+
+    def _rechazar_solicitud(self, solicitud: Dict, motivo: str) -> Dict:
+        """Respuesta 'busy' (con su req_id) para una solicitud rechazada, y su métrica."""
+        self.metricas.incrementar("solicitudes_rechazadas_total", motivo=motivo)
+        self.metricas.incrementar("solicitudes_total", tipo=str(solicitud.get("type")), resultado="ocupado")
+        return self._con_req_id(solicitud, self._respuesta_ocupado())
+
+    def _respuesta_excepcion(self, error: Exception) -> Dict:
+        """Respuesta a una solicitud que falló: 'busy' si no hubo capacidad, 'error' si no."""
+        if isinstance(error, ErrorOcupado):
+            return respuesta_ocupado(error.retry_after_seg)
+        return {"type": "error", "error": str(error) or repr(error)}
+
+    def _medir_decodificacion(self, segundos: float):
+        """Registra lo que tardó en llegar y decodificarse un mensaje de cliente."""
+        self.metricas.observar("etapa_seg", segundos, etapa="deserializar")
+
+    def _ventana_stream(self, solicitud: Dict) -> int:
+        """Bloques en vuelo que se aceptan para un stream (lo pedido por el cliente, acotado)."""
+        return max(1, min(VENTANA_STREAM_MAX, int(solicitud.get("ventana") or VENTANA_STREAM)))
+
+    def _siguiente_bloque(self, mensaje: Dict, esperado: int) -> bool:
+        """True si el mensaje es el bloque esperado del stream; False si es el 'fin'.
+        Lanza ValueError ante cualquier otro mensaje o un seq fuera de orden."""
+        if mensaje.get("type") == "fin":
+            return False
+        if mensaje.get("type") != "bloque" or mensaje.get("seq") != esperado:
+            raise ValueError(f"Se esperaba el bloque {esperado} del stream")
+        return True
+
+    def _respuesta_bloque(self, mensaje: Dict, resultado: Any) -> Dict:
+        """Respuesta 'bloque_result' de un bloque, en el formato en que llegó."""
+        return {"type": "bloque_result", "seq": mensaje["seq"], "result": self._en_formato(mensaje, resultado)}
+
+    def atender_stream(self, lector: LectorJson, solicitud: Dict, enviar: Callable[[Dict], None]):
+        """Atiende un sum_stream: el cliente manda bloques {'type': 'bloque', 'seq', 'a', 'b'}
+        y un {'type': 'fin'}. Cada bloque se reparte apenas llega, con hasta 'ventana'
+        bloques en vuelo: con la ventana llena se deja de leer el socket, así la memoria
+        queda acotada por la ventana y no por el tamaño total. Los 'bloque_result' se
+        envían en orden de seq (con enviar) y al final un 'stream_fin'."""
+        inicio = time.time()
+        ventana = self._ventana_stream(solicitud)
+        enviar({"type": "stream_ok", "ventana": ventana})
+        en_vuelo: deque = deque()   # (bloque, futuro) en orden de seq
+        bloques = elementos = 0
+        try:
+            while True:
+                mensaje = lector.recibir(timeout=TIMEOUT_BLOQUE_SEG)
+                if not self._siguiente_bloque(mensaje, bloques):
+                    break
+                en_vuelo.append((mensaje, self.ejecutor_bloques.submit(self.calcular_bloque, mensaje["a"], mensaje["b"])))
+                bloques += 1
+                elementos += len(mensaje["a"])
+                # Se responde lo ya resuelto en orden; con la ventana llena se espera al más viejo
+                while en_vuelo and (en_vuelo[0][1].done() or len(en_vuelo) >= ventana):
+                    bloque, futuro = en_vuelo.popleft()
+                    enviar(self._respuesta_bloque(bloque, futuro.result()))
+            while en_vuelo:
+                bloque, futuro = en_vuelo.popleft()
+                enviar(self._respuesta_bloque(bloque, futuro.result()))
+        finally:
+            for _, futuro in en_vuelo:
+                futuro.cancel()
+        log.info("Stream terminado: %d bloques, n=%d", bloques, elementos)
+        enviar({"type": "stream_fin", "bloques": bloques, "elementos": elementos, "elapsed": time.time() - inicio})
+
+    def _con_req_id(self, solicitud: Dict, respuesta: Dict) -> Dict:
+        """Copia el req_id de la solicitud (o task_id/idx, en un chunk de un coordinador
+        padre) a su respuesta, para emparejarlas."""
+        for campo in ("req_id", "task_id", "idx"):
+            if campo in solicitud:
+                respuesta[campo] = solicitud[campo]
+        return respuesta
 
     def atender_cliente(self, conexion: socket.socket, direccion):
-        """Atiende una solicitud del cliente ('sum_arrays' o 'health') y responde."""
-        try:
-            solicitud = recibir_json(conexion, timeout=15.0)
-            if solicitud.get("type") == "sum_arrays":
-                arreglo_izq = solicitud["a"]
-                arreglo_der = solicitud["b"]
-                inicio = time.time()
-                resultado_total = self.calcular_suma_distribuida(arreglo_izq, arreglo_der)
-                duracion = time.time() - inicio
-                enviar_json(
-                    conexion,
-                    {"type": "ok", "result": resultado_total, "elapsed": duracion,
-                     "operadores": [
-                         {"nombre": op.nombre, "host": op.host, "puerto": op.puerto, "vivo": op.vivo}
-                         for op in self.trabajadores]}
-                )
-            elif solicitud.get("type") == "health":
-                enviar_json(conexion, {"type": "health_ok", "role": "coordinator"})
-            else:
-                enviar_json(conexion, {"type": "error", "error": "unknown_request"})
+        """Atiende una conexión de cliente. Puede traer varias solicitudes seguidas
+        (pipelining): cada una entra en la cola de admisión, en la fila de esta conexión,
+        con hasta MAX_SOLICITUDES_POR_CONEXION en vuelo, y su respuesta lleva el req_id que
+        traía, así que pueden volver en otro orden. Con la cola llena la respuesta es
+        'busy' con retry_after_ms. Un 'sum_stream' ocupa la conexión hasta su 'fin'."""
+        lector = LectorJson(conexion, medir=self._medir_decodificacion)
+        lock_envio = threading.Lock()
+        cupos = threading.BoundedSemaphore(MAX_SOLICITUDES_POR_CONEXION)
+        pendientes = set()
+
+        def enviar(obj: Dict):
+            """Envía un mensaje entero sin intercalarlo con las respuestas de otros hilos."""
+            with lock_envio:
+                enviar_mensaje(conexion, obj)
+
+        def responder(solicitud: Dict):
+            """Resuelve una solicitud y envía su respuesta (o el error)."""
+            inicio = time.perf_counter()
+            try:
+                respuesta = self.responder_solicitud(solicitud)
+            except Exception as e:
+                respuesta = self._respuesta_excepcion(e)
+            self._medir_solicitud(solicitud, respuesta, inicio)
+            try:
+                with self.metricas.cronometro("etapa_seg", etapa="serializar"):
+                    enviar(self._con_req_id(solicitud, respuesta))
+            except Exception:
+                pass
+            finally:
+                cupos.release()
+
+        timeout = 15.0
+        try:
+            while True:
+                try:
+                    solicitud = lector.recibir(timeout=timeout)
+                except (ConnectionError, socket.timeout):
+                    break
+                timeout = TIMEOUT_INACTIVIDAD_SEG
+                if solicitud.get("type") == "sum_stream":
+                    if self.admision.llena():
+                        enviar(self._rechazar_solicitud(solicitud, "cola"))
+                    else:
+                        self.atender_stream(lector, solicitud, enviar)
+                    continue
+                cupos.acquire()
+                if solicitud.get("type") in TIPOS_INMEDIATOS:
+                    responder(solicitud)
+                    continue
+                futuro = self.admision.enviar(direccion, lambda s=solicitud: responder(s))
+                if futuro is None:
+                    cupos.release()
+                    enviar(self._rechazar_solicitud(solicitud, "cola"))
+                    continue
+                pendientes.add(futuro)
+                futuro.add_done_callback(pendientes.discard)
         except Exception as e:
             try:
-                enviar_json(conexion, {"type": "error", "error": str(e)})
+                enviar({"type": "error", "error": str(e)})
             except Exception:
                 pass
+        finally:
+            # Las respuestas pendientes salen antes de cerrar (el cliente pudo cerrar solo su escritura)
+            wait(list(pendientes))
+            conexion.close()
+            self._fin_conexion()
+
+    def _admitir_conexion(self) -> bool:
+        """Cuenta una conexión de cliente nueva; False si ya hay max_conexiones abiertas."""
+        with self.lock_conexiones:
+            if self.conexiones >= self.max_conexiones:
+                return False
+            self.conexiones += 1
+            return True
+
+    def _fin_conexion(self):
+        """Descuenta una conexión de cliente cerrada."""
+        with self.lock_conexiones:
+            self.conexiones -= 1
+
+    def _rechazar_conexion(self, conexion: socket.socket):
+        """Responde 'busy' a una conexión que excede max_conexiones y la cierra."""
+        self.metricas.incrementar("solicitudes_rechazadas_total", motivo="conexiones")
+        try:
+            conexion.settimeout(1.0)
+            enviar_mensaje(conexion, self._respuesta_ocupado())
+        except Exception:
+            pass
         finally:
             conexion.close()
 
     def servir(self):
-        """Bucle del servidor de cálculo: acepta conexiones de clientes y las delega a hilos."""
-        print("[coord] Servidor de cálculo iniciado")
+        """Bucle del servidor de cálculo: arranca el health checker, acepta conexiones de
+        clientes y las delega a hilos."""
+        self.hilo_salud = Repetidor(self.tick_salud_seg, self.verificar_salud, nombre="HealthChecker")
+        self.hilo_salud.start()
+        if self.diario is not None:
+            self.reanudar_pendientes()
+        log.info("Servidor de cálculo iniciado")
         while True:
             conexion, direccion = self.socket_servidor.accept()
+            if not self._admitir_conexion():
+                self._rechazar_conexion(conexion)
+                continue
             threading.Thread(target=self.atender_cliente, args=(conexion, direccion), daemon=True).start()
 
+class CoordinadorAsync(Coordinador):
+    """Coordinador en modo asyncio: la atención de clientes, el fan-out de subtareas y los
+    health checks son corrutinas de un único event loop. Usa el mismo protocolo que
+    Coordinador, así que los clientes y operadores existentes no cambian."""
+    def __init__(self, *args, **kwargs):
+        """Configura el coordinador base (cada operador con su pool asyncio)."""
+        super().__init__(*args, **kwargs)
+        self.tareas_fondo = set()   # copias perdedoras y cancelaciones en curso
+
+    def _nuevo_trabajador(self, nombre: str, host: str, puerto: int) -> InfoTrabajador:
+        """Estado de un operador nuevo, con su pool asyncio."""
+        operador = super()._nuevo_trabajador(nombre, host, puerto)
+        operador.pool_async = PoolConexionesAsync(host, puerto)
+        return operador
+
+    def retirar_operador(self, host: str, puerto: int) -> Optional[InfoTrabajador]:
+        """Ver Coordinador.retirar_operador; también cierra su pool asyncio."""
+        retirado = super().retirar_operador(host, puerto)
+        if retirado is not None:
+            retirado.pool_async.cerrar()
+        return retirado
+
+    def _crear_admision(self, max_solicitudes: int, max_cola: int) -> AdmisionAsync:
+        """Cola de admisión de solicitudes (tareas del loop; arranca en _servir_async)."""
+        return AdmisionAsync(max_solicitudes, max_cola, nombre="Solicitudes")
+
+    async def verificar_salud_async(self, forzar: bool = False):
+        """Versión asyncio de verificar_salud: los pings vencidos salen a la vez con gather."""
+        async def ping(operador: InfoTrabajador):
+            inicio = time.monotonic()
+            try:
+                respuesta = await operador.pool_async.solicitar({"type": "health"},
+                                                                timeout=self._timeout_ping(operador))
+            except Exception:
+                respuesta = None
+            self._registrar_salud(operador, respuesta, time.monotonic() - inicio)
+        await asyncio.gather(*(ping(op) for op in self._chequeos_vencidos(forzar)))
+
+    async def _ciclo_salud(self):
+        """Equivalente asyncio del Repetidor: una ronda por tick (o antes si se pide un chequeo)."""
+        self._despertar_salud = asyncio.Event()
+        while True:
+            try:
+                await self.verificar_salud_async()
+            except Exception as e:
+                log.error("[HealthChecker] Error: %s", e)
+            try:
+                await asyncio.wait_for(self._despertar_salud.wait(), self.tick_salud_seg)
+            except asyncio.TimeoutError:
+                pass
+            self._despertar_salud.clear()
+
+    def pedir_chequeo(self):
+        """Adelanta el chequeo de todos los operadores despertando al ciclo de salud."""
+        for op in self.trabajadores:
+            op.proximo_chequeo = 0.0
+        evento = getattr(self, "_despertar_salud", None)
+        if evento is not None:
+            evento.set()
+
+    async def enviar_subtarea_async(self, operador: InfoTrabajador, mensaje: Dict,
+                                    timeout: Optional[float] = None) -> Dict:
+        """Versión asyncio de enviar_subtarea (timeout con asyncio.wait_for dentro del pool)."""
+        return await operador.pool_async.solicitar(mensaje, timeout=timeout or self.timeout_calculo_seg)
+
+    async def cancelar_subtarea_async(self, operador: InfoTrabajador, id_tarea: str, indice_parte: int):
+        """Versión asyncio de cancelar_subtarea."""
+        try:
+            await operador.pool_async.solicitar({"type": "cancel", "task_id": id_tarea, "idx": indice_parte},
+                                                timeout=1.0)
+        except Exception:
+            pass
+
+    def _en_segundo_plano(self, corrutina):
+        """Lanza una tarea del loop que nadie espera, guardando una referencia hasta que termine."""
+        tarea = asyncio.create_task(corrutina)
+        self.tareas_fondo.add(tarea)
+        tarea.add_done_callback(self.tareas_fondo.discard)
+
+    async def resolver_chunk_async(self, operador: InfoTrabajador, tarea: Tarea, indice_parte: int) -> Any:
+        """Versión asyncio de resolver_chunk."""
+        _, inicio, fin = tarea.partes[indice_parte]
+        log.debug("Enviando chunk %d a %s", indice_parte, operador.nombre)
+        timeout = min(self.timeout_calculo_seg, max(0.001, tarea.restante_seg()))
+        enviado = self._inicio_subtarea(operador, fin - inicio)
+        tarea.anotar_despacho(indice_parte)
+        try:
+            respuesta = await self.enviar_subtarea_async(operador, self._mensaje_chunk(operador, tarea, indice_parte),
+                                                         timeout)
+        except BaseException as exc:
+            # También al cancelarse, para no dejar carga en vuelo colgada
+            self._fin_subtarea(operador, fin - inicio, enviado, exc, recortada=timeout < self.timeout_calculo_seg)
+            raise
+        return self._respuesta_chunk(operador, tarea, indice_parte, enviado, respuesta)
+
+    async def calcular_distribuido_async(self, operacion: str, arreglo_numeros_izquierda: Sequence[int],
+                                         arreglo_numeros_derecha: Optional[Sequence[int]] = None,
+                                         funcion: str = "sum", plazo_seg: Optional[float] = None) -> Any:
+        """Versión asyncio de calcular_distribuido: los trabajadores del plan son tareas del loop."""
+        self._validar_entrada(operacion, arreglo_numeros_izquierda, arreglo_numeros_derecha, funcion)
+        if len(arreglo_numeros_izquierda) == 0:
+            return [] if operacion in OPERACIONES_ELEMENTO else 0
+
+        izquierda, derecha = self._como_vistas(operacion, arreglo_numeros_izquierda, arreglo_numeros_derecha)
+        if self.cache is None:
+            return await self._resolver_distribuido_async(operacion, izquierda, derecha, funcion, plazo_seg)
+        clave = self._clave_cache(operacion, izquierda, derecha, funcion)
+        return await self.cache.obtener_o_calcular_async(
+            clave, lambda: self._resolver_distribuido_async(operacion, izquierda, derecha, funcion, plazo_seg),
+            timeout=plazo_seg or self.plazo_solicitud_seg)
+
+    async def _resolver_distribuido_async(self, operacion: str, izquierda, derecha, funcion: str,
+                                          plazo_seg: Optional[float]) -> Any:
+        """Versión asyncio de _resolver_distribuido."""
+        vivos = self._operadores_tarea()
+        tarea = self._preparar_tarea(operacion, izquierda, derecha, funcion, vivos, plazo_seg)
+        return await self._ejecutar_tarea_async(tarea, vivos)
+
+    async def _ejecutar_tarea_async(self, tarea: Tarea, vivos: List[InfoTrabajador]) -> Any:
+        """Versión asyncio de _ejecutar_tarea."""
+        plan = PlanDespacho(tarea, vivos, self._rendimientos(vivos), self._plazo_especulacion())
+        cambio = asyncio.Condition()
+        activos = len(vivos) * self.subtareas_por_operador
+
+        async def esperar(segundos: float):
+            """Espera un aviso en cambio (tomado) o hasta que pasen los segundos."""
+            try:
+                await asyncio.wait_for(cambio.wait(), segundos)
+            except asyncio.TimeoutError:
+                pass
+
+        async def trabajar(operador: InfoTrabajador):
+            """Resuelve chunks del plan con el operador hasta que no quede trabajo para él."""
+            nonlocal activos
+            try:
+                while True:
+                    async with cambio:
+                        indice_parte = plan.tomar(operador)
+                        while indice_parte is None and plan.debe_esperar(operador):
+                            await esperar(self._espera_plan(plan, tarea))
+                            indice_parte = plan.tomar(operador)
+                    if indice_parte is None:
+                        return
+                    try:
+                        resultado = await self.resolver_chunk_async(operador, tarea, indice_parte)
+                        for perdedor in plan.completar(operador, indice_parte, resultado):
+                            self._en_segundo_plano(self.cancelar_subtarea_async(perdedor, tarea.id, indice_parte))
+                    except Exception as exc:
+                        if not isinstance(exc, (ErrorOcupado, OverflowError)):   # no son fallos del operador
+                            log.warning("%s falló en chunk %d: %r", operador.nombre, indice_parte, exc)
+                        if self._chunk_fallido(plan, tarea, operador, indice_parte, exc):
+                            return
+                    async with cambio:
+                        cambio.notify_all()
+            finally:
+                activos -= 1
+                async with cambio:
+                    cambio.notify_all()
+
+        for op in vivos:
+            for _ in range(self.subtareas_por_operador):
+                self._en_segundo_plano(trabajar(op))
+        async with cambio:
+            while activos and not plan.terminado():
+                if tarea.restante_seg() <= 0:
+                    plan.abortar(self._error_plazo(tarea))
+                    cambio.notify_all()
+                    break
+                await esperar(tarea.restante_seg())
+        self._contar_plan(plan)
+        plan.verificar()
+        return self._ensamblar(tarea)
+
+    async def calcular_bloque_async(self, arreglo_numeros_izquierda: Sequence[int],
+                                    arreglo_numeros_derecha: Sequence[int]) -> Any:
+        """Versión asyncio de calcular_bloque."""
+        self._validar_entrada("sum", arreglo_numeros_izquierda, arreglo_numeros_derecha, "sum")
+        if len(arreglo_numeros_izquierda) == 0:
+            return []
+        izquierda, derecha = self._como_vistas("sum", arreglo_numeros_izquierda, arreglo_numeros_derecha)
+        return await self._resolver_distribuido_async("sum", izquierda, derecha, "sum", None)
+
+    async def atender_stream_async(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                                   solicitud: Dict):
+        """Versión asyncio de atender_stream: cada bloque es una tarea del loop."""
+        inicio = time.time()
+        ventana = self._ventana_stream(solicitud)
+        await enviar_mensaje_async(writer, {"type": "stream_ok", "ventana": ventana})
+        en_vuelo: deque = deque()   # (bloque, tarea) en orden de seq
+        bloques = elementos = 0
+        try:
+            while True:
+                mensaje = await asyncio.wait_for(recibir_mensaje_async(reader, medir=self._medir_decodificacion),
+                                                 TIMEOUT_BLOQUE_SEG)
+                if not self._siguiente_bloque(mensaje, bloques):
+                    break
+                en_vuelo.append((mensaje, asyncio.create_task(self.calcular_bloque_async(mensaje["a"], mensaje["b"]))))
+                bloques += 1
+                elementos += len(mensaje["a"])
+                while en_vuelo and (en_vuelo[0][1].done() or len(en_vuelo) >= ventana):
+                    bloque, tarea = en_vuelo.popleft()
+                    await enviar_mensaje_async(writer, self._respuesta_bloque(bloque, await tarea))
+            while en_vuelo:
+                bloque, tarea = en_vuelo.popleft()
+                await enviar_mensaje_async(writer, self._respuesta_bloque(bloque, await tarea))
+        finally:
+            for _, tarea in en_vuelo:
+                tarea.cancel()
+        log.info("Stream terminado: %d bloques, n=%d", bloques, elementos)
+        await enviar_mensaje_async(writer, {"type": "stream_fin", "bloques": bloques, "elementos": elementos,
+                                            "elapsed": time.time() - inicio})
+
+    async def responder_lote_async(self, solicitud: Dict) -> Dict:
+        """Versión asyncio de responder_lote."""
+        inicio = time.time()
+        operacion, izquierda, derecha, funcion, plazo_seg, rangos = self._argumentos_lote(solicitud)
+        if operacion in OPERACIONES_ELEMENTO:
+            resultado = self._en_formato(solicitud, await self.calcular_distribuido_async(
+                operacion, izquierda, derecha, funcion, plazo_seg))
+        else:
+            limite = time.monotonic() + (plazo_seg or self.plazo_solicitud_seg)
+            resultado = list(await asyncio.gather(*(
+                self._calcular_par_async(operacion, izquierda[i:f], None if derecha is None else derecha[i:f],
+                                         funcion, limite)
+                for i, f in rangos)))
+        return {"type": "batch_ok", "result": resultado, "largos": solicitud["largos"],
+                "elapsed": time.time() - inicio}
+
+    async def _calcular_par_async(self, operacion: str, izquierda, derecha, funcion: str, limite: float) -> Any:
+        """Versión asyncio de _calcular_par."""
+        return await self.calcular_distribuido_async(operacion, izquierda, derecha, funcion, self._plazo_par(limite))
+
+    async def responder_persistente_async(self, solicitud: Dict) -> Dict:
+        """Versión asyncio de responder_persistente."""
+        inicio = time.time()
+        id_tarea, entrada = self._buscar_persistente(solicitud)
+        if not self._reclamar(id_tarea, entrada):
+            return self._respuesta_tarea(id_tarea, entrada)
+        try:
+            tarea, vivos = self._retomar(entrada) if entrada is not None else self._nueva_persistente(solicitud, id_tarea)
+            resultado = await self._ejecutar_persistente_async(tarea, vivos)
+        finally:
+            self._liberar(id_tarea)
+        return self._respuesta_ok(solicitud, resultado, time.time() - inicio)
+
+    async def _ejecutar_persistente_async(self, tarea: Tarea, vivos: List[InfoTrabajador]) -> Any:
+        """Versión asyncio de _ejecutar_persistente."""
+        try:
+            resultado = await self._ejecutar_tarea_async(tarea, vivos)
+        except Exception as exc:
+            self.diario.terminar(tarea.id, str(exc) or repr(exc))
+            raise
+        self.diario.terminar(tarea.id)
+        return resultado
+
+    def reanudar_pendientes(self):
+        """Versión asyncio de reanudar_pendientes: cada tarea se retoma en una tarea del loop."""
+        for entrada in self.diario.pendientes():
+            if self._reclamar(entrada.id, entrada):
+                self._en_segundo_plano(self._reanudar_en_fondo_async(entrada))
+
+    async def _reanudar_en_fondo_async(self, entrada: TareaDiario):
+        """Versión asyncio de _reanudar_en_fondo."""
+        try:
+            vivos = self._operadores_para_reanudar()
+            espera = self.tick_salud_seg
+            while not vivos:
+                await asyncio.sleep(espera)
+                espera = min(2 * espera, self.intervalo_salud_seg)
+                vivos = self._operadores_para_reanudar()
+            await self._ejecutar_persistente_async(*self._retomar(entrada, vivos))
+        except Exception as exc:
+            log.warning("No se pudo reanudar la tarea %s: %s", entrada.id, exc)
+        finally:
+            self._liberar(entrada.id)
+
+    async def responder_solicitud_async(self, solicitud: Dict) -> Dict:
+        """Versión asyncio de responder_solicitud."""
+        if solicitud.get("type") in TIPOS_SOLICITUD:
+            if self.diario is not None and solicitud.get("task_id") is not None:
+                return await self.responder_persistente_async(solicitud)
+            inicio = time.time()
+            resultado_total = await self.calcular_distribuido_async(*self._argumentos_solicitud(solicitud))
+            return self._respuesta_ok(solicitud, resultado_total, time.time() - inicio)
+        if solicitud.get("type") == "batch":
+            return await self.responder_lote_async(solicitud)
+        if str(solicitud.get("type")).startswith(PREFIJO_CALCULO):
+            inicio = time.perf_counter()
+            resultado = await self.calcular_distribuido_async(*self._argumentos_chunk(solicitud))
+            return self._respuesta_chunk_padre(solicitud, resultado, time.perf_counter() - inicio)
+        return self.responder_solicitud(solicitud)
+
+    async def atender_cliente_async(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Versión asyncio de atender_cliente: cada solicitud de la conexión entra en la cola
+        de admisión y la resuelve una tarea trabajadora del loop."""
+        if not self._admitir_conexion():
+            self.metricas.incrementar("solicitudes_rechazadas_total", motivo="conexiones")
+            try:
+                await enviar_mensaje_async(writer, self._respuesta_ocupado())
+            except Exception:
+                pass
+            writer.close()
+            return
+        direccion = writer.get_extra_info("peername")
+        cupos = asyncio.Semaphore(MAX_SOLICITUDES_POR_CONEXION)
+        tareas = set()
+
+        async def responder(solicitud: Dict):
+            """Resuelve una solicitud y envía su respuesta (o el error). El cupo de la
+            conexión se libera pase lo que pase, incluso si la tarea se cancela."""
+            inicio = time.perf_counter()
+            try:
+                try:
+                    respuesta = await self.responder_solicitud_async(solicitud)
+                except Exception as e:
+                    respuesta = self._respuesta_excepcion(e)
+                self._medir_solicitud(solicitud, respuesta, inicio)
+                try:
+                    with self.metricas.cronometro("etapa_seg", etapa="serializar"):
+                        await enviar_mensaje_async(writer, self._con_req_id(solicitud, respuesta))
+                except Exception:
+                    pass
+            finally:
+                cupos.release()
+
+        timeout = 15.0
+        try:
+            while True:
+                try:
+                    solicitud = await asyncio.wait_for(
+                        recibir_mensaje_async(reader, medir=self._medir_decodificacion), timeout)
+                except (ConnectionError, asyncio.TimeoutError):
+                    break
+                timeout = TIMEOUT_INACTIVIDAD_SEG
+                if solicitud.get("type") == "sum_stream":
+                    if self.admision.llena():
+                        await enviar_mensaje_async(writer, self._rechazar_solicitud(solicitud, "cola"))
+                    else:
+                        await self.atender_stream_async(reader, writer, solicitud)
+                    continue
+                await cupos.acquire()
+                if solicitud.get("type") in TIPOS_INMEDIATOS:
+                    await responder(solicitud)
+                    continue
+                tarea = self.admision.enviar(direccion, lambda s=solicitud: responder(s))
+                if tarea is None:
+                    cupos.release()
+                    await enviar_mensaje_async(writer, self._rechazar_solicitud(solicitud, "cola"))
+                    continue
+                tareas.add(tarea)
+                tarea.add_done_callback(tareas.discard)
+        except Exception as e:
+            try:
+                await enviar_mensaje_async(writer, {"type": "error", "error": str(e) or repr(e)})
+            except Exception:
+                pass
+        except asyncio.CancelledError:
+            pass   # el loop se está apagando (SIGTERM/Ctrl+C)
+        finally:
+            if tareas:
+                await asyncio.gather(*tareas, return_exceptions=True)
+            writer.close()
+            self._fin_conexion()
+
+    async def _servir_async(self):
+        """Arranca el ciclo de salud y la cola de admisión, y sirve clientes sobre el socket ya abierto."""
+        self.tarea_salud = asyncio.create_task(self._ciclo_salud())
+        self.admision.iniciar()
+        if self.diario is not None:
+            self.reanudar_pendientes()
+        servidor = await asyncio.start_server(self.atender_cliente_async, sock=self.socket_servidor,
+                                              limit=MAX_MENSAJE_BYTES)
+        log.info("Servidor de cálculo (asyncio) iniciado")
+        async with servidor:
+            await servidor.serve_forever()
+
+    def servir(self):
+        """Bucle del servidor de cálculo en modo asyncio."""
+        asyncio.run(self._servir_async())
+
 if __name__ == "__main__":
     """Punto de entrada: parsea flags y lanza el coordinador (servidor de cálculo)."""
     ap = argparse.ArgumentParser(description="Servidor de Cálculo (Coordinador)")
     ap.add_argument("--host", default="127.0.0.1")
     ap.add_argument("--port", type=int, default=5000)
-    ap.add_argument("--operadores", nargs="+",
-                    default=["127.0.0.1:6001", "127.0.0.1:6002"], help="host:port ...")
+    ap.add_argument("--operadores", nargs="*",
+                    default=["127.0.0.1:6001", "127.0.0.1:6002"],
+                    help="host:port ... de los operadores iniciales (más pueden sumarse con 'register')")
+    ap.add_argument("--nombre", default=None,
+                    help="nombre de este coordinador ante un padre (por defecto coord-host:puerto)")
+    ap.add_argument("--padre", default=None,
+                    help="host:port de un coordinador padre en el que registrarse como operador")
+    ap.add_argument("--max-operadores", type=int, default=64,
+                    help="operadores que puede llegar a tener, contando los que se registren (dimensiona los pools)")
+    ap.add_argument("--token-membresia", default=os.environ.get("TOKEN_MEMBRESIA"),
+                    help="secreto compartido para 'register'/'leave', propios y ante el --padre "
+                         "(por defecto $TOKEN_MEMBRESIA; sin él no se aceptan registros)")
+    ap.add_argument("--chunks", type=int, default=0,
+                    help="número fijo de chunks por tarea (0 = según operadores vivos y --tam-chunk)")
+    ap.add_argument("--tam-chunk", type=int, default=50_000,
+                    help="tamaño objetivo de cada chunk cuando --chunks es automático")
+    ap.add_argument("--umbral-binario", type=int, default=1024,
+                    help="chunks con al menos estos elementos viajan en binario (int64) a los operadores")
+    ap.add_argument("--chunks-por-operador", type=int, default=4,
+                    help="chunks mínimos por operador vivo cuando --chunks es automático")
+    ap.add_argument("--en-vuelo", type=int, default=2,
+                    help="chunks de una misma tarea en vuelo a la vez por operador")
+    ap.add_argument("--cache-mb", type=int, default=64,
+                    help="memoria del cache de resultados en MiB (0 = sin cache)")
+    ap.add_argument("--cache-ttl", type=float, default=60.0,
+                    help="segundos que vale un resultado en el cache")
+    ap.add_argument("--diario", metavar="ARCHIVO", default=None,
+                    help="diario de tareas: las solicitudes con task_id se anotan aquí y se retoman al reiniciar")
+    ap.add_argument("--diario-ttl", type=float, default=3600.0,
+                    help="segundos que el diario guarda una tarea terminada para 'get_result'")
+    ap.add_argument("--asyncio", action="store_true",
+                    help="atiende clientes, subtareas y health checks con asyncio en lugar de hilos")
+    ap.add_argument("--max-solicitudes", type=int, default=64,
+                    help="solicitudes de clientes resolviéndose a la vez")
+    ap.add_argument("--max-cola", type=int, default=1024,
+                    help="solicitudes esperando turno; con la cola llena se responde 'busy'")
+    ap.add_argument("--max-conexiones", type=int, default=1024,
+                    help="conexiones de cliente abiertas a la vez; las que sobran reciben 'busy'")
+    ap.add_argument("--log-level", choices=NIVELES_LOG, default="INFO",
+                    help="nivel de log (DEBUG muestra cada chunk)")
+    ap.add_argument("--metricas-puerto", type=int, default=0,
+                    help="puerto HTTP donde servir /metrics en formato Prometheus (0 = sin endpoint)")
     args = ap.parse_args()
+    configurar_logs(args.log_level)
 
-    tuplas_operadores = []
-    for w in args.operadores:
-        h, p = w.split(":")
-        tuplas_operadores.append((h, int(p)))
+    tuplas_operadores = [direccion(w) for w in args.operadores]
 
     cont = Counter(tuplas_operadores)
     duplicados = [f"{h}:{p}" for (h, p), c in cont.items() if c > 1]
     if duplicados:
-        print(f"[coord] Error: --uno de los operadores tiene mal asignada la ip y el puerto (repetidos): {', '.join(duplicados)}")
+        log.error("--uno de los operadores tiene mal asignada la ip y el puerto (repetidos): %s", ", ".join(duplicados))
         sys.exit(1)
 
-    Coordinador(args.host, args.port, tuplas_operadores).servir()
+    diario = DiarioTareas(args.diario, args.diario_ttl) if args.diario else None
+    clase = CoordinadorAsync if args.asyncio else Coordinador
+    coordinador = clase(args.host, args.port, tuplas_operadores,
+                num_chunks=args.chunks or None, tam_chunk_objetivo=args.tam_chunk,
+                umbral_binario=args.umbral_binario, chunks_por_operador=args.chunks_por_operador,
+                subtareas_por_operador=args.en_vuelo,
+                cache=CacheResultados(args.cache_mb * 1024 * 1024, args.cache_ttl) if args.cache_mb else None,
+                max_solicitudes=args.max_solicitudes, max_cola=args.max_cola, max_conexiones=args.max_conexiones,
+                nombre=args.nombre, diario=diario, max_operadores=args.max_operadores,
+                token_membresia=args.token_membresia)
+    if args.metricas_puerto:
+        servir_prometheus(args.host, args.metricas_puerto, coordinador.texto_metricas)
+        log.info("Métricas Prometheus en http://%s:%d/metrics", args.host, args.metricas_puerto)
+    anunciante = None
+    if args.padre:
+        anunciante = Anunciante(direccion(args.padre), args.host, args.port, coordinador.nombre,
+                                token=args.token_membresia)
+        anunciante.iniciar()
+    # SIGTERM termina como Ctrl+C, para que el 'leave' al padre alcance a salir
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        coordinador.servir()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if anunciante is not None:
+            anunciante.detener()
+        if diario is not None:
+            diario.cerrar()
@@ -0,0 +1,45 @@
+import os, socket, sys, threading, time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motores import MotorPython
+from operador import Operador
+from servidorCalculo import Coordinador
+
+def puerto_libre() -> int:
+    """Un puerto TCP libre en 127.0.0.1."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture(scope="session")
+def operadores():
+    """Dos operadores con el motor de Python, cada uno en su hilo; retorna sus direcciones."""
+    direcciones = []
+    for numero in (1, 2):
+        puerto = puerto_libre()
+        operador = Operador(f"operador-{numero}", motor=MotorPython())
+        threading.Thread(target=operador.servir, args=("127.0.0.1", puerto), daemon=True).start()
+        direcciones.append(("127.0.0.1", puerto))
+    time.sleep(0.3)
+    return direcciones
+
+@pytest.fixture
+def crear_coordinador(operadores):
+    """Fábrica de coordinadores contra los operadores de prueba (u otra lista), con los
+    operadores ya chequeados; los cierra al terminar la prueba."""
+    creados = []
+
+    def crear(lista_operadores=None, **opciones):
+        coordinador = Coordinador("127.0.0.1", puerto_libre(), lista_operadores or operadores, **opciones)
+        coordinador.verificar_salud(forzar=True)
+        creados.append(coordinador)
+        return coordinador
+
+    yield crear
+    for coordinador in creados:
+        coordinador.socket_servidor.close()
+        for ejecutor in (coordinador.ejecutor, coordinador.ejecutor_bloques, coordinador.ejecutor_salud):
+            ejecutor.shutdown(wait=False)
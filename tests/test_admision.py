@@ -0,0 +1,51 @@
+import asyncio
+
+from admision import AdmisionAsync, ColaJusta
+
+def test_cola_justa_alterna_entre_clientes():
+    cola = ColaJusta(capacidad=10)
+    for i in range(4):
+        assert cola.agregar("a", f"a{i}")
+    assert cola.agregar("b", "b0")
+    assert cola.agregar("c", "c0")
+    assert [cola.sacar() for _ in range(len(cola))] == ["a0", "b0", "c0", "a1", "a2", "a3"]
+
+def test_cola_justa_respeta_la_capacidad_total():
+    cola = ColaJusta(capacidad=2)
+    assert cola.agregar("a", 1) and cola.agregar("b", 2)
+    assert not cola.agregar("c", 3)
+    cola.sacar()
+    assert cola.agregar("c", 3) and len(cola) == 2
+
+def test_trabajador_async_sobrevive_a_trabajos_cancelados():
+    async def principal():
+        admision = AdmisionAsync(max_concurrentes=1, capacidad=10)
+        admision.iniciar()
+
+        async def cancelado():
+            raise asyncio.CancelledError
+
+        async def falla():
+            raise ValueError("falla")
+
+        async def lento():
+            await asyncio.sleep(0.05)
+            return "tarde"
+
+        async def doble(x):
+            return 2 * x
+
+        primero = admision.enviar("a", cancelado)
+        segundo = admision.enviar("a", falla)
+        abandonado = admision.enviar("a", lento)
+        ultimo = admision.enviar("a", lambda: doble(21))
+        await asyncio.sleep(0.01)
+        abandonado.cancel()   # quien esperaba desistió mientras corría
+        assert await ultimo == 42
+        assert primero.cancelled()
+        assert isinstance(segundo.exception(), ValueError)
+        assert all(not t.done() for t in admision.trabajadores)
+        for t in admision.trabajadores:
+            t.cancel()
+
+    asyncio.run(principal())
@@ -0,0 +1,110 @@
+import asyncio, threading, time
+from array import array
+
+from cacheResultados import CacheResultados, clave_contenido
+
+def test_clave_no_confunde_concatenaciones_ni_tipos():
+    assert clave_contenido([1, 2], [3]) != clave_contenido([1], [2, 3])
+    assert clave_contenido([1, 2, 3]) == clave_contenido(array("q", [1, 2, 3]))
+    assert clave_contenido("1") != clave_contenido([1])
+    assert clave_contenido([1 << 64]) != clave_contenido([0])
+
+def test_vence_con_el_ttl():
+    cache = CacheResultados(ttl_seg=0.05)
+    cache.guardar(b"k", 1)
+    assert cache.obtener(b"k") == 1
+    time.sleep(0.06)
+    assert cache.obtener(b"k", "no") == "no"
+    assert cache.estadisticas()["expiradas"] == 1 and cache.estadisticas()["bytes"] == 0
+
+def test_desaloja_el_menos_usado():
+    cache = CacheResultados(max_entradas=2)
+    cache.guardar(b"a", 1)
+    cache.guardar(b"b", 2)
+    cache.obtener(b"a")         # b pasa a ser el menos usado
+    cache.guardar(b"c", 3)
+    assert cache.obtener(b"b") is None
+    assert cache.obtener(b"a") == 1 and cache.obtener(b"c") == 3
+    assert cache.estadisticas()["desalojos"] == 1
+
+def test_respeta_el_limite_de_memoria():
+    cache = CacheResultados(max_bytes=4 * 1024)
+    cache.guardar(b"grande", array("q", [0]) * 200)    # más de un cuarto del límite
+    assert cache.obtener(b"grande") is None
+    for i in range(10):
+        cache.guardar(bytes([i]), array("q", [i]) * 100)
+    assert cache.estadisticas()["bytes"] <= 4 * 1024
+    assert cache.obtener(bytes([9])) is not None and cache.obtener(bytes([0])) is None
+
+def test_agrupa_calculos_concurrentes():
+    cache = CacheResultados()
+    llamadas = []
+    liberar = threading.Event()
+
+    def calcular():
+        llamadas.append(1)
+        liberar.wait(1)
+        return 42
+
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(cache.obtener_o_calcular(b"k", calcular, 1)))
+             for _ in range(5)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.05)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+    assert resultados == [42] * 5 and len(llamadas) == 1
+    assert cache.estadisticas()["agrupadas"] == 4
+    assert cache.obtener_o_calcular(b"k", lambda: 0) == 42
+
+def test_error_llega_a_los_agrupados_y_no_se_guarda():
+    async def principal():
+        cache = CacheResultados()
+
+        async def falla():
+            await asyncio.sleep(0.02)
+            raise ValueError("falla")
+
+        resultados = await asyncio.gather(*(cache.obtener_o_calcular_async(b"k", falla) for _ in range(3)),
+                                          return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in resultados)
+        assert cache.estadisticas()["agrupadas"] == 2
+
+        async def bien():
+            return 7
+
+        assert await cache.obtener_o_calcular_async(b"k", bien) == 7
+
+    asyncio.run(principal())
+
+def test_cancelar_al_lider_no_cancela_a_los_agrupados():
+    async def principal():
+        cache = CacheResultados()
+        llamadas = []
+
+        async def calcular():
+            llamadas.append(1)
+            await asyncio.sleep(0.05)
+            return 9
+
+        lider = asyncio.create_task(cache.obtener_o_calcular_async(b"k", calcular))
+        await asyncio.sleep(0)
+        seguidores = [asyncio.create_task(cache.obtener_o_calcular_async(b"k", calcular, timeout=1))
+                      for _ in range(3)]
+        await asyncio.sleep(0.01)
+        lider.cancel()
+        assert await asyncio.gather(*seguidores) == [9, 9, 9]
+        assert lider.cancelled() and len(llamadas) == 2
+
+        # Cancelar a un seguidor sí lo cancela a él
+        otro = asyncio.create_task(cache.obtener_o_calcular_async(b"j", calcular))
+        await asyncio.sleep(0)
+        seguidor = asyncio.create_task(cache.obtener_o_calcular_async(b"j", calcular))
+        await asyncio.sleep(0.01)
+        seguidor.cancel()
+        assert await otro == 9
+        assert seguidor.cancelled()
+
+    asyncio.run(principal())
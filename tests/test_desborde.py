@@ -0,0 +1,50 @@
+from array import array
+
+import pytest
+
+from motores import MotorPython, cabe_en_int64
+
+GRANDE = 1 << 62
+
+@pytest.fixture
+def coordinador(crear_coordinador):
+    # Umbral bajo: las entradas de 2000 elementos son candidatas al formato binario
+    return crear_coordinador(umbral_binario=16)
+
+def test_cabe_en_int64():
+    assert cabe_en_int64("sum", [GRANDE - 1], [GRANDE])
+    assert not cabe_en_int64("sum", [GRANDE], [GRANDE])
+    assert not cabe_en_int64("sub", [GRANDE], [-GRANDE])
+    assert not cabe_en_int64("mul", [1 << 32], [1 << 31])
+    assert cabe_en_int64("dot", [GRANDE], [GRANDE])
+
+@pytest.mark.parametrize("n", [10, 2000])
+def test_json_da_resultado_exacto_en_cualquier_tamano(coordinador, n):
+    assert coordinador.calcular_distribuido("sum", [GRANDE] * n, [GRANDE] * n) == [1 << 63] * n
+
+def test_json_que_cabe_se_trabaja_en_binario(coordinador):
+    resultado = coordinador.calcular_distribuido("sum", list(range(2000)), list(range(2000)))
+    assert isinstance(resultado, array) and list(resultado) == [2 * i for i in range(2000)]
+
+def test_buffer_que_desborda_en_el_operador_pasa_a_lista(coordinador):
+    a = array("q", [GRANDE] * 2000)
+    resultado = coordinador.calcular_distribuido("sum", memoryview(a), memoryview(a))
+    assert resultado == [1 << 63] * 2000
+
+def test_producto_punto_exacto(coordinador):
+    a = array("q", [GRANDE] * 2000)
+    assert coordinador.calcular_distribuido("dot", memoryview(a), memoryview(a)) == 2000 * GRANDE * GRANDE
+
+@pytest.mark.parametrize("binario", [False, True])
+def test_motor_numpy_dot_con_terminos_que_se_cancelan(binario):
+    np = pytest.importorskip("numpy")
+    from motores import MotorNumpy, calcular_ndarray
+    a, b = [GRANDE + 2, GRANDE], [GRANDE, -GRANDE]
+    if binario:
+        a, b = array("q", a), array("q", b)
+    assert MotorNumpy().calcular("dot", a, b) == 1 << 63 == MotorPython().calcular("dot", a, b)
+    # Cancelación que sí cabe en int64: se resuelve exacto sin recurrir al respaldo
+    assert calcular_ndarray("dot", np.array([GRANDE, GRANDE]), np.array([3, -3])) == 0
+    assert calcular_ndarray("reduce", np.array([GRANDE, GRANDE, -GRANDE])) == GRANDE
+    with pytest.raises(OverflowError):
+        calcular_ndarray("reduce", np.array([GRANDE, GRANDE]))
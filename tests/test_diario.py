@@ -0,0 +1,116 @@
+import time
+from array import array
+
+from conftest import puerto_libre
+from diarioTareas import DiarioTareas, TAM_MINIMO, _REGISTRO
+
+def _esperar(condicion, timeout=10.0):
+    limite = time.monotonic() + timeout
+    while not condicion():
+        assert time.monotonic() < limite, "se agotó la espera"
+        time.sleep(0.02)
+
+def _tarea_a_medias(diario, n=4000):
+    """Anota una suma de dos chunks con el primero ya resuelto."""
+    a = array("q", range(n))
+    diario.iniciar("t1", "sum", "sum", "bin", [(0, 0, n // 2), (1, n // 2, n)], memoryview(a), memoryview(a), 5.0)
+    diario.despachado("t1", 0)
+    diario.despachado("t1", 1)
+    diario.resuelto("t1", 0, array("q", [2 * i for i in range(n // 2)]))
+
+def test_reabrir_reconstruye_el_indice(tmp_path):
+    ruta = str(tmp_path / "diario.bin")
+    diario = DiarioTareas(ruta)
+    _tarea_a_medias(diario, 10)
+    diario.iniciar("t2", "dot", "sum", "json", [(0, 0, 1)], array("q", [1]), array("q", [1]))
+    diario.resuelto("t2", 0, 1 << 70)
+    diario.terminar("t2")
+    diario.cerrar()
+
+    diario = DiarioTareas(ruta)
+    t1 = diario.tarea("t1")
+    assert not t1.terminada and t1.plazo_seg == 5.0
+    assert set(t1.resueltos) == {0} and t1.despachados == {0, 1}
+    izquierda, derecha = diario.entradas(t1)
+    assert izquierda.tolist() == derecha.tolist() == list(range(10))
+    assert diario.resultado_chunk(t1, 0).tolist() == [0, 2, 4, 6, 8]
+    t2 = diario.tarea("t2")
+    assert t2.terminada and t2.error is None and diario.resultado_chunk(t2, 0) == 1 << 70
+    assert [tarea.id for tarea in diario.pendientes()] == ["t1"]
+    diario.cerrar()
+
+def test_registro_a_medio_escribir_marca_el_final(tmp_path):
+    ruta = str(tmp_path / "diario.bin")
+    diario = DiarioTareas(ruta)
+    _tarea_a_medias(diario, 10)
+    fin_valido = diario.fin
+    diario.resuelto("t1", 1, array("q", range(5)))
+    diario.mapa[fin_valido + _REGISTRO.size] ^= 0xFF   # el proceso murió a mitad del cuerpo
+    diario.cerrar()
+
+    diario = DiarioTareas(ruta)
+    assert set(diario.tarea("t1").resueltos) == {0} and diario.fin == fin_valido
+    diario.resuelto("t1", 1, array("q", range(5)))
+    diario.cerrar()
+    diario = DiarioTareas(ruta)
+    assert diario.resultado_chunk(diario.tarea("t1"), 1).tolist() == list(range(5))
+    diario.cerrar()
+
+def _tarea_terminada(diario, id_tarea, n=50_000):
+    datos = array("q", range(n))
+    diario.iniciar(id_tarea, "sum", "sum", "bin", [(0, 0, n)], datos, datos)
+    diario.resuelto(id_tarea, 0, datos)
+    diario.terminar(id_tarea)
+
+def test_vence_y_compacta_sin_reiniciar(tmp_path):
+    diario = DiarioTareas(str(tmp_path / "diario.bin"), ttl_seg=0.05)
+    for numero in range(12):   # ~1.2 MB por tarea
+        _tarea_terminada(diario, f"t{numero}")
+        time.sleep(0.06)
+    assert set(diario.tareas) <= {"t10", "t11"}
+    assert diario.tarea("t0") is None
+    assert diario.fin < 4 * TAM_MINIMO and not diario.retirados
+    diario.cerrar()
+
+def test_compactar_con_vistas_abiertas(tmp_path):
+    diario = DiarioTareas(str(tmp_path / "diario.bin"), ttl_seg=0.01)
+    _tarea_terminada(diario, "t0")
+    _tarea_a_medias(diario)
+    entrada = diario.tarea("t1")
+    izquierda, derecha = diario.entradas(entrada)
+    posicion = entrada.pos_entradas
+    time.sleep(0.02)
+    for numero in range(2, 5):
+        _tarea_terminada(diario, f"t{numero}")
+    assert "t0" not in diario.tareas and entrada.pos_entradas < posicion   # compactó
+    assert diario.tarea("t1") is entrada
+    assert izquierda.tolist() == list(range(4000))   # la vista vieja sigue siendo válida
+    assert diario.entradas(entrada)[0].tolist() == list(range(4000))
+    assert diario.resultado_chunk(entrada, 0).tolist() == [2 * i for i in range(2000)]
+    assert diario.retirados
+    izquierda.release()
+    derecha.release()
+    diario.cerrar()
+    assert not diario.retirados
+
+def test_reanuda_solo_lo_que_falta_cuando_vuelven_los_operadores(crear_coordinador, operadores, tmp_path):
+    diario = DiarioTareas(str(tmp_path / "diario.bin"))
+    _tarea_a_medias(diario)
+    diario.cerrar()
+    diario = DiarioTareas(str(tmp_path / "diario.bin"))   # el coordinador se reinició
+    diario.tarea("t1").despachados.clear()
+    # Al reiniciar, el único operador conocido todavía está caído
+    coordinador = crear_coordinador([("127.0.0.1", puerto_libre())], diario=diario)
+    coordinador.tick_salud_seg = 0.02
+    coordinador.reanudar_pendientes()
+    time.sleep(0.3)
+    assert not diario.tarea("t1").terminada   # espera sin anotarla como fallida
+
+    coordinador.registrar_operador(*operadores[0])   # vuelve un operador
+    coordinador.verificar_salud(forzar=True)
+    _esperar(lambda: diario.tarea("t1").terminada)
+    entrada = diario.tarea("t1")
+    assert entrada.error is None and entrada.despachados == {1}
+    respuesta = coordinador.responder_resultado({"type": "get_result", "task_id": "t1"})
+    assert respuesta["type"] == "ok" and list(respuesta["result"]) == [2 * i for i in range(4000)]
+    diario.cerrar()
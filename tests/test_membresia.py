@@ -0,0 +1,26 @@
+import pytest
+
+def solicitud(tipo, puerto, **extra):
+    return {"type": tipo, "host": "127.0.0.1", "puerto": puerto, **extra}
+
+def test_sin_token_configurado_no_acepta_membresia(crear_coordinador):
+    coordinador = crear_coordinador()
+    respuesta = coordinador.responder_membresia(solicitud("register", 1, token="x"))
+    assert respuesta["type"] == "error"
+    assert len(coordinador.trabajadores) == 2
+
+def test_token_invalido_no_da_de_baja(crear_coordinador, operadores):
+    coordinador = crear_coordinador(token_membresia="secreto")
+    for extra in ({}, {"token": "otro"}):
+        assert coordinador.responder_membresia(solicitud("leave", operadores[0][1], **extra))["type"] == "error"
+    assert len(coordinador.trabajadores) == 2
+    assert coordinador.responder_membresia(solicitud("leave", operadores[0][1], token="secreto"))["type"] == "leave_ok"
+    assert len(coordinador.trabajadores) == 1
+
+def test_registro_respeta_max_operadores(crear_coordinador):
+    coordinador = crear_coordinador(max_operadores=3, token_membresia="secreto")
+    assert coordinador.ejecutor_salud._max_workers == 3
+    assert coordinador.responder_membresia(solicitud("register", 1, token="secreto"))["type"] == "register_ok"
+    with pytest.raises(ValueError):
+        coordinador.responder_membresia(solicitud("register", 2, token="secreto"))
+    assert len(coordinador.trabajadores) == 3
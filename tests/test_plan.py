@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from servidorCalculo import InfoTrabajador, PlanDespacho, Tarea
+
+def crear_plan(rendimientos, n_partes=8, tam=100, plazo_especulacion=None):
+    """Plan de una tarea dot de n_partes chunks iguales entre operadores con esos rendimientos."""
+    operadores = [InfoTrabajador(f"op{i}", "127.0.0.1", 1000 + i) for i in range(len(rendimientos))]
+    partes = [(i, i * tam, (i + 1) * tam) for i in range(n_partes)]
+    tarea = Tarea("t", "dot", None, [], [], partes, time.monotonic() + 60)
+    plan = PlanDespacho(tarea, operadores, dict(zip(operadores, rendimientos)), plazo_especulacion)
+    return plan, operadores
+
+def test_reparte_en_proporcion_al_rendimiento():
+    plan, (rapido, lento) = crear_plan([300.0, 100.0])
+    assert len(plan.colas[rapido]) == 6 and len(plan.colas[lento]) == 2
+
+def test_roba_del_final_de_la_cola_mas_cargada():
+    plan, (rapido, lento) = crear_plan([300.0, 100.0])
+    primero, ultimo = plan.colas[lento]
+    propios = [plan.tomar(rapido) for _ in range(6)]
+    assert set(propios).isdisjoint({primero, ultimo})
+    assert plan.tomar(rapido) == ultimo and plan.robos == 1
+    # Al lento ya no le conviene robarle al rápido
+    assert plan.tomar(lento) == primero
+    assert plan.tomar(lento) is None
+
+def test_no_roba_si_no_terminaria_antes():
+    plan, (rapido, lento) = crear_plan([100.0, 1.0], n_partes=2)
+    assert list(plan.colas[rapido]) == [0, 1]
+    assert plan.tomar(lento) is None and plan.robos == 0
+
+def test_chunk_fallido_vuelve_para_otro_operador():
+    plan, (a, b) = crear_plan([100.0, 100.0], n_partes=4)
+    idx = plan.tomar(a)
+    plan.fallar(a, idx, excluir=False)
+    assert list(plan.reintentos) == [idx]
+    otro = plan.tomar(a)
+    assert otro != idx   # el reintento no vuelve al operador en el que falló
+    assert plan.tomar(b) == idx
+    plan.completar(b, idx, 1)
+    assert plan.tarea.resultados == {idx: 1} and not plan.reintentos
+
+def test_operador_excluido_no_recibe_mas_y_sin_alternativa_falla():
+    plan, (a, b) = crear_plan([100.0, 100.0], n_partes=2)
+    primero, segundo = plan.tomar(a), plan.tomar(b)
+    plan.fallar(a, primero, excluir=True)
+    assert plan.tomar(a) is None and list(plan.reintentos) == [primero]
+    plan.fallar(b, segundo, excluir=True, causa=TimeoutError("sin respuesta"))
+    with pytest.raises(TimeoutError):
+        plan.verificar()
+
+def test_ocupado_con_otros_en_curso_vuelve_al_frente_de_su_cola():
+    plan, (a,) = crear_plan([100.0], n_partes=3)
+    primero, segundo = plan.tomar(a), plan.tomar(a)
+    assert plan.ceder(a, segundo)
+    assert plan.tomar(a) == segundo
+    plan.completar(a, segundo, 0)
+    assert not plan.ceder(a, primero)   # único en curso: es un fallo, no se cede
+
+def test_copia_especulativa_y_descarte_de_la_perdedora():
+    plan, (a, b) = crear_plan([100.0, 100.0], n_partes=1, plazo_especulacion=lambda n: 0.0)
+    (dueno,) = [op for op in (a, b) if plan.colas[op]]
+    ocioso = b if dueno is a else a
+    assert plan.tomar(dueno) == 0
+    assert plan.tomar(ocioso) == 0 and plan.copias_especulativas == 1
+    assert plan.completar(ocioso, 0, 5) == [dueno]
+    assert plan.completar(dueno, 0, 6) == []
+    assert plan.tarea.resultados == {0: 5} and plan.terminado()
@@ -0,0 +1,92 @@
+import asyncio, json, socket
+from array import array
+
+import pytest
+
+from utils import (LectorJson, PoolConexiones, PoolConexionesAsync, enviar_mensaje, enviar_mensaje_async,
+                   recibir_mensaje_async)
+
+@pytest.fixture
+def par():
+    a, b = socket.socketpair()
+    yield a, b
+    a.close()
+    b.close()
+
+def test_varias_lineas_json_en_un_envio(par):
+    a, b = par
+    a.sendall(b'{"n":1}\n{"n":2}\n{"n"')
+    lector = LectorJson(b, tam_lectura=8)
+    assert lector.recibir(timeout=1) == {"n": 1}
+    assert lector.recibir(timeout=1) == {"n": 2}
+    a.sendall(b':3}\n')
+    assert lector.recibir(timeout=1) == {"n": 3}
+
+def test_timeout_a_mitad_de_linea_conserva_lo_recibido(par):
+    a, b = par
+    lector = LectorJson(b)
+    a.sendall(b'{"texto":"hola ')
+    with pytest.raises(socket.timeout):
+        lector.recibir(timeout=0.05)
+    a.sendall(b'mundo"}\n')
+    assert lector.recibir(timeout=1) == {"texto": "hola mundo"}
+    assert not lector.roto
+
+def test_trama_binaria_y_json_seguidos(par):
+    a, b = par
+    datos = array("q", [-(1 << 63), -1, 0, 1, (1 << 63) - 1])
+    enviar_mensaje(a, {"type": "chunk", "a": datos, "b": array("q"), "id": 7})
+    enviar_mensaje(a, {"type": "ping"})
+    lector = LectorJson(b, tam_lectura=16)
+    mensaje = lector.recibir(timeout=1)
+    assert mensaje == {"type": "chunk", "a": datos, "b": array("q"), "id": 7}
+    assert lector.recibir(timeout=1) == {"type": "ping"}
+
+def test_mensaje_demasiado_grande(par):
+    a, b = par
+    a.sendall(b'{"x":"' + b"a" * 100)
+    with pytest.raises(ValueError):
+        LectorJson(b, max_bytes=64, tam_lectura=16).recibir(timeout=1)
+
+def test_timeout_a_mitad_de_trama_binaria_rompe_la_conexion(par):
+    a, b = par
+    cabecera = json.dumps({"type": "r", "_bin": [["a", 4]]}).encode()
+    a.sendall(b"B" + len(cabecera).to_bytes(4, "big") + cabecera + bytes(12))
+    lector = LectorJson(b)
+    with pytest.raises(socket.timeout):
+        lector.recibir(timeout=0.05)
+    assert lector.roto
+    a.sendall(bytes(20) + b'{"type":"ping"}\n')
+    with pytest.raises(ConnectionError):
+        lector.recibir(timeout=1)
+
+def test_pool_descarta_lectores_rotos(par):
+    _, b = par
+    pool = PoolConexiones("127.0.0.1", 1)
+    lector = LectorJson(b)
+    lector.roto = True
+    pool.devolver(lector)
+    assert pool._inactivas == [] and b.fileno() == -1
+
+def test_pool_async_acota_envio_y_respuesta_con_un_solo_plazo():
+    async def principal():
+        async def lento(reader, writer):
+            await asyncio.sleep(0.3)   # no lee: el envío grande se queda esperando el drain
+            mensaje = await recibir_mensaje_async(reader)
+            await asyncio.sleep(0.3)
+            await enviar_mensaje_async(writer, {"type": "ok", "n": len(mensaje["a"])})
+            writer.close()
+
+        servidor = await asyncio.start_server(lento, "127.0.0.1", 0)
+        pool = PoolConexionesAsync("127.0.0.1", servidor.sockets[0].getsockname()[1])
+        grande = array("q", [0]) * (4 << 20)
+        try:
+            # Cada fase cabe sola en el plazo, pero no las dos juntas
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.solicitar({"type": "x", "a": grande}, timeout=0.5)
+            assert (await pool.solicitar({"type": "x", "a": grande}, timeout=5))["n"] == 4 << 20
+        finally:
+            pool.cerrar()
+            servidor.close()
+
+    asyncio.run(principal())
@@ -1,7 +1,28 @@
-import json, socket, threading, errno
-from typing import Any, Dict
+import asyncio, json, logging, socket, threading, errno, sys, time
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 CODIFICACION = "utf-8"
+# Primer byte de una trama binaria: b"B" + largo de cabecera (4 bytes big-endian)
+# + cabecera JSON + buffers int64 little-endian en el orden indicado por "_bin".
+# Un mensaje JSON en línea siempre empieza por "{", así que ambos formatos conviven.
+MARCA_BINARIA = 0x42
+ES_BIG_ENDIAN = sys.byteorder == "big"
+# Tamaño máximo aceptado para un mensaje (protege contra peers que nunca envían '\n')
+MAX_MENSAJE_BYTES = 256 * 1024 * 1024
+NIVELES_LOG = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+log = logging.getLogger("utils")
+
+def configurar_logs(nivel: str = "INFO") -> None:
+    """Configura el logging del proceso: nivel y formato [hora][nivel][origen] mensaje.
+    Los mensajes se formatean solo si su nivel está habilitado."""
+    logging.basicConfig(level=getattr(logging, nivel.upper()),
+                        format="[%(asctime)s][%(levelname)s][%(name)s] %(message)s", datefmt="%H:%M:%S")
+
+def es_buffer(valor: Any) -> bool:
+    """True si el valor viaja como buffer int64 crudo (array('q'), memoryview o ndarray)."""
+    return isinstance(valor, (array, memoryview)) or hasattr(valor, "__array_interface__")
 
 def enviar_json(sock: socket.socket, obj: Dict[str, Any]) -> None:
     """Envía un diccionario como una línea JSON terminada en '\n' por el socket.
@@ -13,33 +34,215 @@ def enviar_json(sock: socket.socket, obj: Dict[str, Any]) -> None:
     data = (json.dumps(obj, separators=(",", ":")) + "\n").encode(CODIFICACION)
     sock.sendall(data)
 
+def _partes_binarias(obj: Dict[str, Any]) -> List[Any]:
+    """Serializa obj como trama binaria y retorna las partes a escribir en orden:
+    prefijo+cabecera y luego una vista (sin copia) por cada buffer int64."""
+    cabecera: Dict[str, Any] = {}
+    buffers: List[Tuple[str, memoryview]] = []
+    for campo, valor in obj.items():
+        if not es_buffer(valor):
+            cabecera[campo] = valor
+            continue
+        vista = memoryview(valor)
+        if vista.itemsize != 8:
+            raise ValueError(f"El campo {campo} no es un buffer de enteros de 64 bits")
+        if ES_BIG_ENDIAN:
+            copia = array("q")
+            copia.frombytes(vista.cast("B"))
+            copia.byteswap()
+            vista = memoryview(copia)
+        buffers.append((campo, vista.cast("B")))
+    cabecera["_bin"] = [[campo, vista.nbytes // 8] for campo, vista in buffers]
+    datos = json.dumps(cabecera, separators=(",", ":")).encode(CODIFICACION)
+    return [bytes([MARCA_BINARIA]) + len(datos).to_bytes(4, "big") + datos] + [v for _, v in buffers]
+
+def enviar_binario(sock: socket.socket, obj: Dict[str, Any]) -> None:
+    """Envía un diccionario como trama binaria.
+    Los valores que son buffers int64 (ver es_buffer) se envían crudos, sin copiarlos,
+    después de la cabecera; el resto de campos va en la cabecera JSON."""
+    for parte in _partes_binarias(obj):
+        sock.sendall(parte)
+
+def enviar_mensaje(sock: socket.socket, obj: Dict[str, Any]) -> None:
+    """Envía obj en binario si trae algún buffer int64 y como línea JSON si no."""
+    if any(es_buffer(valor) for valor in obj.values()):
+        enviar_binario(sock, obj)
+    else:
+        enviar_json(sock, obj)
+
+class LectorJson:
+    """Lector con estado de mensajes sobre un socket: líneas JSON terminadas en '\n'
+    y tramas binarias (ver MARCA_BINARIA). Conserva los bytes que llegan después de
+    un mensaje para el siguiente, así que varios mensajes pueden viajar seguidos por
+    la misma conexión."""
+    def __init__(self, sock: socket.socket, max_bytes: int = MAX_MENSAJE_BYTES,
+                 tam_lectura: int = 64 * 1024, medir: Optional[Callable[[float], None]] = None):
+        """Configura el lector.
+        - sock: socket conectado en modo stream (TCP)
+        - max_bytes: tamaño máximo de un mensaje; si se supera se lanza ValueError
+        - tam_lectura: tamaño del buffer reutilizable que se pasa a recv_into
+        - medir: recibe los segundos entre el primer byte de cada mensaje y su
+          decodificación completa (sin contar la espera a que empiece a llegar)
+        """
+        self.sock = sock
+        self.max_bytes = max_bytes
+        self.medir = medir
+        self._pendiente = bytearray()   # bytes recibidos y aún no consumidos
+        self._revisado = 0              # prefijo de _pendiente donde ya se buscó '\n'
+        self._bloque = memoryview(bytearray(tam_lectura))
+        # True si una trama binaria quedó a medias (timeout o error al recibir sus
+        # buffers): lo que siga en el socket es el resto de esa trama, así que la
+        # conexión ya no sirve y los pools la descartan en lugar de reutilizarla
+        self.roto = False
+
+    def _leer_mas(self) -> None:
+        """Agrega a _pendiente lo que haya disponible en el socket."""
+        n = self.sock.recv_into(self._bloque)
+        if not n:
+            raise ConnectionError("Socket cerrado por el par")
+        self._pendiente += self._bloque[:n]
+
+    def recibir(self, timeout: float = None) -> Dict[str, Any]:
+        """Retorna el siguiente mensaje como dict (los buffers binarios llegan como array('q')).
+        Lanza ConnectionError si el peer cerró o la conexión quedó rota, socket.timeout
+        si expira y ValueError si el mensaje supera max_bytes. Un timeout a mitad de una
+        línea JSON o de una cabecera conserva lo recibido; a mitad de los buffers de una
+        trama binaria deja el lector roto."""
+        if self.roto:
+            raise ConnectionError("Conexión con una trama binaria a medias")
+        if timeout is not None:
+            self.sock.settimeout(timeout)
+        if not self._pendiente:
+            self._leer_mas()
+        if self.medir is None:
+            return self._decodificar()
+        inicio = time.perf_counter()
+        mensaje = self._decodificar()
+        self.medir(time.perf_counter() - inicio)
+        return mensaje
+
+    def _decodificar(self) -> Dict[str, Any]:
+        """Completa y decodifica el mensaje que empieza en _pendiente (no vacío)."""
+        if self._pendiente[0] == MARCA_BINARIA:
+            return self._recibir_binario()
+        while True:
+            nl = self._pendiente.find(b"\n", self._revisado)
+            if nl != -1:
+                linea = self._pendiente[:nl]
+                del self._pendiente[:nl + 1]
+                self._revisado = 0
+                return json.loads(linea)
+            # Solo se vuelve a buscar en los bytes que lleguen a partir de aquí
+            self._revisado = len(self._pendiente)
+            if self._revisado > self.max_bytes:
+                raise ValueError(f"Mensaje excede el máximo de {self.max_bytes} bytes")
+            self._leer_mas()
+
+    def _recibir_binario(self) -> Dict[str, Any]:
+        """Lee una trama binaria; los buffers se reciben directo en arrays preasignados."""
+        while len(self._pendiente) < 5:
+            self._leer_mas()
+        largo = int.from_bytes(self._pendiente[1:5], "big")
+        if largo > self.max_bytes:
+            raise ValueError(f"Mensaje excede el máximo de {self.max_bytes} bytes")
+        while len(self._pendiente) < 5 + largo:
+            self._leer_mas()
+        cabecera = json.loads(self._pendiente[5:5 + largo])
+        del self._pendiente[:5 + largo]
+        self._revisado = 0
+        campos = cabecera.pop("_bin", [])
+        try:
+            if sum(n for _, n in campos) * 8 > self.max_bytes:
+                raise ValueError(f"Mensaje excede el máximo de {self.max_bytes} bytes")
+            for campo, n in campos:
+                arreglo = array("q", [0]) * n
+                destino = memoryview(arreglo).cast("B")
+                # Primero lo que ya estaba en el buffer, el resto directo desde el socket
+                copiados = min(len(self._pendiente), len(destino))
+                destino[:copiados] = self._pendiente[:copiados]
+                del self._pendiente[:copiados]
+                while copiados < len(destino):
+                    r = self.sock.recv_into(destino[copiados:])
+                    if not r:
+                        raise ConnectionError("Socket cerrado por el par")
+                    copiados += r
+                if ES_BIG_ENDIAN:
+                    arreglo.byteswap()
+                cabecera[campo] = arreglo
+        except BaseException:
+            # La cabecera ya se consumió y los buffers quedan (en parte) sin leer
+            self.roto = True
+            raise
+        return cabecera
+
 def recibir_json(sock: socket.socket, timeout: float = None) -> Dict[str, Any]:
-    """Recibe una línea JSON (hasta '\n') desde el socket y la decodifica a dict.
-    Parámetros:
-      - sock: socket conectado en modo stream (TCP).
-      - timeout: segundos máximos para esperar datos (None = sin cambio).
-    Retorna:
-      - dict con el contenido decodificado.
+    """Recibe un único mensaje (JSON o trama binaria) desde el socket (atajo para conexiones de un solo uso).
+    Los bytes posteriores al '\n' se descartan; para varios mensajes por conexión
+    usar un LectorJson por socket.
     Lanza:
       - ConnectionError si el peer cerró; socket.timeout si expira.
     """
-    if timeout is not None:
-        sock.settimeout(timeout)
-    buf = bytearray()
-    while True:
-        trozo = sock.recv(4096)
-        if not trozo:
-            raise ConnectionError("Socket cerrado por el par")
-        buf.extend(trozo)
-        nl = buf.find(b"\n")
-        if nl != -1:
-            linea = buf[:nl].decode(CODIFICACION)
-            return json.loads(linea)
+    return LectorJson(sock).recibir(timeout)
+
+async def enviar_mensaje_async(writer: asyncio.StreamWriter, obj: Dict[str, Any]) -> None:
+    """Versión asyncio de enviar_mensaje: escribe la trama completa y espera el drain.
+    Las partes se escriben sin ceder el loop, así que dos tareas que comparten el
+    writer nunca intercalan bytes de mensajes distintos."""
+    if any(es_buffer(valor) for valor in obj.values()):
+        for parte in _partes_binarias(obj):
+            writer.write(parte)
+    else:
+        writer.write((json.dumps(obj, separators=(",", ":")) + "\n").encode(CODIFICACION))
+    await writer.drain()
+
+async def recibir_mensaje_async(reader: asyncio.StreamReader, max_bytes: int = MAX_MENSAJE_BYTES,
+                                medir: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
+    """Versión asyncio de LectorJson.recibir sobre un StreamReader (creado con
+    limit=MAX_MENSAJE_BYTES). Los buffers binarios llegan como memoryview int64.
+    Lanza ConnectionError si el peer cerró y ValueError si el mensaje es muy grande.
+    Los timeouts se aplican desde afuera con asyncio.wait_for. medir, como en LectorJson."""
+    try:
+        primero = await reader.readexactly(1)
+        if medir is None:
+            return await _decodificar_async(reader, primero, max_bytes)
+        inicio = time.perf_counter()
+        mensaje = await _decodificar_async(reader, primero, max_bytes)
+        medir(time.perf_counter() - inicio)
+        return mensaje
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("Socket cerrado por el par")
+    except asyncio.LimitOverrunError:
+        raise ValueError(f"Mensaje excede el máximo de {max_bytes} bytes")
+
+async def _decodificar_async(reader: asyncio.StreamReader, primero: bytes, max_bytes: int) -> Dict[str, Any]:
+    """Completa y decodifica el mensaje cuyo primer byte ya se leyó."""
+    if primero[0] != MARCA_BINARIA:
+        linea = primero + await reader.readuntil(b"\n")
+        return json.loads(linea)
+    largo = int.from_bytes(await reader.readexactly(4), "big")
+    if largo > max_bytes:
+        raise ValueError(f"Mensaje excede el máximo de {max_bytes} bytes")
+    cabecera = json.loads(await reader.readexactly(largo))
+    campos = cabecera.pop("_bin", [])
+    if sum(n for _, n in campos) * 8 > max_bytes:
+        raise ValueError(f"Mensaje excede el máximo de {max_bytes} bytes")
+    for campo, n in campos:
+        datos = await reader.readexactly(8 * n)
+        if ES_BIG_ENDIAN:
+            arreglo = array("q")
+            arreglo.frombytes(datos)
+            arreglo.byteswap()
+            cabecera[campo] = memoryview(arreglo)
+        else:
+            cabecera[campo] = memoryview(datos).cast("q")
+    return cabecera
 
 def abrir_cliente(host: str, puerto: int, timeout: float = 5.0) -> socket.socket:
     """Abre un socket TCP cliente y conecta al host:puerto con timeout.
     Retorna el socket conectado listo para usar."""
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Las tramas binarias se escriben en varias partes; sin Nagle no esperan al ACK
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
     s.settimeout(timeout)
     s.connect((host, puerto))
     return s
@@ -76,9 +279,161 @@ def abrir_servidor(host: str, puerto: int, backlog: int = 100) -> socket.socket:
         if en == errno.EADDRINUSE or we == 10048:
             raise RuntimeError(f"Puerto {host}:{puerto} ocupado por otro proceso (Otro operador esta escuchando o tienes el puerto ocupado).")
         raise
+    # Los sockets aceptados heredan TCP_NODELAY (ver abrir_cliente)
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
     s.listen(backlog)
     return s
 
+class PoolConexiones:
+    """Pool de conexiones TCP persistentes hacia un mismo host:puerto.
+    Cada conexión lleva una sola petición en vuelo: se toma del pool, se envía el
+    mensaje, se espera la respuesta y se devuelve para la siguiente petición."""
+    def __init__(self, host: str, puerto: int, max_inactivas: int = 8):
+        """Configura el pool.
+        - host, puerto: destino de todas las conexiones
+        - max_inactivas: conexiones ociosas que se conservan abiertas como máximo
+        """
+        self.host = host
+        self.puerto = puerto
+        self.max_inactivas = max_inactivas
+        self._inactivas: List[LectorJson] = []
+        self._lock = threading.Lock()
+
+    def obtener(self, timeout: float) -> Tuple[LectorJson, bool]:
+        """Retorna (lector, reutilizada): una conexión ociosa o una nueva si no hay.
+        El socket está en lector.sock."""
+        with self._lock:
+            if self._inactivas:
+                return self._inactivas.pop(), True
+        return LectorJson(abrir_cliente(self.host, self.puerto, timeout=timeout)), False
+
+    def devolver(self, lector: LectorJson) -> None:
+        """Regresa una conexión sana al pool (o la cierra si ya hay suficientes o quedó rota)."""
+        if lector.roto:
+            self.descartar(lector)
+            return
+        with self._lock:
+            if len(self._inactivas) < self.max_inactivas:
+                self._inactivas.append(lector)
+                return
+        lector.sock.close()
+
+    def descartar(self, lector: LectorJson) -> None:
+        """Cierra una conexión que falló o quedó en un estado desconocido."""
+        try:
+            lector.sock.close()
+        except OSError:
+            pass
+
+    def solicitar(self, obj: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Envía 'obj' (JSON o binario, ver enviar_mensaje) por una conexión del pool y
+        retorna la respuesta. Si una conexión reutilizada resulta cerrada por el par (p.ej. por inactividad),
+        reintenta una vez con una conexión nueva. Los timeouts no se reintentan."""
+        lector, reutilizada = self.obtener(timeout)
+        try:
+            enviar_mensaje(lector.sock, obj)
+            respuesta = lector.recibir(timeout=timeout)
+        except socket.timeout:
+            self.descartar(lector)
+            raise
+        except (ConnectionError, OSError):
+            self.descartar(lector)
+            if not reutilizada:
+                raise
+            lector = LectorJson(abrir_cliente(self.host, self.puerto, timeout=timeout))
+            try:
+                enviar_mensaje(lector.sock, obj)
+                respuesta = lector.recibir(timeout=timeout)
+            except Exception:
+                self.descartar(lector)
+                raise
+        if not _respuesta_coincide(obj, respuesta):
+            # La conexión quedó desfasada; no se puede volver a usar
+            self.descartar(lector)
+            raise ConnectionError(f"Respuesta no corresponde a la petición: {respuesta.get('type')}")
+        self.devolver(lector)
+        return respuesta
+
+    def cerrar(self) -> None:
+        """Cierra todas las conexiones ociosas del pool."""
+        with self._lock:
+            inactivas, self._inactivas = self._inactivas, []
+        for lector in inactivas:
+            self.descartar(lector)
+
+class PoolConexionesAsync:
+    """Versión asyncio de PoolConexiones: pares (reader, writer) persistentes hacia un
+    host:puerto, con una sola petición en vuelo por conexión. Se usa desde un único
+    event loop, así que no necesita locks."""
+    def __init__(self, host: str, puerto: int, max_inactivas: int = 8):
+        """Configura el pool (mismos parámetros que PoolConexiones)."""
+        self.host = host
+        self.puerto = puerto
+        self.max_inactivas = max_inactivas
+        self._inactivas: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def _abrir(self, timeout: float):
+        """Abre una conexión nueva con timeout de conexión."""
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.puerto, limit=MAX_MENSAJE_BYTES), timeout)
+
+    def descartar(self, conexion) -> None:
+        """Cierra una conexión que falló o quedó en un estado desconocido."""
+        conexion[1].close()
+
+    async def _intercambiar(self, conexion, obj: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Envía obj y espera la respuesta; 'timeout' acota el intercambio completo (envío
+        y respuesta juntos, no cada uno por separado)."""
+        reader, writer = conexion
+
+        async def intercambio():
+            await enviar_mensaje_async(writer, obj)
+            return await recibir_mensaje_async(reader)
+
+        return await asyncio.wait_for(intercambio(), timeout)
+
+    async def solicitar(self, obj: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Envía 'obj' por una conexión del pool y retorna la respuesta, con el mismo
+        reintento sobre conexiones reutilizadas que PoolConexiones.solicitar."""
+        reutilizada = bool(self._inactivas)
+        conexion = self._inactivas.pop() if reutilizada else await self._abrir(timeout)
+        try:
+            respuesta = await self._intercambiar(conexion, obj, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.descartar(conexion)
+            raise
+        except (ConnectionError, OSError):
+            self.descartar(conexion)
+            if not reutilizada:
+                raise
+            conexion = await self._abrir(timeout)
+            try:
+                respuesta = await self._intercambiar(conexion, obj, timeout)
+            except BaseException:
+                self.descartar(conexion)
+                raise
+        if not _respuesta_coincide(obj, respuesta):
+            self.descartar(conexion)
+            raise ConnectionError(f"Respuesta no corresponde a la petición: {respuesta.get('type')}")
+        if len(self._inactivas) < self.max_inactivas:
+            self._inactivas.append(conexion)
+        else:
+            self.descartar(conexion)
+        return respuesta
+
+    def cerrar(self) -> None:
+        """Cierra todas las conexiones ociosas del pool."""
+        inactivas, self._inactivas = self._inactivas, []
+        for conexion in inactivas:
+            self.descartar(conexion)
+
+def _respuesta_coincide(peticion: Dict[str, Any], respuesta: Dict[str, Any]) -> bool:
+    """True si la respuesta trae el mismo task_id/idx que la petición (cuando ambos lo indican)."""
+    for campo in ("task_id", "idx"):
+        if campo in peticion and campo in respuesta and peticion[campo] != respuesta[campo]:
+            return False
+    return True
+
 class Repetidor(threading.Thread):
     """Hilo que ejecuta periódicamente la función dada cada 'intervalo' segundos."""
     def __init__(self, intervalo: float, funcion, nombre: str = "Repetidor", daemon: bool = True):
@@ -92,10 +447,16 @@ class Repetidor(threading.Thread):
         self.intervalo = intervalo
         self.funcion = funcion
         self._parar = threading.Event()
+        self._despertar = threading.Event()
 
     def detener(self):
         """Solicita detener el ciclo periódico."""
         self._parar.set()
+        self._despertar.set()
+
+    def despertar(self):
+        """Adelanta la próxima ejecución sin esperar a que pase el intervalo."""
+        self._despertar.set()
 
     def run(self):
         """Bucle principal que ejecuta la función y espera 'intervalo' seg."""
@@ -103,6 +464,7 @@ class Repetidor(threading.Thread):
             try:
                 self.funcion()
             except Exception as e:
-                print(f"[{self.name}] Error: {e}")
+                log.error("[%s] Error: %s", self.name, e)
             finally:
-                self._parar.wait(self.intervalo)
+                self._despertar.wait(self.intervalo)
+                self._despertar.clear()